@@ -0,0 +1,6 @@
+"""
+Modules shared by the week_1 and week_3 apps: token-budgeted chat history,
+persistent conversations, the pooled SDK clients and history summarizer,
+client-side rate limiting and per-call telemetry.
+Each app puts the repo root on sys.path and imports them from here.
+"""
@@ -0,0 +1,101 @@
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from genai_common.history import ConversationHistory
+
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "genai", "conversations.sqlite3")
+STORE_PATH = os.getenv("CONVERSATION_STORE_PATH", DEFAULT_STORE_PATH)
+
+
+class ConversationStore:
+    """
+    Local persistent conversations keyed by a session id.
+
+    Each row keeps the model-facing history (`ConversationHistory.state()`)
+    and, optionally, the chat transcript shown in the UI, which is never
+    compacted. One SQLite file is shared by every Streamlit session.
+    """
+
+    def __init__(self, path: str = STORE_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS conversations (
+                    session_id TEXT PRIMARY KEY,
+                    history    TEXT NOT NULL DEFAULT '{}',
+                    messages   TEXT NOT NULL DEFAULT '[]',
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """{"history": state, "messages": transcript, "updated_at": ts}, or None if unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT history, messages, updated_at FROM conversations WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"history": json.loads(row[0]), "messages": json.loads(row[1]), "updated_at": row[2]}
+
+    def _upsert(self, session_id: str, column: str, value: Any) -> None:
+        data = json.dumps(value, separators=(",", ":"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO conversations (session_id, {column}, updated_at) VALUES (?, ?, ?) "
+                f"ON CONFLICT(session_id) DO UPDATE SET {column} = excluded.{column}, updated_at = excluded.updated_at",
+                (session_id, data, time.time()),
+            )
+
+    def save_history(self, session_id: str, history: ConversationHistory) -> None:
+        self._upsert(session_id, "history", history.state())
+
+    def save_messages(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        self._upsert(session_id, "messages", messages)
+
+    def messages(self, session_id: str) -> List[Dict[str, str]]:
+        saved = self.load(session_id)
+        return saved["messages"] if saved else []
+
+    def bind(self, session_id: str, history: ConversationHistory) -> ConversationHistory:
+        """Restore `history` from the store and save it back on every change."""
+        saved = self.load(session_id)
+        if saved and saved["history"]:
+            history.restore(saved["history"])
+        history.on_change = lambda h: self.save_history(session_id, h)
+        return history
+
+    def delete(self, session_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM conversations WHERE session_id = ?", (session_id,))
+
+    def purge_older_than(self, seconds: float) -> int:
+        with self._lock, self._conn:
+            cur = self._conn.execute("DELETE FROM conversations WHERE updated_at < ?", (time.time() - seconds,))
+            return cur.rowcount
+
+
+_store: Optional[ConversationStore] = None
+_store_lock = threading.Lock()
+
+
+def get_conversation_store() -> ConversationStore:
+    """Process-wide store instance (shared across Streamlit sessions)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore()
+        return _store
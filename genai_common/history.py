@@ -0,0 +1,185 @@
+from __future__ import annotations
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+HISTORY_TOKEN_BUDGET = 2000  # verbatim recent turns re-sent each call
+SUMMARY_TOKENS = 300         # cap for the rolling summary of older turns
+KEEP_MIN_TURNS = 2           # never compact the last N exchanges
+
+Message = Dict[str, str]
+Summarizer = Callable[[str, List[Message]], str]
+
+@lru_cache(maxsize=1)
+def _encoding() -> Any:
+    """cl100k encoding, loaded on first use (keeps app start-up cheap)."""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # tiktoken missing or no cached encoding: ~4 chars per token
+        return None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def _message_tokens(msg: Message) -> int:
+    return count_tokens(msg["content"]) + 4  # role + framing overhead
+
+
+def summary_prompt(previous: str, turns: List[Message], max_words: int = 180) -> str:
+    lines = "\n".join(f"{m['role'].capitalize()}: {m['content']}" for m in turns)
+    return f"""Update the running summary of an ongoing conversation.
+- Keep facts, names, numbers, decisions, user preferences and open questions.
+- Drop pleasantries and anything already resolved.
+- At most {max_words} words, plain prose, no preamble.
+
+Current summary:
+{previous or "(none)"}
+
+New turns to fold in:
+{lines}
+"""
+
+
+class ConversationHistory:
+    """
+    Chat history whose prompt footprint stays roughly constant.
+
+    Recent turns are kept verbatim up to `budget_tokens`. Older turns are
+    handed to `summarize(previous_summary, turns)` on a background thread
+    and folded into a rolling summary that is sent as a system message.
+    Until a compaction finishes its turns are still sent verbatim, so no
+    context is lost while the summary is being written.
+
+    `on_change(history)`, if set, is called after every append, clear and
+    finished compaction (e.g. to save the conversation).
+    """
+
+    def __init__(
+        self,
+        summarize: Optional[Summarizer] = None,
+        budget_tokens: int = HISTORY_TOKEN_BUDGET,
+        summary_tokens: int = SUMMARY_TOKENS,
+        keep_min_turns: int = KEEP_MIN_TURNS,
+    ) -> None:
+        self.summarize = summarize
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.keep_min_turns = keep_min_turns
+        self.summary = ""
+        self._recent: List[Message] = []
+        self._pending: List[Message] = []  # evicted, not yet in the summary
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by clear(); stale compactions are discarded
+        self._compacting = False
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-compact")
+        self.on_change: Optional[Callable[["ConversationHistory"], None]] = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending) + len(self._recent)
+
+    @property
+    def messages(self) -> List[Message]:
+        """Uncompacted turns, oldest first."""
+        with self._lock:
+            return list(self._pending) + list(self._recent)
+
+    def for_prompt(self) -> List[Message]:
+        """Messages to place between the system prompt and the new user message."""
+        with self._lock:
+            head = []
+            if self.summary:
+                head.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+            return head + list(self._pending) + list(self._recent)
+
+    def state(self) -> Dict[str, Any]:
+        """JSON-serialisable snapshot: the summary plus every uncompacted turn."""
+        with self._lock:
+            return {"summary": self.summary, "messages": list(self._pending) + list(self._recent)}
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        """Load a `state()` snapshot; turns over budget are compacted again on the next append."""
+        with self._lock:
+            self._generation += 1
+            self.summary = state.get("summary") or ""
+            self._pending = []
+            self._recent = [{"role": m["role"], "content": m["content"]} for m in state.get("messages") or []]
+
+    def tokens(self) -> int:
+        return sum(_message_tokens(m) for m in self.for_prompt())
+
+    def append(self, user_message: str, assistant_message: str) -> None:
+        with self._lock:
+            self._recent.extend([
+                {"role": "user", "content": user_message},
+                {"role": "assistant", "content": assistant_message},
+            ])
+            self._evict()
+            if self.summarize is None:
+                self._pending = []  # no summarizer: plain sliding window
+            start = bool(self._pending) and not self._compacting and self.summarize is not None
+            if start:
+                self._compacting = True
+        if start:
+            self._pool.submit(self._compact)
+        self._changed()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self.summary = ""
+            self._recent = []
+            self._pending = []
+        self._changed()
+
+    def _changed(self) -> None:
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def _evict(self) -> None:
+        """Move whole exchanges from recent to pending until recent fits the budget (lock held)."""
+        keep = 2 * self.keep_min_turns
+        total = sum(_message_tokens(m) for m in self._recent)
+        while total > self.budget_tokens and len(self._recent) > keep:
+            for m in self._recent[:2]:
+                total -= _message_tokens(m)
+            self._pending.extend(self._recent[:2])
+            del self._recent[:2]
+
+    def _compact(self) -> None:
+        while True:
+            with self._lock:
+                turns = list(self._pending)
+                previous = self.summary
+                generation = self._generation
+                if not turns:
+                    self._compacting = False
+                    return
+            cap_chars = self.summary_tokens * 4
+            try:
+                summary = self.summarize(previous, turns).strip()
+                if count_tokens(summary) > self.summary_tokens:
+                    summary = summary[:cap_chars]
+            except Exception:
+                # keep the most recent context rather than re-sending everything
+                text = " ".join(f"{m['role']}: {m['content']}" for m in turns)
+                summary = (previous + " " + text).strip()[-cap_chars:]
+            with self._lock:
+                if generation != self._generation:
+                    continue  # conversation was cleared meanwhile
+                self.summary = summary
+                del self._pending[: len(turns)]
+            try:
+                self._changed()
+            except Exception:
+                pass  # a failed save must not stall compaction
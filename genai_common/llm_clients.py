@@ -0,0 +1,51 @@
+from __future__ import annotations
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+from genai_common.history import SUMMARY_TOKENS, Message, summary_prompt
+
+# complete(messages, temperature, max_tokens) -> chat completion response
+Completer = Callable[[List[Message], float, int], Any]
+
+
+def make_sync_client(provider: str, api_key: str) -> Any:
+    # Late import to avoid hard dependency if keys absent
+    if provider == "openai":
+        from openai import OpenAI
+        return OpenAI(api_key=api_key)
+    from groq import Groq
+    return Groq(api_key=api_key)
+
+
+_sync_clients: Dict[Tuple[str, str], Any] = {}
+_sync_clients_lock = threading.Lock()
+
+
+def get_sync_client(provider: str, api_key: str) -> Any:
+    """
+    Process-wide SDK client per (provider, api_key). The SDK clients are
+    thread-safe, so every CLI/batch worker, Streamlit rerun and session
+    reuses the same warm HTTP connection pool instead of opening a new one.
+    """
+    key = (provider, api_key)
+    with _sync_clients_lock:
+        if key not in _sync_clients:
+            _sync_clients[key] = make_sync_client(provider, api_key)
+        return _sync_clients[key]
+
+
+def summarize_turns(complete: Completer, previous: str, turns: List[Message]) -> str:
+    """
+    Fold evicted turns into the rolling summary (runs on the history's
+    background thread). `complete` is the app's own blocking, rate-limited
+    and telemetry-recording completion call.
+    """
+    messages = [
+        {"role": "system", "content": "You write compact, factual conversation summaries."},
+        {"role": "user", "content": summary_prompt(previous, turns)},
+    ]
+    response = complete(messages, 0.2, 2 * SUMMARY_TOKENS)
+    text = response.choices[0].message.content
+    if not text:
+        raise ValueError("empty summary")
+    return text
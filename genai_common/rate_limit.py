@@ -0,0 +1,148 @@
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+# (requests per minute, tokens per minute). Groq numbers are the on-demand
+# free-tier limits; OpenAI numbers assume tier 1. Override per account with
+# LLM_RATE_LIMITS='{"groq:llama-3.1-8b-instant": [30, 6000], ...}'.
+DEFAULT_LIMITS: Dict[str, Tuple[int, int]] = {
+    "groq:llama-3.1-8b-instant": (30, 6_000),
+    "groq:llama-3.3-70b-versatile": (30, 12_000),
+    "groq:*": (30, 6_000),
+    "openai:gpt-5": (500, 500_000),
+    "openai:gpt-5-mini": (500, 500_000),
+    "openai:gpt-5-nano": (500, 200_000),
+    "openai:*": (500, 30_000),
+}
+
+
+def _load_limits() -> Dict[str, Tuple[int, int]]:
+    limits = dict(DEFAULT_LIMITS)
+    raw = os.getenv("LLM_RATE_LIMITS")
+    if raw:
+        limits.update({k: (int(v[0]), int(v[1])) for k, v in json.loads(raw).items()})
+    return limits
+
+
+class RateLimiter:
+    """
+    Two continuously refilling buckets (requests and tokens per minute) for
+    one provider/model. `acquire` blocks, first come first served, until the
+    request fits; the caller then reports real usage through the returned
+    Reservation so over- or under-estimates are paid back.
+    """
+
+    def __init__(self, rpm: int, tpm: int) -> None:
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._stamp = time.monotonic()
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._abandoned: set = set()  # tickets that timed out before their turn
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._stamp
+        self._stamp = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def _wait_time(self, tokens: int) -> float:
+        # a request larger than the whole bucket waits for a full bucket, then overdraws
+        need_tokens = min(tokens, self.tpm)
+        wait_req = max(0.0, (1 - self._requests) * 60.0 / self.rpm)
+        wait_tok = max(0.0, (need_tokens - self._tokens) * 60.0 / self.tpm)
+        return max(wait_req, wait_tok)
+
+    def acquire(self, tokens: int, timeout: Optional[float] = None) -> "Reservation":
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            try:
+                while True:
+                    self._refill()
+                    wait = self._wait_time(tokens) if ticket == self._serving else None
+                    if wait == 0.0:
+                        self._requests -= 1
+                        self._tokens -= tokens
+                        return Reservation(self, tokens)
+                    if deadline is not None:
+                        left = deadline - time.monotonic()
+                        if left <= 0:
+                            raise TimeoutError("Rate limiter wait exceeded timeout.")
+                        wait = left if wait is None else min(wait, left)
+                    self._cond.wait(wait)
+            finally:
+                # on success or timeout, let the next caller in line proceed
+                if ticket == self._serving:
+                    self._serving += 1
+                else:
+                    self._abandoned.add(ticket)
+                while self._serving in self._abandoned:
+                    self._abandoned.discard(self._serving)
+                    self._serving += 1
+                self._cond.notify_all()
+
+    def adjust(self, delta_tokens: int) -> None:
+        """Charge (positive) or refund (negative) tokens after the fact."""
+        with self._cond:
+            self._refill()
+            self._tokens = min(self.tpm, self._tokens - delta_tokens)
+            self._cond.notify_all()
+
+    def backoff(self, seconds: float) -> None:
+        """Provider said 429: empty the buckets so nobody fires for ~`seconds`."""
+        with self._cond:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.tpm / 60.0)
+            self._requests = min(self._requests, -seconds * self.rpm / 60.0 + 1)
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._cond:
+            self._refill()
+            return {"requests_left": round(self._requests, 2), "tokens_left": round(self._tokens), "waiting": self._next_ticket - self._serving}
+
+
+class Reservation:
+    def __init__(self, limiter: RateLimiter, tokens: int, settled: bool = False) -> None:
+        self.limiter = limiter
+        self.tokens = tokens
+        self._settled = settled  # settled=True: an unmetered call, nothing to reconcile
+
+    def settle(self, used_tokens: Optional[int]) -> None:
+        """Reconcile with the provider's reported usage (None keeps the estimate)."""
+        if self._settled:
+            return
+        self._settled = True
+        if used_tokens is not None:
+            self.limiter.adjust(used_tokens - self.tokens)
+
+
+def usage_tokens(obj: Any) -> Optional[int]:
+    """total_tokens from a response or final stream chunk (OpenAI `usage`, Groq `x_groq.usage`)."""
+    usage = getattr(obj, "usage", None) or getattr(getattr(obj, "x_groq", None), "usage", None)
+    total = getattr(usage, "total_tokens", None)
+    return int(total) if total is not None else None
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str, model: str) -> RateLimiter:
+    """Process-wide limiter for provider/model, shared by every Streamlit session."""
+    key = f"{provider}:{model}"
+    with _limiters_lock:
+        if key not in _limiters:
+            limits = _load_limits()
+            rpm, tpm = limits.get(key) or limits.get(f"{provider}:*") or (60, 100_000)
+            _limiters[key] = RateLimiter(rpm, tpm)
+        return _limiters[key]
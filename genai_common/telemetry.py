@@ -0,0 +1,298 @@
+from __future__ import annotations
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_TELEMETRY_PATH = os.path.join(os.path.expanduser("~"), ".cache", "genai", "telemetry.sqlite3")
+TELEMETRY_PATH = os.getenv("LLM_TELEMETRY_PATH", DEFAULT_TELEMETRY_PATH)
+TELEMETRY_ENABLED = os.getenv("LLM_TELEMETRY", "1") not in ("0", "false", "no")
+
+MAX_QUEUE = 10_000   # records buffered for the writer; beyond this they are dropped, never waited on
+WRITE_BATCH = 500    # rows per INSERT transaction
+
+# USD per 1M (input, output) tokens, list prices at the time of writing.
+# Override with LLM_PRICES='{"groq:llama-3.1-8b-instant": [0.05, 0.08], ...}'.
+DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    "groq:llama-3.1-8b-instant": (0.05, 0.08),
+    "groq:llama-3.3-70b-versatile": (0.59, 0.79),
+    "openai:gpt-4o": (2.50, 10.00),
+    "openai:gpt-5": (1.25, 10.00),
+    "openai:gpt-5-mini": (0.25, 2.00),
+    "openai:gpt-5-nano": (0.05, 0.40),
+}
+
+COLUMNS = (
+    "ts", "app", "provider", "model", "kind", "latency_ms", "ttft_ms",
+    "prompt_tokens", "completion_tokens", "cost_usd", "cache", "error", "cancelled",
+)
+
+
+def _load_prices() -> Dict[str, Tuple[float, float]]:
+    prices = dict(DEFAULT_PRICES)
+    raw = os.getenv("LLM_PRICES")
+    if raw:
+        prices.update({k: (float(v[0]), float(v[1])) for k, v in json.loads(raw).items()})
+    return prices
+
+
+_PRICES = _load_prices()
+
+
+def cost_usd(provider: str, model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> Optional[float]:
+    price = _PRICES.get(f"{provider}:{model}")
+    if price is None or prompt_tokens is None:
+        return None
+    return (prompt_tokens * price[0] + (completion_tokens or 0) * price[1]) / 1_000_000
+
+
+def usage_counts(obj: Any) -> Tuple[Optional[int], Optional[int]]:
+    """(prompt, completion) tokens from a response or final stream chunk (OpenAI `usage`, Groq `x_groq.usage`)."""
+    usage = getattr(obj, "usage", None) or getattr(getattr(obj, "x_groq", None), "usage", None)
+    if usage is None:
+        return None, None
+    return getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100) of an unsorted list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+
+class TelemetrySink:
+    """
+    Append-only store of per-call LLM metrics in local SQLite.
+
+    `record` only puts a row on an in-memory queue; a daemon thread writes
+    queued rows in batches, so the request path never waits on disk. When
+    the queue is full rows are counted in `dropped` and discarded.
+    """
+
+    def __init__(self, path: str = TELEMETRY_PATH, max_queue: int = MAX_QUEUE) -> None:
+        self.path = path
+        self.dropped = 0
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=max_queue)
+        self._writer: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_calls (
+                    ts                REAL NOT NULL,
+                    app               TEXT NOT NULL,
+                    provider          TEXT NOT NULL,
+                    model             TEXT NOT NULL,
+                    kind              TEXT NOT NULL,
+                    latency_ms        REAL NOT NULL,
+                    ttft_ms           REAL,
+                    prompt_tokens     INTEGER,
+                    completion_tokens INTEGER,
+                    cost_usd          REAL,
+                    cache             TEXT,
+                    error             TEXT,
+                    cancelled         INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_calls_ts ON llm_calls (ts)")
+            if "cancelled" not in {r[1] for r in conn.execute("PRAGMA table_info(llm_calls)")}:
+                # older files logged abandoned calls as error="cancelled"
+                conn.execute("ALTER TABLE llm_calls ADD COLUMN cancelled INTEGER NOT NULL DEFAULT 0")
+                conn.execute("UPDATE llm_calls SET cancelled = 1, error = NULL WHERE error = 'cancelled'")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def record(
+        self,
+        provider: str,
+        model: str,
+        latency_ms: float,
+        kind: str = "chat",
+        *,
+        app: str,
+        ttft_ms: Optional[float] = None,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+        cache: Optional[str] = None,
+        error: Optional[str] = None,
+        cancelled: bool = False,
+    ) -> None:
+        row = (
+            time.time(), app, provider, model, kind, round(latency_ms, 2),
+            None if ttft_ms is None else round(ttft_ms, 2),
+            prompt_tokens, completion_tokens,
+            cost_usd(provider, model, prompt_tokens, completion_tokens),
+            cache, error, int(cancelled),
+        )
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_writer(self) -> None:
+        if self._writer is not None:
+            return
+        with self._start_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+
+    def _run(self) -> None:
+        conn = self._connect()
+        insert = f"INSERT INTO llm_calls ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        while True:
+            rows = [self._queue.get()]
+            while len(rows) < WRITE_BATCH:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    conn.executemany(insert, rows)
+            except sqlite3.Error:
+                self.dropped += len(rows)
+            finally:
+                for _ in rows:
+                    self._queue.task_done()
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Wait (up to `timeout`) until queued rows are on disk."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+    def rows(self, since: Optional[float] = None, app: Optional[str] = None) -> List[Dict[str, Any]]:
+        sql = f"SELECT {', '.join(COLUMNS)} FROM llm_calls WHERE ts >= ?"
+        args: list = [since or 0]
+        if app:
+            sql += " AND app = ?"
+            args.append(app)
+        with closing(self._connect()) as conn:
+            return [dict(zip(COLUMNS, r)) for r in conn.execute(sql + " ORDER BY ts", args)]
+
+    def summary(self, since: Optional[float] = None, app: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Per provider/model: calls, errors, p50/p95 latency and TTFT, tokens and spend.
+        Cache hits and cancelled calls (hedge losers, streams abandoned by the
+        reader) are counted on their own, outside calls, errors and latency;
+        their tokens and spend still count.
+        """
+        groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for r in self.rows(since, app):
+            groups.setdefault((r["provider"], r["model"]), []).append(r)
+        out = []
+        for (provider, model), rs in sorted(groups.items()):
+            made = [r for r in rs if r["cache"] != "hit" and not r["cancelled"]]
+            ok = [r for r in made if not r["error"]]
+            lat = [r["latency_ms"] for r in ok]
+            ttft = [r["ttft_ms"] for r in ok if r["ttft_ms"] is not None]
+            out.append({
+                "provider": provider,
+                "model": model,
+                "calls": len(made),
+                "errors": sum(1 for r in made if r["error"]),
+                "cancelled": sum(1 for r in rs if r["cancelled"]),
+                "cache_hits": sum(1 for r in rs if r["cache"] == "hit"),
+                "p50_latency_ms": percentile(lat, 50),
+                "p95_latency_ms": percentile(lat, 95),
+                "p50_ttft_ms": percentile(ttft, 50),
+                "p95_ttft_ms": percentile(ttft, 95),
+                "prompt_tokens": sum(r["prompt_tokens"] or 0 for r in rs),
+                "completion_tokens": sum(r["completion_tokens"] or 0 for r in rs),
+                "cost_usd": round(sum(r["cost_usd"] or 0 for r in rs), 6),
+            })
+        return out
+
+
+class LLMCall:
+    """
+    Times one provider call and records it when finished:
+
+        call = start_call("groq", model, kind="stream", app="week_3")
+        for chunk in stream:
+            call.observe(chunk)   # first content -> TTFT, usage when reported
+        call.finish()             # or finish(error=exc) / finish(cancelled=True); later calls are no-ops
+    """
+
+    def __init__(self, sink: Optional[TelemetrySink], provider: str, model: str, kind: str, app: str) -> None:
+        self.sink = sink
+        self.provider = provider
+        self.model = model
+        self.kind = kind
+        self.app = app
+        self._t0 = time.perf_counter()
+        self.ttft_ms: Optional[float] = None
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.cache: Optional[str] = None  # "hit" when a cache answered instead of the provider
+        self._done = False
+
+    def observe(self, obj: Any) -> None:
+        """Feed a response or stream chunk: notes first-token time and any reported usage."""
+        if self.ttft_ms is None:
+            choices = getattr(obj, "choices", None)
+            delta = getattr(choices[0], "delta", None) if choices else None
+            if getattr(delta, "content", None):
+                self.ttft_ms = (time.perf_counter() - self._t0) * 1000
+        prompt, completion = usage_counts(obj)
+        if prompt is not None:
+            self.prompt_tokens, self.completion_tokens = prompt, completion
+
+    def finish(self, response: Any = None, error: Any = None, cancelled: bool = False) -> None:
+        if self._done:
+            return
+        self._done = True
+        if response is not None:  # non-streamed: usage only, TTFT doesn't apply
+            self.prompt_tokens, self.completion_tokens = usage_counts(response)
+        if self.sink is None:
+            return
+        if isinstance(error, BaseException):
+            error = type(error).__name__
+        self.sink.record(
+            self.provider,
+            self.model,
+            (time.perf_counter() - self._t0) * 1000,
+            kind=self.kind,
+            app=self.app,
+            ttft_ms=self.ttft_ms,
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            cache=self.cache,
+            error=error,
+            cancelled=cancelled,
+        )
+
+
+_sink: Optional[TelemetrySink] = None
+_sink_lock = threading.Lock()
+
+
+def get_telemetry() -> Optional[TelemetrySink]:
+    """Process-wide sink (shared across Streamlit sessions); None when LLM_TELEMETRY=0."""
+    global _sink
+    if not TELEMETRY_ENABLED:
+        return None
+    with _sink_lock:
+        if _sink is None:
+            _sink = TelemetrySink()
+        return _sink
+
+
+def start_call(provider: str, model: str, kind: str = "chat", *, app: str) -> LLMCall:
+    """Begin timing one call; `app` ("week_1", "week_3") tags the row for the telemetry page."""
+    return LLMCall(get_telemetry(), provider, model, kind, app)
@@ -0,0 +1,183 @@
+"""
+Resumable, concurrent batch mode for LLMApp
+
+Reads prompts from a JSONL file one line at a time, answers them on a pool
+of worker threads under an RPM/TPM budget, and appends one JSON line per
+finished prompt to the output file as soon as it completes. Re-running with
+the same output file skips every id that already has a response, so a crash
+or Ctrl-C only loses the calls that were in flight.
+
+Input lines:  {"id": "q1", "prompt": "...", "system_prompt": "...", "temperature": 0.2, "max_tokens": 256}
+              (only "prompt" is required; "id" defaults to the 1-based line number)
+Output lines: {"id": "q1", "response": "...", "error": null, "latency_ms": 812.4, "model": "...", "attempts": 1}
+
+    python main.py --batch prompts.jsonl --out results.jsonl --workers 8
+"""
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from main import LLMApp  # also puts the repo root (genai_common/) on sys.path
+from genai_common.rate_limit import RateLimiter, get_limiter
+
+RETRIES = 2            # extra attempts per prompt after an error
+RETRY_BACKOFF = 2.0    # seconds, doubled per attempt
+PROGRESS_EVERY = 5.0   # seconds between progress lines on stderr
+
+
+def completed_ids(out_path: str) -> Set[str]:
+    """
+    Ids that already have a response in the output file
+
+    Failed rows are not counted, so they are retried. A truncated last line
+    (crash mid-write) is ignored.
+    """
+    done: Set[str] = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if row.get("error") is None and row.get("response") is not None:
+                done.add(str(row["id"]))
+    return done
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as fh:
+        fh.seek(-1, os.SEEK_END)
+        return fh.read(1) == b"\n"
+
+
+def iter_prompts(in_path: str, skip: Set[str]) -> Iterator[Tuple[str, Dict]]:
+    """Yield (id, record) for each prompt still to do, streaming the input file."""
+    with open(in_path, encoding="utf-8") as fh:
+        for lineno, line in enumerate(fh, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"skipping line {lineno}: {e}", file=sys.stderr)
+                continue
+            if not isinstance(record, dict) or not record.get("prompt"):
+                print(f"skipping line {lineno}: no prompt", file=sys.stderr)
+                continue
+            item_id = str(record.get("id", lineno))
+            if item_id not in skip:
+                yield item_id, record
+
+
+def _answer(app: LLMApp, item_id: str, record: Dict, temperature: float, max_tokens: int) -> Dict:
+    """One prompt, stateless, with a few retries; never raises."""
+    started = time.perf_counter()
+    error: Optional[str] = None
+    for attempt in range(RETRIES + 1):
+        try:
+            response = app.chat(
+                record["prompt"],
+                system_prompt=record.get("system_prompt"),
+                temperature=record.get("temperature", temperature),
+                max_tokens=record.get("max_tokens", max_tokens),
+                use_history=False,
+            )
+            error = None
+            break
+        except Exception as e:
+            response, error = None, f"{type(e).__name__}: {e}"
+            if attempt < RETRIES:
+                time.sleep(RETRY_BACKOFF * (2 ** attempt))
+    return {
+        "id": item_id,
+        "response": response,
+        "error": error,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "model": app.model,
+        "attempts": attempt + 1,
+    }
+
+
+def run_batch(
+    in_path: str,
+    out_path: str,
+    model: str = "llama-3.3-70b-versatile",
+    workers: int = 4,
+    rpm: Optional[int] = None,
+    tpm: Optional[int] = None,
+    temperature: float = 0.5,
+    max_tokens: int = 1024,
+    system_prompt: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Answer every not-yet-done prompt of `in_path`, appending results to `out_path`
+
+    Args:
+        in_path: Input JSONL (one {"id", "prompt", ...} object per line)
+        out_path: Output JSONL; also the resume checkpoint
+        model: Model for every prompt (provider is inferred as in LLMApp)
+        workers: Concurrent requests
+        rpm, tpm: Rate budget; defaults to the model's known limits (see genai_common.rate_limit)
+        temperature, max_tokens: Defaults for records that don't set their own
+        system_prompt: Default system prompt for records without one
+
+    Returns:
+        Counts of skipped (already done), ok and failed prompts
+    """
+    provider = LLMApp._infer_provider(model)
+    default = get_limiter(provider, model)
+    limiter = RateLimiter(rpm or default.rpm, tpm or default.tpm)
+    app = LLMApp(model=model, default_system_prompt=system_prompt, rate_limiter=limiter)
+
+    skip = completed_ids(out_path)
+    counts = {"skipped": len(skip), "ok": 0, "failed": 0}
+    started = last_report = time.monotonic()
+    stop = threading.Event()
+
+    # bounded in-flight window: the input is never read far ahead of the workers
+    with open(out_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        if out.tell() and not _ends_with_newline(out_path):
+            out.write("\n")  # a crash left half a line; don't glue the next row onto it
+        pending = set()
+        prompts = iter_prompts(in_path, skip)
+        try:
+            while True:
+                while not stop.is_set() and len(pending) < 2 * workers:
+                    nxt = next(prompts, None)
+                    if nxt is None:
+                        stop.set()
+                        break
+                    item_id, record = nxt
+                    pending.add(pool.submit(_answer, app, item_id, record, temperature, max_tokens))
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    row = fut.result()
+                    out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    counts["failed" if row["error"] else "ok"] += 1
+                out.flush()  # each finished line reaches the OS right away
+
+                now = time.monotonic()
+                if now - last_report >= PROGRESS_EVERY:
+                    last_report = now
+                    n = counts["ok"] + counts["failed"]
+                    print(
+                        f"{n} done ({counts['failed']} failed), {n / (now - started):.2f}/s, "
+                        f"{len(pending)} in flight",
+                        file=sys.stderr,
+                    )
+        except KeyboardInterrupt:
+            # stop reading input, keep what's in flight: finish and write it before exiting
+            stop.set()
+            print(f"interrupted; finishing {len(pending)} in-flight prompt(s)...", file=sys.stderr)
+            for fut in pending:
+                out.write(json.dumps(fut.result(), ensure_ascii=False) + "\n")
+            raise
+    return counts
@@ -1,13 +1,27 @@
 """
 Simple LLM Application using Groq and OpenAI API
 """
-from typing import List, Dict
+import os
+import sys
+from functools import partial
+from typing import Any, Dict, Iterator, List
 
 from dotenv import load_dotenv
 
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)  # genai_common/, shared with week_3
+
+from appconfig import env_config
+from genai_common.history import ConversationHistory, count_tokens
+from genai_common.llm_clients import get_sync_client, summarize_turns
+from genai_common.rate_limit import RateLimiter, usage_tokens
+from genai_common.telemetry import start_call
+
 # Load environment variables from .env file
 load_dotenv(override=True)
 
+
 class LLMApp:
 
     def __init__(
@@ -16,6 +30,8 @@ class LLMApp:
         model: str = "llama-3.3-70b-versatile",
         chatbot_name: str = "Atlas",
         default_system_prompt: str | None = None,
+        history: ConversationHistory | None = None,
+        rate_limiter: RateLimiter | None = None,
     ):
         
         """
@@ -26,6 +42,8 @@ class LLMApp:
             model: Model to use for completions
             chatbot_name: A friendly assistant identity
             default_system_prompt: Fallback system prompt if none is supplied
+            history: Existing conversation to continue (e.g. restored from disk)
+            rate_limiter: Optional RPM/TPM budget that `chat` waits on (batch mode)
         """
 
         self.model = model
@@ -41,104 +59,199 @@ class LLMApp:
                 "Avoid introducing unrelated topics."
             )
         )
-        self.conversation_history: List[Dict[str, str]] = []
+        # Recent turns verbatim within a token budget; older turns are folded
+        # into a rolling summary on a background thread
+        self.conversation_history = history if history is not None else ConversationHistory()
+        self.conversation_history.summarize = self._summarize_turns
+        self.rate_limiter = rate_limiter
 
-        # Configure API key & client by provider
+        # Configure API key & (pooled) client by provider
         if self.provider == "groq":
-            from groq import Groq
             self.api_key = api_key or env_config.groq_api_key
             if not self.api_key:
                 raise ValueError("Groq API key must be provided or set in `GROQ_API_KEY`.")
-            self.client = Groq(api_key=self.api_key)
         else:
             # OpenAI
-            from openai import OpenAI
             self.api_key = api_key or env_config.openai_api_key
             if not self.api_key:
                 raise ValueError("OpenAI API key must be provided or set in `OPENAI_API_KEY`.")
-            self.client = OpenAI(api_key=self.api_key)
+        self.client = get_sync_client(self.provider, self.api_key)
 
-    def chat(self, user_message, system_prompt=None, temperature=0.5, max_tokens=1024):
-        """
-        Send a message and get a response
-        
-        Args:
-            user_message: The user's message
-            system_prompt: Optional system prompt to set context
-            temperature: Sampling temperature (0-2)
-            max_tokens: Maximum tokens in response
-            
-        Returns:
-            The assistant's response text
-        """
-
-        # Build messages with persona-aware system prompt
+    def _build_messages(self, user_message: str, system_prompt: str | None, use_history: bool = True) -> List[Dict[str, str]]:
+        """Persona-aware system prompt + conversation history + the new user message."""
         messages: List[Dict[str, str]] = []
 
         # Add system prompt if provided
         persona = system_prompt if system_prompt else self.default_system_prompt
         messages.append({"role": "system", "content": persona})
 
-        # Add conversation history
-        messages.extend(self.conversation_history)
-        
-        # Meta overrides for name/model questions (deterministic, avoids drift)
-        text = (user_message or "").strip()
-        lower = text.lower()
+        # Add conversation history (rolling summary + recent turns)
+        if use_history:
+            messages.extend(self.conversation_history.for_prompt())
+
+        # Add current user's message
+        messages.append({"role": "user", "content": (user_message or "").strip()})
+        return messages
+
+    def _meta_answer(self, user_message: str) -> str | None:
+        """Meta overrides for name/model questions (deterministic, avoids drift)"""
+        lower = (user_message or "").strip().lower()
         if lower in {"what is your name", "what's your name", "who are you"}:
             return f"My name is {self.chatbot_name}."
         if "what is your model" in lower or "model version" in lower:
             prov = "OpenAI" if self.provider == "openai" else "Groq"
             return f"I'm {self.chatbot_name}, running on {prov} model `{self.model}`."
+        return None
 
-        # Add current user's message
-        messages.append({"role": "user", "content": text})
-
-        # Make LLM call
-        # Make LLM call (provider-specific)
+    def _completion_params(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> Dict:
+        """Provider-specific request parameters."""
+        params = {
+            "model": self.model,
+            "messages": messages,
+        }
         if self.provider == "groq":
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-            assistant_message = response.choices[0].message.content
-        else:
-            # --- OpenAI ---
-            is_gpt5 = self.model.startswith("gpt-5")
+            params["temperature"] = temperature
+            params["max_tokens"] = max_tokens
+            return params
 
-            # Build parameters
-            params = {
-                "model": self.model,
-                "messages": messages,
-            }
+        # --- OpenAI ---
+        is_gpt5 = self.model.startswith("gpt-5")
 
-            # GPT-5 only supports default temperature = 1, so skip custom values
-            if not is_gpt5:
-                params["temperature"] = temperature
+        # GPT-5 only supports default temperature = 1, so skip custom values
+        if not is_gpt5:
+            params["temperature"] = temperature
 
-            # GPT-5 uses `max_completion_tokens`; older models use `max_tokens`
-            if is_gpt5:
-                params["max_completion_tokens"] = max_tokens
-            else:
-                params["max_tokens"] = max_tokens
+        # GPT-5 uses `max_completion_tokens`; older models use `max_tokens`
+        if is_gpt5:
+            params["max_completion_tokens"] = max_tokens
+        else:
+            params["max_tokens"] = max_tokens
+        return params
 
-            response = self.client.chat.completions.create(**params)
-            assistant_message = response.choices[0].message.content
+    def chat(self, user_message, system_prompt=None, temperature=0.5, max_tokens=1024, use_history=True):
+        """
+        Send a message and get a response
+        
+        Args:
+            user_message: The user's message
+            system_prompt: Optional system prompt to set context
+            temperature: Sampling temperature (0-2)
+            max_tokens: Maximum tokens in response
+            use_history: If False the call neither sees nor records the
+                conversation, so independent calls can run in parallel threads
+            
+        Returns:
+            The assistant's response text
+        """
+        meta = self._meta_answer(user_message)
+        if meta:
+            return meta
 
+        messages = self._build_messages(user_message, system_prompt, use_history)
+        response = self._complete(messages, temperature, max_tokens)
+        assistant_message = response.choices[0].message.content
 
         # Update in-memory history
-        self.conversation_history.extend([
-            {"role": "user", "content": user_message},
-            {"role": "assistant", "content": assistant_message},
-        ])
+        if use_history:
+            self.conversation_history.append(user_message, assistant_message)
 
         return assistant_message
+
+    def chat_stream(self, user_message, system_prompt=None, temperature=0.5, max_tokens=1024) -> Iterator[str]:
+        """
+        Send a message and yield the response as it is generated
+        
+        Args:
+            user_message: The user's message
+            system_prompt: Optional system prompt to set context
+            temperature: Sampling temperature (0-2)
+            max_tokens: Maximum tokens in response
+            
+        Yields:
+            Text deltas; the full reply is added to history once the stream ends
+        """
+        meta = self._meta_answer(user_message)
+        if meta:
+            yield meta
+            return
+
+        messages = self._build_messages(user_message, system_prompt)
+        params = self._completion_params(messages, temperature, max_tokens)
+        if self.provider == "openai":
+            # final chunk carries token usage (Groq reports it by default)
+            params["stream_options"] = {"include_usage": True}
+        call = start_call(self.provider, self.model, "stream", app="week_1")
+        try:
+            stream = self.client.chat.completions.create(**params, stream=True)
+        except Exception as e:
+            call.finish(error=e)
+            raise
+        parts: List[str] = []
+        try:
+            for chunk in stream:
+                call.observe(chunk)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+            call.finish()
+        except Exception as e:
+            call.finish(error=e)
+            raise
+        finally:
+            call.finish(cancelled=True)  # consumer stopped early; no-op if already finished
+            # stop generation server-side if the consumer stops reading
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+
+        # Update in-memory history
+        self.conversation_history.append(user_message, "".join(parts))
     
     def clear_history(self):
         """Clear the conversation history"""
-        self.conversation_history = []
+        self.conversation_history.clear()
+
+    def _complete(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int, kind: str = "chat") -> Any:
+        """
+        One blocking completion: rate-limited (if a budget is set) and timed for telemetry
+        
+        Args:
+            messages: Full prompt, system message first
+            temperature: Sampling temperature (0-2)
+            max_tokens: Maximum tokens in response
+            kind: Telemetry label ("chat" or "summary")
+            
+        Returns:
+            The provider's chat completion response
+        """
+        # Wait for room in the RPM/TPM budget (prompt + max output), if one is set
+        reservation = None
+        if self.rate_limiter is not None:
+            estimate = sum(count_tokens(m["content"]) + 4 for m in messages) + max_tokens
+            reservation = self.rate_limiter.acquire(estimate)
+
+        # Make LLM call (provider-specific), timed for telemetry
+        call = start_call(self.provider, self.model, kind, app="week_1")
+        try:
+            response = self.client.chat.completions.create(
+                **self._completion_params(messages, temperature, max_tokens)
+            )
+        except Exception as e:
+            call.finish(error=e)
+            if reservation is not None:
+                reservation.settle(0)
+            raise
+        call.finish(response)
+        if reservation is not None:
+            reservation.settle(usage_tokens(response))
+        return response
+
+    def _summarize_turns(self, previous: str, turns: List[Dict[str, str]]) -> str:
+        """Fold older turns into the rolling summary (called off the request path)"""
+        return summarize_turns(partial(self._complete, kind="summary"), previous, turns)
 
     @staticmethod
     def _infer_provider(model: str) -> str:
@@ -151,11 +264,44 @@ class LLMApp:
         return "groq"
 
 if __name__=="__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ask one question, or answer a JSONL file of prompts with --batch.")
+    parser.add_argument("--model", default="llama-3.3-70b-versatile")
+    parser.add_argument("--batch", metavar="IN.jsonl", help="prompts to answer (see batch.py for the format)")
+    parser.add_argument("--out", metavar="OUT.jsonl", help="results; re-running with the same file resumes")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent requests")
+    parser.add_argument("--rpm", type=int, help="requests per minute (default: the model's known limit)")
+    parser.add_argument("--tpm", type=int, help="tokens per minute (default: the model's known limit)")
+    parser.add_argument("--temperature", type=float, default=0.5)
+    parser.add_argument("--max-tokens", type=int, default=1024)
+    parser.add_argument("--system-prompt")
+    args = parser.parse_args()
+
+    if args.batch:
+        from batch import run_batch
+
+        out_path = args.out or os.path.splitext(args.batch)[0] + ".out.jsonl"
+        counts = run_batch(
+            args.batch,
+            out_path,
+            model=args.model,
+            workers=args.workers,
+            rpm=args.rpm,
+            tpm=args.tpm,
+            temperature=args.temperature,
+            max_tokens=args.max_tokens,
+            system_prompt=args.system_prompt,
+        )
+        print(f"{counts['ok']} ok, {counts['failed']} failed, {counts['skipped']} already done -> {out_path}")
+        raise SystemExit(1 if counts["failed"] else 0)
 
     # Initialize the app
-    app = LLMApp()
+    app = LLMApp(model=args.model, default_system_prompt=args.system_prompt)
 
     # while True:
     message = input(f"What do you want to ask: ")
-    response = app.chat(message)
-    print(f"\nAssistant Response: {response}\n")
+    print("\nAssistant Response: ", end="", flush=True)
+    for delta in app.chat_stream(message, temperature=args.temperature, max_tokens=args.max_tokens):
+        print(delta, end="", flush=True)
+    print("\n")
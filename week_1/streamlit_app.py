@@ -2,8 +2,11 @@
 Streamlit Frontend for Groq + OPENAI LLM Application
 """
 import streamlit as st
-from main import LLMApp
+from main import LLMApp  # also puts the repo root (genai_common/) on sys.path
+from genai_common.history import ConversationHistory
+from genai_common.conversation_store import get_conversation_store
 import os
+import uuid
 
 # page configuration
 st.set_page_config(
@@ -12,12 +15,19 @@ st.set_page_config(
     layout="centered"
 )
 
+# conversations are keyed by ?sid= in the URL and saved to local SQLite,
+# so a reload or server restart picks up where the chat left off
+store = get_conversation_store()
+session_id = st.query_params.get("sid")
+if not session_id:
+    session_id = st.query_params["sid"] = uuid.uuid4().hex
+
 # initialize session state
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-if "llm_app" not in st.session_state:
+if st.session_state.get("session_id") != session_id:
+    st.session_state.session_id = session_id
+    st.session_state.messages = store.messages(session_id)
+    st.session_state.history = store.bind(session_id, ConversationHistory())
     st.session_state.llm_app = None
-if "last_config" not in st.session_state:
     st.session_state.last_config = {}
 
 # Title and description
@@ -90,8 +100,8 @@ with st.sidebar:
     # Clear chat button
     if st.button("Clear Chat History", use_container_width=True):
         st.session_state.messages = []
-        if st.session_state.llm_app:
-            st.session_state.llm_app.clear_history()
+        st.session_state.history.clear()
+        store.save_messages(session_id, [])
 
         st.rerun()
 
@@ -128,10 +138,15 @@ if _needs_reinit(st.session_state.last_config, current_config) or st.session_sta
             model=model,
             chatbot_name=current_config["chatbot_name"] or "Atlas",
             default_system_prompt=(current_config["system_prompt"] or None),
+            history=st.session_state.history,
         )
+        # When changing persona/model, clear history to avoid mixing contexts
+        # (not on first load, which continues the saved conversation)
+        if st.session_state.last_config:
+            st.session_state.messages = []
+            st.session_state.history.clear()
+            store.save_messages(session_id, [])
         st.session_state.last_config = current_config
-        # When changing persona/model, clear UI history to avoid mixing contexts
-        st.session_state.messages = []
     except Exception as e:
         st.error(f"Error initializing LLM App: {str(e)}")
 
@@ -167,23 +182,25 @@ if prompt := st.chat_input("Type your message here..."):
 
         # get assistant's response
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                try:
-                    response = st.session_state.llm_app.chat(
+            try:
+                # render tokens as they arrive instead of waiting on a spinner
+                response = st.write_stream(
+                    st.session_state.llm_app.chat_stream(
                         user_message=prompt,
                         system_prompt=system_prompt if system_prompt else None,
                         temperature=temperature,
                         max_tokens=max_tokens
                     )
-
-                    st.markdown(response)
-                    st.session_state.messages.append(
-                        {
-                            "role": "assistant",
-                            "content": f"{response}"
-                        }
-                    )
-                except Exception as e:
-                    st.error(f"Error generating response: {str(e)}")
+                )
+
+                st.session_state.messages.append(
+                    {
+                        "role": "assistant",
+                        "content": f"{response}"
+                    }
+                )
+                store.save_messages(session_id, st.session_state.messages)
+            except Exception as e:
+                st.error(f"Error generating response: {str(e)}")
 
 
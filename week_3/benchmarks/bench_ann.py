@@ -0,0 +1,134 @@
+"""
+HNSW vs exact search: recall@k and query latency on the same corpus.
+
+    python benchmarks/bench_ann.py --n 200000 --dim 384
+    python benchmarks/bench_ann.py --npy ~/.cache/genai/npindex/<collection>/vectors.npy --ef 16 32 64 128
+    python benchmarks/bench_ann.py --M 32 --ef-construction 400 --json
+
+Without --npy the corpus is a synthetic clustered embedding set (roughly
+how sentence embeddings of a document collection are distributed).
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from components.ann_index import HnswVectorStore
+from components.vector_index import _normalize
+
+
+def clustered_vectors(n: int, dim: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assign = rng.integers(0, clusters, n)
+    return _normalize(centers[assign] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32))
+
+
+def exact_topk(corpus: np.ndarray, queries: np.ndarray, k: int, batch: int = 256) -> np.ndarray:
+    out = []
+    for i in range(0, len(queries), batch):
+        sims = queries[i:i + batch] @ corpus.T
+        part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(sims, part, axis=1), axis=1)
+        out.append(np.take_along_axis(part, order, axis=1))
+    return np.vstack(out)
+
+
+def percentiles(samples: list) -> dict:
+    arr = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(arr, 50)), 3), "p99_ms": round(float(np.percentile(arr, 99)), 3)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--npy", help="corpus embedding matrix (.npy); default: synthetic")
+    ap.add_argument("--n", type=int, default=100_000, help="synthetic corpus size")
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--M", type=int, default=16)
+    ap.add_argument("--ef-construction", type=int, default=200)
+    ap.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    ap.add_argument("--batch", type=int, default=10_000, help="incremental insert batch size")
+    ap.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = ap.parse_args()
+
+    if args.npy:
+        corpus = _normalize(np.load(os.path.expanduser(args.npy), mmap_mode="r"))
+    else:
+        corpus = clustered_vectors(args.n, args.dim)
+    rng = np.random.default_rng(1)
+    # queries = perturbed corpus points, so true neighbours exist
+    picks = rng.integers(0, len(corpus), args.queries)
+    queries = _normalize(corpus[picks] + 0.1 * rng.standard_normal((args.queries, corpus.shape[1])).astype(np.float32))
+
+    t0 = time.perf_counter()
+    truth = exact_topk(corpus, queries, args.k)
+    exact_lat = []
+    for q in queries[:200]:
+        t = time.perf_counter()
+        exact_topk(corpus, q[None, :], args.k)
+        exact_lat.append(time.perf_counter() - t)
+    exact = {"index": "exact", "batch_s": round(time.perf_counter() - t0, 3), **percentiles(exact_lat)}
+
+    tmp = tempfile.mkdtemp(prefix="bench_ann_")
+    try:
+        store = HnswVectorStore(None, tmp, M=args.M, ef_construction=args.ef_construction)
+        t0 = time.perf_counter()
+        for i in range(0, len(corpus), args.batch):
+            rows = range(i, min(i + args.batch, len(corpus)))
+            store.upsert_embeddings([str(r) for r in rows], corpus[i:rows.stop], [""] * len(rows))
+        build_s = time.perf_counter() - t0
+        store.persist()
+        index_mb = os.path.getsize(os.path.join(tmp, "index.bin")) / 2**20
+
+        results = []
+        for ef in args.ef:
+            lat, hits = [], 0
+            for qi, q in enumerate(queries):
+                t = time.perf_counter()
+                found = store.search_vectors(q[None, :], args.k, ef=ef)[0]
+                lat.append(time.perf_counter() - t)
+                hits += len({label for label, _ in found} & set(truth[qi].tolist()))
+            results.append({
+                "index": "hnsw",
+                "M": args.M,
+                "ef_construction": args.ef_construction,
+                "ef_search": ef,
+                f"recall@{args.k}": round(hits / (len(queries) * args.k), 4),
+                **percentiles(lat),
+            })
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {
+        "corpus": len(corpus),
+        "dim": int(corpus.shape[1]),
+        "k": args.k,
+        "build_s": round(build_s, 2),
+        "index_mb": round(index_mb, 1),
+        "exact": exact,
+        "hnsw": results,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"corpus={report['corpus']:,} dim={report['dim']} k={args.k} "
+          f"build={report['build_s']}s index={report['index_mb']}MB")
+    print(f"exact: p50={exact['p50_ms']}ms p99={exact['p99_ms']}ms (recall 1.0)")
+    print(f"{'ef_search':>9} {'recall':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for r in results:
+        print(f"{r['ef_search']:>9} {r[f'recall@{args.k}']:>8} {r['p50_ms']:>8} {r['p99_ms']:>8}")
+
+
+if __name__ == "__main__":
+    main()
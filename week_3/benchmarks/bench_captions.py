@@ -0,0 +1,150 @@
+"""
+Caption parser benchmark: legacy line-filter cleaner vs components.captions.
+
+Reports, per video/caption file, parse time and the LLM input tokens saved by
+stripping inline tags and collapsing rolling auto-caption duplicates.
+
+    python benchmarks/bench_captions.py captions/*.vtt captions/*.srv3
+    python benchmarks/bench_captions.py --synthetic 5 --minutes 30
+    python benchmarks/bench_captions.py --synthetic 3 --json
+"""
+import argparse
+import html
+import json
+import os
+import random
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from components.captions import parse_captions
+from components.chunking import count_tokens
+
+WORDS = (
+    "so today we are going to look at how the model handles long context and why "
+    "retrieval matters when you have a lot of documents that need to be searched quickly"
+).split()
+
+
+def legacy_clean_vtt(vtt_text: str) -> str:
+    """The original yt_fetch cleaner, kept verbatim as the baseline."""
+    lines = []
+    for line in vtt_text.splitlines():
+        if not line.strip():
+            continue
+        if line.startswith("WEBVTT"):
+            continue
+        if re.search(r"\d{2}:\d{2}:\d{2}\.\d{3}\s-->\s\d{2}:\d{2}:\d{2}\.\d{3}", line):
+            continue
+        if re.match(r"^\d+$", line.strip()):
+            continue
+        lines.append(line.strip())
+    return " ".join(lines)
+
+
+def legacy_parse_srv3(xml_text: str) -> str:
+    try:
+        root = ET.fromstring(xml_text)
+        texts = []
+        for t in root.iter():
+            if t.tag.lower().endswith("text") and (t.text or "").strip():
+                texts.append(html.unescape(t.text.strip()))
+        return " ".join(texts)
+    except Exception:
+        return ""
+
+
+def _fmt(secs: float) -> str:
+    h, rem = divmod(secs, 3600)
+    m, s = divmod(rem, 60)
+    return f"{int(h):02d}:{int(m):02d}:{s:06.3f}"
+
+
+def synthetic_auto_vtt(minutes: int, seed: int = 0) -> str:
+    """YouTube-style rolling auto-captions: each cue repeats the previous line."""
+    rnd = random.Random(seed)
+    out = ["WEBVTT", "Kind: captions", "Language: en", ""]
+    t, prev = 0.0, " "
+    while t < minutes * 60:
+        words = [rnd.choice(WORDS) for _ in range(rnd.randint(5, 9))]
+        timed = words[0] + "".join(
+            f"<{_fmt(t + 0.3 * (i + 1))}><c> {w}</c>" for i, w in enumerate(words[1:])
+        )
+        out += [f"{_fmt(t)} --> {_fmt(t + 2.5)} align:start position:0%", prev, timed, ""]
+        line = " ".join(words)
+        # 10ms snapshot cue with the completed line
+        out += [f"{_fmt(t + 2.5)} --> {_fmt(t + 2.51)} align:start position:0%", prev, line, ""]
+        prev, t = line, t + 2.51
+    return "\n".join(out)
+
+
+def _best_ms(fn, repeat: int):
+    """(fastest wall time in ms, result) over `repeat` runs."""
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return round(best * 1000, 2), out
+
+
+def bench_one(name: str, body: str, ext: str, model: str, repeat: int = 5) -> dict:
+    legacy_fn = legacy_parse_srv3 if ext in ("srv3", "xml") else legacy_clean_vtt
+    legacy_ms, legacy = _best_ms(lambda: legacy_fn(body), repeat)
+    parse_ms, parsed = _best_ms(lambda: parse_captions(body, ext, dedupe=True).text, repeat)  # auto-caption tracks
+    before, after = count_tokens(legacy, model), count_tokens(parsed, model)
+    return {
+        "video": name,
+        "legacy_ms": legacy_ms,
+        "parse_ms": parse_ms,
+        "legacy_tokens": before,
+        "tokens": after,
+        "tokens_saved": before - after,
+        "saved_pct": round(100 * (before - after) / before, 1) if before else 0.0,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("files", nargs="*", help="caption files (.vtt, .srv3, .json3)")
+    ap.add_argument("--synthetic", type=int, default=0, help="number of synthetic auto-caption videos")
+    ap.add_argument("--minutes", type=int, default=20, help="length of each synthetic video")
+    ap.add_argument("--model", default="llama-3.3-70b-versatile", help="tokenizer to count with")
+    ap.add_argument("--repeat", type=int, default=5, help="timed runs per parser; the fastest is reported")
+    ap.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = ap.parse_args()
+
+    results = []
+    for path in args.files:
+        with open(path, encoding="utf-8", errors="ignore") as fh:
+            body = fh.read()
+        ext = os.path.splitext(path)[1].lstrip(".").lower()
+        results.append(bench_one(os.path.basename(path), body, ext, args.model, args.repeat))
+    for i in range(args.synthetic):
+        body = synthetic_auto_vtt(args.minutes, seed=i)
+        results.append(bench_one(f"synthetic-{i} ({args.minutes} min)", body, "vtt", args.model, args.repeat))
+
+    if not results:
+        ap.error("pass caption files and/or --synthetic N")
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'video':32} {'legacy ms':>10} {'parse ms':>9} {'legacy tok':>11} {'tokens':>8} {'saved':>8} {'%':>6}")
+    for r in results:
+        print(
+            f"{r['video'][:32]:32} {r['legacy_ms']:>10} {r['parse_ms']:>9} {r['legacy_tokens']:>11} "
+            f"{r['tokens']:>8} {r['tokens_saved']:>8} {r['saved_pct']:>6}"
+        )
+    total_before = sum(r["legacy_tokens"] for r in results)
+    total_saved = sum(r["tokens_saved"] for r in results)
+    print(f"\nTotal input tokens saved: {total_saved:,} of {total_before:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Embedding throughput on CPU: chunks/s per backend and batch size.
+
+    python benchmarks/bench_embeddings.py
+    python benchmarks/bench_embeddings.py --backends torch onnx int8 --batch-sizes 16 64 128 --chunks 2000
+    python benchmarks/bench_embeddings.py --cache   # also time warm reads through the on-disk cache
+
+ONNX backends need `pip install "sentence-transformers[onnx]"`.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from components.embedding_cache import CachedEmbeddings, EmbeddingCache
+from components.rag_utils import EMBED_MODEL, EmbeddingService
+
+VOCAB = (
+    "model data index query vector chunk retrieval latency token embedding batch cache "
+    "document source answer context corpus search policy release memory process request"
+).split()
+
+
+def synthetic_chunks(n: int, words: int = 180, seed: int = 0) -> list[str]:
+    """~1000-character chunks, the size chunk_docs produces by default."""
+    rnd = random.Random(seed)
+    return [" ".join(rnd.choice(VOCAB) for _ in range(words)) for _ in range(n)]
+
+
+def bench_cache(svc: EmbeddingService, model: str, texts: list[str]) -> dict:
+    """
+    Cold pass through one cache handle, warm pass through a second handle on
+    the same directory opened before anything was written (as another
+    process would be), so the warm reads exercise dim discovery from meta.
+    """
+    with tempfile.TemporaryDirectory(prefix="embcache_") as path:
+        writer = CachedEmbeddings(model, lambda: svc, EmbeddingCache(path))
+        reader = CachedEmbeddings(model, lambda: svc, EmbeddingCache(path))
+        t0 = time.perf_counter()
+        cold = writer.encode(texts)
+        cold_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        warm = reader.encode(texts)
+        warm_s = time.perf_counter() - t0
+        if reader.misses:
+            raise AssertionError(f"second handle missed {reader.misses} cached vectors")
+        if not np.allclose(cold, warm, atol=1e-2):  # float16 rows
+            raise AssertionError("second handle read different vectors")
+    return {"cold_s": round(cold_s, 3), "warm_s": round(warm_s, 3), "warm_chunks_per_s": round(len(texts) / warm_s, 1)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model", default=EMBED_MODEL)
+    ap.add_argument("--backends", nargs="+", default=["torch"])
+    ap.add_argument("--batch-sizes", nargs="+", type=int, default=[16, 64, 128])
+    ap.add_argument("--chunks", type=int, default=1000)
+    ap.add_argument("--cache", action="store_true", help="also time cold vs warm encodes through the embedding cache")
+    ap.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = ap.parse_args()
+
+    texts = synthetic_chunks(args.chunks)
+    results = []
+    for backend in args.backends:
+        t0 = time.perf_counter()
+        try:
+            svc = EmbeddingService(args.model, backend=backend)
+        except Exception as e:
+            results.append({"backend": backend, "error": str(e)})
+            continue
+        load_s = time.perf_counter() - t0
+        svc.encode(texts[:8])  # warm-up
+        for bs in args.batch_sizes:
+            svc.batch_size = bs
+            t0 = time.perf_counter()
+            svc.encode(texts)
+            secs = time.perf_counter() - t0
+            results.append({
+                "backend": backend,
+                "batch_size": bs,
+                "chunks": len(texts),
+                "load_s": round(load_s, 2),
+                "encode_s": round(secs, 3),
+                "chunks_per_s": round(len(texts) / secs, 1),
+            })
+        if args.cache:
+            results.append({"backend": backend, "cache": bench_cache(svc, f"{args.model}:{backend}", texts)})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'backend':10} {'batch':>6} {'load s':>7} {'encode s':>9} {'chunks/s':>9}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:10} error: {r['error']}")
+            continue
+        if "cache" in r:
+            c = r["cache"]
+            print(f"{r['backend']:10} cache: cold {c['cold_s']} s, warm {c['warm_s']} s ({c['warm_chunks_per_s']} chunks/s)")
+            continue
+        print(f"{r['backend']:10} {r['batch_size']:>6} {r['load_s']:>7} {r['encode_s']:>9} {r['chunks_per_s']:>9}")
+
+
+if __name__ == "__main__":
+    main()
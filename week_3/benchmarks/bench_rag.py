@@ -0,0 +1,262 @@
+"""
+End-to-end RAG benchmark, fully offline: synthetic corpus, hashing
+embedder and a fake LLM, so numbers track our code (chunking, ingestion,
+index backends, context packing) rather than model or network speed.
+
+    python benchmarks/bench_rag.py
+    python benchmarks/bench_rag.py --sizes 200 2000 --backends numpy hnsw chroma --json
+    python benchmarks/bench_rag.py --token-budget 0 --out before.json   # verbatim top-k prompts
+
+Per corpus size and backend it reports chunking and ingestion throughput
+(chunks/s), index build time and RSS growth, answer_with_rag latency
+p50/p99, recall@k of retrieval against exact search, prompt tokens per
+answer, and the share of repeated questions answered from the RAG cache. --out writes the same JSON to a file for regression diffs.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from langchain_core.embeddings import Embeddings
+
+from components.chunking import count_tokens
+from components.context_packing import CONTEXT_TOKEN_BUDGET
+from components.ingest_pipeline import ingest_files_pipelined
+from components.rag_cache import DEFAULT_ANSWER_THRESHOLD, RAGCache
+from components.rag_utils import answer_with_rag, chunk_docs, search_with_relevance
+from components.vector_index import NumpyVectorStore, _normalize
+
+TOPICS = [
+    "billing invoice refund payment card charge subscription renewal",
+    "deploy release rollback pipeline build artifact staging canary",
+    "latency cache memory index query throughput shard replica",
+    "privacy consent retention export deletion audit policy gdpr",
+    "onboarding account password login session token reset sso",
+    "pricing plan tier quota limit upgrade discount trial",
+    "incident outage alert pager escalation postmortem severity",
+    "storage bucket upload file quota backup snapshot restore",
+]
+FILLER = "the a of to and in for with on that this is are was be by as from at".split()
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words feature hashing; no model download needed."""
+
+    def __init__(self, dim: int = 384) -> None:
+        self.dim = dim
+
+    def encode(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            words = text.lower().split()
+            for a, b in zip(words, words[1:] + [""]):
+                out[i, zlib.crc32(a.encode()) % self.dim] += 1.0
+                out[i, zlib.crc32(f"{a} {b}".encode()) % self.dim] += 0.5
+        return _normalize(out)
+
+    def embed_documents(self, texts):
+        return self.encode(list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self.encode([text])[0].tolist()
+
+
+class FakeLLM:
+    """Records prompt sizes and returns instantly."""
+
+    def __init__(self, model: str) -> None:
+        self.model = model
+        self.prompt_tokens = []
+
+    def __call__(self, prompt: str) -> str:
+        self.prompt_tokens.append(count_tokens(prompt, self.model))
+        return "ok"
+
+
+def synthetic_corpus(docs: int, paragraphs: int = 12, seed: int = 0):
+    """(name, text) documents; each paragraph leans on one topic's vocabulary."""
+    rnd = random.Random(seed)
+    corpus = []
+    for d in range(docs):
+        paras = []
+        for _ in range(paragraphs):
+            topic = rnd.choice(TOPICS).split()
+            sentences = []
+            for _ in range(rnd.randint(3, 6)):
+                words = [rnd.choice(topic if rnd.random() < 0.4 else FILLER) for _ in range(rnd.randint(8, 18))]
+                words.append(f"doc{d}")
+                sentences.append(" ".join(words).capitalize() + ".")
+            paras.append(" ".join(sentences))
+        corpus.append((f"doc_{d}.txt", "\n\n".join(paras)))
+    return corpus
+
+
+def synthetic_queries(corpus, n: int, seed: int = 1):
+    """Short questions built from a random sentence of a random document."""
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        _, text = rnd.choice(corpus)
+        sentence = rnd.choice(text.replace("\n\n", " ").split(". "))
+        words = sentence.split()
+        out.append("What about " + " ".join(rnd.sample(words, min(6, len(words)))) + "?")
+    return out
+
+
+def rss_mb() -> float:
+    """Current RSS on Linux; peak RSS elsewhere."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(samples: list) -> dict:
+    arr = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(arr, 50)), 3), "p99_ms": round(float(np.percentile(arr, 99)), 3)}
+
+
+def dir_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return round(total / 2**20, 2)
+
+
+def open_store(backend: str, embedding: Embeddings, path: str):
+    if backend == "numpy":
+        return NumpyVectorStore(embedding, persist_directory=path)
+    if backend == "hnsw":
+        from components.ann_index import HnswVectorStore
+
+        return HnswVectorStore(embedding, persist_directory=path)
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+
+        return Chroma(collection_name="bench", embedding_function=embedding, persist_directory=path)
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def run(backend: str, corpus, queries, embedding: HashingEmbeddings, args) -> dict:
+    tmp = tempfile.mkdtemp(prefix=f"bench_rag_{backend}_")
+    try:
+        store = open_store(backend, embedding, tmp)
+        files = [(name, io.BytesIO(text.encode("utf-8"))) for name, text in corpus]
+        rss0 = rss_mb()
+        t0 = time.perf_counter()
+        stats = ingest_files_pipelined(store, files, workers=args.workers)
+        build_s = time.perf_counter() - t0
+        rss_delta = rss_mb() - rss0
+
+        got = store.get(include=["documents"])
+        ids, texts = got["ids"], got["documents"]
+        exact = embedding.encode(texts)
+
+        llm = FakeLLM(args.model)
+        budget = args.token_budget or None
+        latencies, hits = [], 0
+        for q in queries:
+            t = time.perf_counter()
+            answer_with_rag(store, llm, q, k=args.k, token_budget=budget, model=args.model)
+            latencies.append(time.perf_counter() - t)
+
+            qvec = embedding.encode([q])[0]
+            truth = {ids[i] for i in np.argsort(-(exact @ qvec))[: args.k]}
+            found = search_with_relevance(store, qvec.tolist(), args.k)
+            hits += len(truth & {d.metadata.get("chunk_hash") for d, _ in found})
+
+        # the app's reuse path: one scope (model, sampling, persona) per session and
+        # history-free prompts, so asking the same question again must skip the LLM
+        cache, reuse_llm = RAGCache(answer_threshold=DEFAULT_ANSWER_THRESHOLD), FakeLLM(args.model)
+        for q in queries:
+            for _ in range(2):
+                answer_with_rag(store, reuse_llm, q, k=args.k, cache=cache, scope="bench", token_budget=budget, model=args.model)
+        if cache.stats["answer_hits"] < len(queries):
+            raise AssertionError(f"only {cache.stats['answer_hits']} of {len(queries)} repeated questions reused an answer")
+
+        return {
+            "backend": backend,
+            "chunks": stats["chunks"],
+            "ingest_chunks_per_s": round(stats["chunks"] / build_s, 1),
+            "build_s": round(build_s, 3),
+            "build_rss_mb": round(rss_delta, 1),
+            "index_disk_mb": dir_mb(tmp),
+            "stages": stats["stages"],
+            "query": percentiles(latencies),
+            f"recall@{args.k}": round(hits / (len(queries) * args.k), 4),
+            "prompt_tokens_mean": round(float(np.mean(llm.prompt_tokens)), 1),
+            "prompt_tokens_p99": int(np.percentile(llm.prompt_tokens, 99)),
+            "answer_reuse": round(1 - len(reuse_llm.prompt_tokens) / (2 * len(queries)), 4),
+        }
+    except ImportError as e:
+        return {"backend": backend, "error": f"missing dependency: {e}"}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100, 1000], help="documents per corpus")
+    ap.add_argument("--backends", nargs="+", default=["numpy", "hnsw"])
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--token-budget", type=int, default=CONTEXT_TOKEN_BUDGET, help="context tokens per prompt; 0 = verbatim top-k")
+    ap.add_argument("--model", default="llama-3.1-8b-instant", help="tokenizer used for prompt token counts")
+    ap.add_argument("--workers", type=int, default=2, help="parse processes")
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    ap.add_argument("--out", help="also write the JSON report here")
+    args = ap.parse_args()
+
+    embedding = HashingEmbeddings(args.dim)
+    report = {"config": vars(args), "runs": []}
+    for size in args.sizes:
+        corpus = synthetic_corpus(size)
+        queries = synthetic_queries(corpus, args.queries)
+        t0 = time.perf_counter()
+        n_chunks = len(chunk_docs([t for _, t in corpus], sources=[n for n, _ in corpus]))
+        chunk_s = time.perf_counter() - t0
+        entry = {
+            "docs": size,
+            "chars": sum(len(t) for _, t in corpus),
+            "chunk_docs_per_s": round(n_chunks / chunk_s, 1),
+            "backends": [run(b, corpus, queries, embedding, args) for b in args.backends],
+        }
+        report["runs"].append(entry)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'docs':>6} {'backend':8} {'chunks':>7} {'ingest/s':>9} {'build s':>8} {'rss MB':>7} "
+          f"{'p50 ms':>7} {'p99 ms':>7} {'recall':>7} {'prompt tok':>10}")
+    for entry in report["runs"]:
+        for r in entry["backends"]:
+            if "error" in r:
+                print(f"{entry['docs']:>6} {r['backend']:8} error: {r['error']}")
+                continue
+            print(f"{entry['docs']:>6} {r['backend']:8} {r['chunks']:>7} {r['ingest_chunks_per_s']:>9} "
+                  f"{r['build_s']:>8} {r['build_rss_mb']:>7} {r['query']['p50_ms']:>7} {r['query']['p99_ms']:>7} "
+                  f"{r[f'recall@{args.k}']:>7} {r['prompt_tokens_mean']:>10}")
+        print(f"{entry['docs']:>6} chunk_docs: {entry['chunk_docs_per_s']} chunks/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Cold-start import profile and budget check for the week_3 Streamlit app.
+
+Imports every module-level import of streamlit_app.py (read with `ast`, so
+the list never drifts from the app) in a fresh interpreter under
+`python -X importtime`, then reports the slowest packages and fails when:
+
+- total import time is over --budget-ms (default 1500, env IMPORT_BUDGET_MS), or
+- a heavy, tool-specific package was loaded at start (it belongs behind
+  the tool that needs it; see news_fetch, yt_fetch and the RAG section).
+
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --budget-ms 800 --top 25 --json
+    python benchmarks/import_budget.py --exclude streamlit   # app's own cost only
+
+Exit status is 1 on a breach, so it can gate CI. Take the best of a few
+--runs: the first run after a deploy also pays for .pyc compilation.
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(BASE_DIR, "streamlit_app.py")
+
+# must not be imported until their tool is used
+LAZY_PACKAGES = [
+    "trafilatura",
+    "readability",
+    "bs4",
+    "lxml",
+    "yt_dlp",
+    "youtube_transcript_api",
+    "pytube",
+    "langchain_core",
+    "langchain_community",
+    "langchain_text_splitters",
+    "langchain_huggingface",
+    "chromadb",
+    "sentence_transformers",
+    "torch",
+    "hnswlib",
+    "pypdf",
+    "docx",
+    "tiktoken",
+    "groq",
+    "openai",
+]
+
+
+def app_imports(path: str = APP, exclude=()) -> list:
+    """Import statements at module level of the app, as source lines."""
+    with open(path, encoding="utf-8") as fh:
+        tree = ast.parse(fh.read(), path)
+    lines = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            names = [a.name for a in node.names] if isinstance(node, ast.Import) else [node.module or ""]
+            if any(n.split(".")[0] in exclude for n in names):
+                continue
+            lines.append(ast.unparse(node))
+    return lines
+
+
+def _importtime(code: str) -> list:
+    """(depth, module, cumulative µs) per line of `python -X importtime -c code`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BASE_DIR,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [BASE_DIR, os.getenv("PYTHONPATH")]))},
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"importing the app's modules failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cum_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((depth, name.strip(), int(cum_us)))
+    return rows
+
+
+def profile(lines: list) -> dict:
+    """Per-module cumulative µs and the app's direct imports, minus interpreter start-up."""
+    startup = {mod for _, mod, _ in _importtime("pass")}
+    modules = {}
+    top_level = []
+    for depth, mod, us in _importtime("\n".join(lines)):
+        if mod in startup:
+            continue
+        modules[mod] = us
+        if depth == 0:
+            top_level.append((mod, us))
+    return {"modules": modules, "top_level": top_level}
+
+
+def by_package(modules: dict) -> dict:
+    """Largest cumulative time per top-level package (its outermost import)."""
+    out = defaultdict(int)
+    for mod, us in modules.items():
+        pkg = mod.split(".")[0]
+        out[pkg] = max(out[pkg], us)
+    return dict(out)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1500")))
+    ap.add_argument("--runs", type=int, default=3, help="fresh interpreters; the fastest one is reported")
+    ap.add_argument("--top", type=int, default=15, help="slowest packages to list")
+    ap.add_argument("--exclude", nargs="*", default=[], help="top-level packages to leave out (e.g. streamlit)")
+    ap.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = ap.parse_args()
+
+    lines = app_imports(exclude=set(args.exclude))
+    runs = [profile(lines) for _ in range(max(1, args.runs))]
+    best = min(runs, key=lambda r: sum(us for _, us in r["top_level"]))
+    total_ms = sum(us for _, us in best["top_level"]) / 1000
+    packages = sorted(by_package(best["modules"]).items(), key=lambda kv: kv[1], reverse=True)
+    eager = sorted(p for p in LAZY_PACKAGES if p in by_package(best["modules"]))
+
+    report = {
+        "budget_ms": args.budget_ms,
+        "total_ms": round(total_ms, 1),
+        "app_imports": lines,
+        "slowest_packages_ms": {p: round(us / 1000, 1) for p, us in packages[: args.top]},
+        "eager_heavy_packages": eager,
+        "ok": total_ms <= args.budget_ms and not eager,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"cold import of streamlit_app.py dependencies: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+        print(f"{'package':32} {'ms':>8}")
+        for pkg, ms in report["slowest_packages_ms"].items():
+            print(f"{pkg:32} {ms:>8}")
+        if eager:
+            print("loaded at start but should be lazy: " + ", ".join(eager))
+        print("OK" if report["ok"] else "FAIL")
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
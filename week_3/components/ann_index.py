@@ -0,0 +1,333 @@
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from components.vector_index import _normalize, embed_texts
+
+# HNSW knobs: M/ef_construction trade build time + memory for recall,
+# ef_search trades query latency for recall (see benchmarks/bench_ann.py).
+HNSW_M = int(os.getenv("RAG_HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+INITIAL_CAPACITY = 10_000
+# Filters matching at most this many chunks are answered exactly from stored vectors
+EXACT_FILTER_LIMIT = 2_000
+
+
+class HnswVectorStore(VectorStore):
+    """
+    Approximate nearest-neighbour index for large corpora (hnswlib, cosine).
+
+    Vectors live only in the HNSW graph (`index.bin`); chunk text and
+    metadata live in SQLite (`docs.sqlite3`) keyed by the integer HNSW label,
+    so adding a batch never rewrites the whole corpus. Deletes use
+    `mark_deleted`; capacity doubles as the index grows.
+
+    Doc rows are committed as they are written but the graph only reaches
+    disk on `persist()`; on open, rows whose vectors never made it (crash or
+    error before persisting) are dropped so they get re-embedded.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        persist_directory: str,
+        M: int = HNSW_M,
+        ef_construction: int = HNSW_EF_CONSTRUCTION,
+        ef_search: int = HNSW_EF_SEARCH,
+    ) -> None:
+        import hnswlib
+
+        self._hnswlib = hnswlib
+        self._embedding = embedding
+        self.persist_directory = persist_directory
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._lock = threading.RLock()
+        self._index = None
+        self._dirty = False
+        self.version = 0
+
+        os.makedirs(persist_directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(persist_directory, "docs.sqlite3"), check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT NOT NULL)")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS docs (
+                    label    INTEGER PRIMARY KEY,
+                    id       TEXT UNIQUE NOT NULL,
+                    source   TEXT NOT NULL,
+                    text     TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS docs_source ON docs(source)")
+        meta = dict(self._conn.execute("SELECT k, v FROM meta").fetchall())
+        self.dim: Optional[int] = int(meta["dim"]) if "dim" in meta else None
+        index_path = os.path.join(persist_directory, "index.bin")
+        if self.dim is not None and os.path.exists(index_path):
+            self._index = hnswlib.Index(space="cosine", dim=self.dim)
+            self._index.load_index(index_path, max_elements=int(meta.get("capacity", INITIAL_CAPACITY)))
+            self._index.set_ef(self.ef_search)
+        self._reconcile()
+
+    def _reconcile(self) -> None:
+        """Make doc rows agree with the last persisted graph."""
+        # labels are handed out in order and the graph is saved whole, so
+        # index.bin holds exactly labels 0..count-1
+        count = self._index.get_current_count() if self._index is not None else 0
+        with self._conn:
+            self._conn.execute("DELETE FROM docs WHERE label >= ?", (count,))
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('next_label', ?)", (str(count),))
+        if self._index is None:
+            return
+        # rows deleted after the last persist: their vectors are still live in the graph
+        live = {label for (label,) in self._conn.execute("SELECT label FROM docs")}
+        for label in self._index.get_ids_list():
+            if label not in live:
+                try:
+                    self._index.mark_deleted(label)
+                    self._dirty = True
+                except RuntimeError:  # already marked deleted
+                    pass
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def _ensure_index(self, dim: int, extra: int) -> None:
+        if self._index is None:
+            self.dim = dim
+            self._index = self._hnswlib.Index(space="cosine", dim=dim)
+            self._index.init_index(
+                max_elements=max(INITIAL_CAPACITY, extra), M=self.M, ef_construction=self.ef_construction
+            )
+            self._index.set_ef(self.ef_search)
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (str(dim),))
+            return
+        need = self._index.get_current_count() + extra
+        cap = self._index.get_max_elements()
+        if need > cap:
+            self._index.resize_index(max(need, 2 * cap))
+
+    def upsert_embeddings(
+        self,
+        ids: Sequence[str],
+        embeddings: np.ndarray,
+        texts: Sequence[str],
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> List[str]:
+        vecs = _normalize(embeddings)
+        metadatas = metadatas or [{} for _ in texts]
+        with self._lock:
+            existing = dict(self._select("SELECT id, label FROM docs WHERE id IN ({})", list(ids)))
+            self._ensure_index(vecs.shape[1], len(ids))
+            row = self._conn.execute("SELECT v FROM meta WHERE k = 'next_label'").fetchone()
+            next_label = int(row[0]) if row else 0
+            labels = []
+            rows = []
+            for cid, text, meta in zip(ids, texts, metadatas):
+                label = existing.get(cid)
+                if label is None:
+                    label = next_label
+                    next_label += 1
+                labels.append(label)
+                rows.append((label, cid, str(meta.get("source", "")), text, json.dumps(meta)))
+            self._index.add_items(vecs, np.asarray(labels, dtype=np.int64), replace_deleted=False)
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?, ?)", rows)
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('next_label', ?)", (str(next_label),))
+            self._dirty = True
+            self.version += 1
+        return list(ids)
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        if ids is None:
+            import uuid
+
+            ids = [uuid.uuid4().hex for _ in texts]
+        return self.upsert_embeddings(ids, embed_texts(self._embedding, texts), texts, metadatas)
+
+    def _select(self, sql: str, params: List[Any]) -> List[tuple]:
+        out: List[tuple] = []
+        for i in range(0, len(params), 500):
+            batch = params[i:i + 500]
+            out += self._conn.execute(sql.format(",".join("?" * len(batch))), batch).fetchall()
+        return out
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._lock:
+            labels = [label for (label,) in self._select("SELECT label FROM docs WHERE id IN ({})", list(ids))]
+            if not labels:
+                return False
+            for label in labels:
+                self._index.mark_deleted(label)
+            with self._conn:
+                for i in range(0, len(labels), 500):
+                    batch = labels[i:i + 500]
+                    self._conn.execute(f"DELETE FROM docs WHERE label IN ({','.join('?' * len(batch))})", batch)
+            self._dirty = True
+            self.version += 1
+        return True
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None, **kwargs: Any) -> Dict[str, Any]:
+        include = ["documents", "metadatas"] if include is None else include
+        # id-only listings (sync_index) skip reading chunk text
+        cols = "id, text, metadata" if ("documents" in include or "metadatas" in include) else "id"
+        with self._lock:
+            if ids is None:
+                rows = self._conn.execute(f"SELECT {cols} FROM docs ORDER BY label").fetchall()
+            else:
+                rows = self._select(f"SELECT {cols} FROM docs WHERE id IN ({{}})", list(ids))
+        out: Dict[str, Any] = {"ids": [r[0] for r in rows]}
+        if "documents" in include:
+            out["documents"] = [r[1] for r in rows]
+        if "metadatas" in include:
+            out["metadatas"] = [json.loads(r[2]) for r in rows]
+        return out
+
+    def persist(self) -> None:
+        """Write the graph (atomically) if it changed; docs are committed as they go (see `_reconcile`)."""
+        with self._lock:
+            if self._index is None or not self._dirty:
+                return
+            tmp = os.path.join(self.persist_directory, "index.tmp.bin")
+            self._index.save_index(tmp)
+            os.replace(tmp, os.path.join(self.persist_directory, "index.bin"))
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('capacity', ?)", (str(self._index.get_max_elements()),)
+                )
+            self._dirty = False
+
+    # ----- search -----
+    def _allowed_labels(self, filter: Optional[Dict[str, Any]]) -> Optional[set]:
+        if not filter:
+            return None
+        cond = filter.get("source")
+        if cond is None:
+            raise ValueError("HnswVectorStore only filters on 'source'")
+        wanted = cond.get("$in", []) if isinstance(cond, dict) else [cond]
+        return {label for (label,) in self._select("SELECT label FROM docs WHERE source IN ({})", list(wanted))}
+
+    def _exact(self, queries: np.ndarray, labels: List[int], k: int) -> List[List[Tuple[int, float]]]:
+        mat = np.asarray(self._index.get_items(labels), dtype=np.float32)
+        sims = _normalize(queries) @ _normalize(mat).T
+        out = []
+        for row in sims:
+            top = np.argsort(-row)[:k]
+            out.append([(labels[i], float(row[i])) for i in top])
+        return out
+
+    def search_vectors(
+        self, queries: np.ndarray, k: int, filter: Optional[Dict[str, Any]] = None, ef: Optional[int] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """(label, cosine similarity) lists for each query row."""
+        with self._lock:
+            if self._index is None or self._index.get_current_count() == 0:
+                return [[] for _ in range(len(queries))]
+            live = len(self)
+            k = min(k, live)
+            if k <= 0:
+                return [[] for _ in range(len(queries))]
+            allowed = self._allowed_labels(filter)
+            if allowed is not None:
+                if not allowed:
+                    return [[] for _ in range(len(queries))]
+                if len(allowed) <= EXACT_FILTER_LIMIT:
+                    return self._exact(queries, sorted(allowed), min(k, len(allowed)))
+                k = min(k, len(allowed))
+            self._index.set_ef(max(ef or self.ef_search, k))
+            fn = allowed.__contains__ if allowed is not None else None
+            while True:
+                try:
+                    labels, dists = self._index.knn_query(_normalize(queries), k=k, filter=fn)
+                    break
+                except RuntimeError:
+                    # graph walk found fewer than k live neighbours (heavy deletes/filters)
+                    if k == 1:
+                        return [[] for _ in range(len(queries))]
+                    k = max(1, k // 2)
+        return [[(int(l), 1.0 - float(d)) for l, d in zip(ls, ds)] for ls, ds in zip(labels, dists)]
+
+    def _docs(self, labels: List[int]) -> Dict[int, Document]:
+        rows = self._select("SELECT label, text, metadata FROM docs WHERE label IN ({})", labels)
+        return {label: Document(page_content=text, metadata=json.loads(meta)) for label, text, meta in rows}
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        hits = self.search_vectors(np.asarray([embedding], dtype=np.float32), k, filter)[0]
+        docs = self._docs([l for l, _ in hits])
+        return [(docs[l], s) for l, s in hits if l in docs]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [d for d, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [d for d, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_batch(
+        self, queries: List[str], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        if not queries:
+            return []
+        results = self.search_vectors(embed_texts(self._embedding, list(queries)), k, filter)
+        docs = self._docs(sorted({l for hits in results for l, _ in hits}))
+        return [[docs[l] for l, _ in hits if l in docs] for hits in results]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: max(0.0, min(1.0, score))
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        persist_directory: Optional[str] = None,
+        **kwargs: Any,
+    ) -> "HnswVectorStore":
+        if not persist_directory:
+            raise ValueError("HnswVectorStore needs a persist_directory")
+        store = cls(embedding, persist_directory, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        store.persist()
+        return store
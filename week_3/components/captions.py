@@ -0,0 +1,207 @@
+from __future__ import annotations
+import html
+import json
+import re
+import xml.etree.ElementTree as ET
+from typing import Iterator, List, Optional, Tuple
+
+from components.transcript import Transcript
+
+# Precompiled once; the parsers below touch each line/event exactly once.
+_VTT_TIME = r"(?:(\d+):)?(\d{1,2}):(\d{2}[.,]\d{3})"   # [hh:]mm:ss.mmm
+# A timing line, then its text: every following line up to a truly empty one
+# (YouTube pads cues with " " lines). One C-level scan finds all cues;
+# header/NOTE/STYLE blocks have no timing line.
+_VTT_CUE = re.compile(
+    rf"^[ \t]*{_VTT_TIME}[ \t]+-->[ \t]+{_VTT_TIME}[^\n]*\n?((?:[^\n]+\n?)*)",
+    re.MULTILINE,
+)
+_TTML_CLOCK = re.compile(r"^(?:(\d+):)?(\d{1,2}):(\d{2}(?:\.\d+)?)$")
+# <00:00:01.234>, <c>, </c>, <c.color>, <v Name>, <i> ... A tag never spans a
+# line break, so a stray "<" can't swallow the cue and timing lines after it
+# and one pass over a whole VTT body strips exactly what per-line passes would.
+_TAG = re.compile(r"<[^>\n]*>")
+
+# Rolling auto-captions repeat the previous line at the top of each cue; an
+# overlap shorter than this is treated as a genuine repeat unless it covers
+# the whole incoming cue. Only auto-generated (ASR) tracks roll: pass
+# dedupe=True for those, manual subtitles are parsed as-is.
+MIN_ROLLING_OVERLAP = 2
+MAX_OVERLAP_WORDS = 40
+
+
+def _ts(h: Optional[str], m: str, s: str) -> float:
+    return (int(h) * 3600 if h else 0) + int(m) * 60 + float(s if "," not in s else s.replace(",", "."))
+
+
+def _strip_tags(text: str) -> str:
+    return _TAG.sub("", text) if "<" in text else text
+
+
+def _words(text: str) -> List[str]:
+    """Whitespace-normalized words of tag-free cue text."""
+    if "&" in text:
+        text = html.unescape(text)
+    return text.split()
+
+
+class _Cues:
+    """Column buffers the parsers fill; the Transcript is built once at the end."""
+
+    def __init__(self) -> None:
+        self.starts: List[float] = []
+        self.durations: List[float] = []
+        self.texts: List[str] = []
+
+    def add(self, start: float, duration: float, words: List[str]) -> None:
+        if words:
+            self.starts.append(start)
+            self.durations.append(duration if duration > 0 else 0.0)
+            self.texts.append(" ".join(words))
+
+    def transcript(self) -> Transcript:
+        return Transcript.from_columns(self.starts, self.durations, self.texts)
+
+
+class _RollingDeduper(_Cues):
+    """
+    Emit only the words of each cue that weren't already emitted at the end of
+    the previous cue(s). Collapses YouTube's two/three-line rolling captions
+    (and the 10ms "snapshot" cues between them) into one copy of each phrase.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.tail: List[str] = []
+        self.last: List[str] = []
+
+    def add(self, start: float, duration: float, words: List[str]) -> None:
+        if not words or words == self.last and len(words) <= MAX_OVERLAP_WORDS:
+            return  # snapshot cue repeating the previous one: already at the end of tail
+        self.last = words
+        tail = self.tail
+        n, w = len(tail), len(words)
+        k = 0
+        # longest suffix of tail that is a prefix of words: scan (in C) for
+        # where words[0] occurs in the last MAX_OVERLAP_WORDS, earliest first
+        j = n - min(w, n, MAX_OVERLAP_WORDS)
+        first = words[0]
+        while True:
+            try:
+                j = tail.index(first, j)
+            except ValueError:
+                break
+            m = n - j
+            if tail[j:] == words[:m] and (m >= MIN_ROLLING_OVERLAP or m == w):
+                k = m
+                break
+            j += 1
+        if k == w:
+            return
+        new = words[k:] if k else words
+        self.starts.append(start)
+        self.durations.append(duration if duration > 0 else 0.0)
+        self.texts.append(" ".join(new))
+        tail.extend(new)
+        if len(tail) > 2 * MAX_OVERLAP_WORDS:
+            del tail[:-MAX_OVERLAP_WORDS]
+
+
+def _split_run_on(found: List[Tuple[str, ...]]) -> Iterator[Tuple[str, ...]]:
+    """Split cues whose text runs straight into the next timing line (no blank line between)."""
+    for cue in found:
+        while "-->" in cue[6]:
+            nxt = _VTT_CUE.search(cue[6])
+            if nxt is None:
+                break
+            yield cue[:6] + (cue[6][:nxt.start()],)
+            cue = nxt.groups()
+        yield cue
+
+
+def parse_vtt(body: str, dedupe: bool = False) -> Transcript:
+    """WEBVTT -> Transcript. Drops header/NOTE/STYLE blocks, cue ids and inline tags."""
+    cues = _RollingDeduper() if dedupe else _Cues()
+    add = cues.add
+    if "\r" in body:
+        body = body.replace("\r\n", "\n").replace("\r", "\n")
+    if "<" in body:
+        body = _TAG.sub("", body)
+    found = _VTT_CUE.findall(body)
+    if body.count("-->") != len(found):
+        found = list(_split_run_on(found))
+    prev_stamp, prev_end = None, 0.0
+    for h1, m1, s1, h2, m2, s2, text in found:
+        # rolling captions start each cue where the previous one ended
+        start = prev_end if (h1, m1, s1) == prev_stamp else _ts(h1, m1, s1)
+        prev_stamp, prev_end = (h2, m2, s2), _ts(h2, m2, s2)
+        add(start, prev_end - start, _words(text))
+    return cues.transcript()
+
+
+def _ttml_clock(value: str) -> Optional[float]:
+    m = _TTML_CLOCK.match(value or "")
+    if m:
+        return int(m.group(1) or 0) * 3600 + int(m.group(2)) * 60 + float(m.group(3))
+    if value and value.endswith("ms"):
+        return float(value[:-2]) / 1000
+    if value and value.endswith("s"):
+        return float(value[:-1])
+    return None
+
+
+def parse_srv3(body: str, dedupe: bool = False) -> Transcript:
+    """
+    YouTube SRV3 (<p t= d=> in ms), legacy timedtext (<text start= dur=>)
+    or TTML (<p begin= end=>) -> Transcript.
+    """
+    cues = _RollingDeduper() if dedupe else _Cues()
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError:
+        return cues.transcript()
+    for el in root.iter():
+        tag = el.tag.rsplit("}", 1)[-1]
+        a = el.attrib
+        if tag == "p" and "t" in a:
+            start, dur = int(a["t"]) / 1000, int(a.get("d") or 0) / 1000
+        elif tag == "text" and "start" in a:
+            start, dur = float(a["start"]), float(a.get("dur") or 0)
+        elif tag == "p" and "begin" in a:
+            start = _ttml_clock(a["begin"])
+            end = _ttml_clock(a.get("end", ""))
+            if start is None:
+                continue
+            dur = (end - start) if end is not None else 0.0
+        else:
+            continue
+        cues.add(start, dur, _words(_strip_tags("".join(el.itertext()))))
+    return cues.transcript()
+
+
+def parse_json3(body: str, dedupe: bool = False) -> Transcript:
+    """YouTube JSON3 ({"events": [{tStartMs, dDurationMs, segs: [{utf8}]}]}) -> Transcript."""
+    cues = _RollingDeduper() if dedupe else _Cues()
+    try:
+        events = json.loads(body).get("events") or []
+    except (ValueError, AttributeError):
+        return cues.transcript()
+    for ev in events:
+        segs = ev.get("segs")
+        if not segs:
+            continue
+        # aAppend newline events carry only whitespace and come out empty
+        words = _words(_strip_tags("".join(s.get("utf8", "") for s in segs)))
+        cues.add(ev.get("tStartMs", 0) / 1000, ev.get("dDurationMs", 0) / 1000, words)
+    return cues.transcript()
+
+
+def parse_captions(body: str, ext: str = "", dedupe: bool = False) -> Transcript:
+    """Dispatch on extension, falling back to sniffing the payload."""
+    ext = (ext or "").lower()
+    head = body[:1024].lstrip()[:64]  # sniff without copying the whole body
+    if ext == "json3" or head.startswith("{"):
+        return parse_json3(body, dedupe)
+    if ext in ("srv1", "srv2", "srv3", "ttml", "xml") or head.startswith("<"):
+        return parse_srv3(body, dedupe)
+    return parse_vtt(body, dedupe)
@@ -0,0 +1,252 @@
+from __future__ import annotations
+import re
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Fallback when tiktoken isn't installed: crude 1 token ≈ 4 chars heuristic
+CHARS_PER_TOKEN = 4
+
+_PARA_SPLIT = re.compile(r"\n\s*\n+")
+_SENT_SPLIT = re.compile(r"(?<=[.!?…])[\"'”’)\]]*\s+(?=[\"'“‘(\[]?[A-Z0-9])")
+_WS = re.compile(r"\s+")
+
+
+def _encoding_name(model: Optional[str]) -> str:
+    """
+    Pick the tiktoken encoding closest to the model's real tokenizer.
+    GPT-4o / GPT-5 use o200k_base. Llama 3 (Groq) uses a tiktoken BPE that
+    extends cl100k_base, so cl100k is the closest offline proxy.
+    """
+    m = (model or "").lower()
+    if m.startswith(("gpt-4o", "gpt-5", "o1", "o3", "o4")):
+        return "o200k_base"
+    return "cl100k_base"
+
+
+@lru_cache(maxsize=8)
+def get_encoder(model: Optional[str] = None) -> Optional[Callable[[str], List[int]]]:
+    """Return a cached `encode` function for the model, or None if tiktoken is missing."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        enc = tiktoken.get_encoding(_encoding_name(model))
+    except Exception:
+        return None
+    return lambda s: enc.encode(s, disallowed_special=())
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Token count for `text` under the model's tokenizer (heuristic if unavailable)."""
+    if not text:
+        return 0
+    encode = get_encoder(model)
+    if encode is None:
+        return max(1, len(text) // CHARS_PER_TOKEN)
+    return len(encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Cut `text` to at most `max_tokens`, preferring a sentence boundary."""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    out: List[str] = []
+    used = 0
+    for unit in _split_units(text, max_tokens, model):
+        n = count_tokens(unit, model)
+        if used + n > max_tokens:
+            break
+        out.append(unit)
+        used += n
+    # per-unit counts don't add up exactly to the joined text's count
+    while len(out) > 1 and count_tokens(_join(out), model) > max_tokens:
+        out.pop()
+    return _join(out)
+
+
+def _slice_chars(text: str, max_tokens: int, model: Optional[str]) -> List[str]:
+    """Split text with no usable word boundary (a long URL, base64, ...) into slices of at most `max_tokens`."""
+    pieces: List[str] = []
+    while text:
+        piece = text[: max(1, max_tokens * CHARS_PER_TOKEN)]
+        n = count_tokens(piece, model)
+        while len(piece) > 1 and n > max_tokens:
+            piece = piece[: max(1, min(len(piece) - 1, len(piece) * max_tokens // n))]
+            n = count_tokens(piece, model)
+        pieces.append(piece)
+        text = text[len(piece):]
+    return pieces
+
+
+def _fits(words: List[str], max_tokens: int, model: Optional[str]) -> int:
+    """How many leading words fit in `max_tokens` once joined (at least one)."""
+    k = len(words)
+    while k > 1 and count_tokens(" ".join(words[:k]), model) > max_tokens:
+        k -= 1
+    return k
+
+
+def _hard_split(sentence: str, max_tokens: int, model: Optional[str]) -> List[str]:
+    """Split an oversized sentence on word boundaries, slicing words that alone exceed the budget."""
+    pieces: List[str] = []
+    cur: List[str] = []
+    used = 0
+    for word in sentence.split(" "):
+        n = count_tokens(word + " ", model)
+        if cur and used + n > max_tokens:
+            k = _fits(cur, max_tokens, model)
+            pieces.append(" ".join(cur[:k]))
+            cur = cur[k:]
+            used = count_tokens(" ".join(cur), model) if cur else 0
+        if count_tokens(word, model) > max_tokens:
+            if cur:
+                pieces.append(" ".join(cur))
+                cur, used = [], 0
+            pieces.extend(_slice_chars(word, max_tokens, model))
+            continue
+        cur.append(word)
+        used += n
+    while cur:
+        k = _fits(cur, max_tokens, model)
+        pieces.append(" ".join(cur[:k]))
+        cur = cur[k:]
+    return pieces
+
+
+def _split_units(text: str, max_tokens: int, model: Optional[str]) -> List[str]:
+    """
+    Break text into paragraph-then-sentence units, each at most `max_tokens`.
+    A blank string marks a paragraph boundary so packing can restore it.
+    """
+    units: List[str] = []
+    for para in _PARA_SPLIT.split(text):
+        para = _WS.sub(" ", para).strip()
+        if not para:
+            continue
+        if units:
+            units.append("")
+        if count_tokens(para, model) <= max_tokens:
+            units.append(para)
+            continue
+        for sent in _SENT_SPLIT.split(para):
+            sent = sent.strip()
+            if not sent:
+                continue
+            if count_tokens(sent, model) <= max_tokens:
+                units.append(sent)
+            else:
+                units.extend(_hard_split(sent, max_tokens, model))
+    return units
+
+
+def _join(units: List[str]) -> str:
+    text = " ".join(u if u else "\n\n" for u in units)
+    return text.replace(" \n\n ", "\n\n").strip()
+
+
+def chunk_by_tokens(
+    text: str,
+    model: Optional[str] = None,
+    max_tokens: int = 2000,
+    overlap_tokens: int = 40,
+) -> List[str]:
+    """
+    Pack paragraph/sentence units greedily up to `max_tokens` per chunk.
+    Consecutive chunks share only the trailing sentence(s) that fit in
+    `overlap_tokens`, so the model keeps local context without re-reading
+    hundreds of tokens per chunk.
+    """
+    if not text:
+        return []
+    if count_tokens(text, model) <= max_tokens:
+        return [text]
+
+    units = _split_units(text, max_tokens, model)
+    sizes = [count_tokens(u, model) if u else 0 for u in units]
+
+    chunks: List[str] = []
+    cur: List[int] = []  # indices into units
+    carried = 0  # leading entries of `cur` repeated from the previous chunk
+    used = 0
+
+    def emit() -> Tuple[List[int], int]:
+        """Append the chunk for `cur`; return the indices that start the next one and how many are overlap."""
+        if not any(units[j] for j in cur[carried:]):  # nothing new since the overlap
+            return [], 0
+        # per-unit counts don't add up exactly to the joined text's count, so
+        # re-count the chunk and push trailing units into the next one if it's over
+        floor = carried
+        while floor < len(cur) - 1 and not units[cur[floor]]:
+            floor += 1
+        keep = list(cur)
+        while len(keep) > floor + 1 and count_tokens(_join([units[j] for j in keep]), model) > max_tokens:
+            keep.pop()
+        if count_tokens(_join([units[j] for j in keep]), model) > max_tokens:
+            keep = [j for j in keep[carried:] if units[j]]  # overlap + one unit is too long: drop the overlap
+        chunks.append(_join([units[j] for j in keep]))
+        spill = cur[cur.index(keep[-1]) + 1:]
+        while spill and not units[spill[0]]:
+            spill.pop(0)
+        if spill:
+            return spill, 0
+        # carry back whole sentences within the overlap budget
+        carry: List[int] = []
+        back = 0
+        for j in reversed(keep):
+            if not units[j]:
+                break
+            if back + sizes[j] > overlap_tokens:
+                break
+            carry.insert(0, j)
+            back += sizes[j]
+        return carry, len(carry)
+
+    for i, n in enumerate(sizes):
+        if cur and used + n > max_tokens:
+            cur, carried = emit()
+            used = sum(sizes[j] for j in cur)
+        if not cur and not units[i]:
+            continue
+        cur.append(i)
+        used += n
+    while cur and any(units[j] for j in cur):
+        cur, carried = emit()
+        if carried:  # only overlap left over
+            break
+    return chunks
+
+
+def preflight_estimate(
+    text: str,
+    model: Optional[str] = None,
+    single_call_tokens: int = 3000,
+    chunk_tokens: int = 2200,
+    overlap_tokens: int = 40,
+    prompt_overhead: int = 80,
+    max_output_tokens: int = 1024,
+) -> Dict[str, int]:
+    """
+    Estimate the token cost of summarizing `text` before any LLM call:
+    how many calls a map/reduce summary would take and their prompt tokens.
+    """
+    input_tokens = count_tokens(text, model)
+    if input_tokens <= single_call_tokens:
+        return {
+            "input_tokens": input_tokens,
+            "chunks": 1,
+            "calls": 1,
+            "prompt_tokens": input_tokens + prompt_overhead,
+            "max_output_tokens": max_output_tokens,
+        }
+    chunks = chunk_by_tokens(text, model, max_tokens=chunk_tokens, overlap_tokens=overlap_tokens)
+    chunk_prompt = sum(count_tokens(c, model) for c in chunks) + prompt_overhead * len(chunks)
+    # the synthesis call reads every partial summary (bounded by max_output_tokens each)
+    synth_prompt = prompt_overhead + len(chunks) * max_output_tokens
+    return {
+        "input_tokens": input_tokens,
+        "chunks": len(chunks),
+        "calls": len(chunks) + 1,
+        "prompt_tokens": chunk_prompt + synth_prompt,
+        "max_output_tokens": max_output_tokens * (len(chunks) + 1),
+    }
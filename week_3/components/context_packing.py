@@ -0,0 +1,125 @@
+from __future__ import annotations
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from components.chunking import count_tokens, truncate_to_tokens
+
+CONTEXT_TOKEN_BUDGET = 900   # tokens of retrieved context per RAG prompt (~top-4 chunks, minus overlap)
+FETCH_K = 16                 # candidates retrieved before packing
+RELATIVE_CUTOFF = 0.7        # drop passages scoring below this fraction of the best one
+DUPLICATE_CONTAINMENT = 0.8  # shingle overlap above which a passage counts as a near-duplicate
+MERGE_GAP = 2                # chars between chunks still treated as adjacent (separator)
+SHINGLE = 4
+
+_WORD = re.compile(r"\w+")
+
+
+class Passage:
+    """One or more merged chunks from a single source."""
+
+    __slots__ = ("source", "start", "end", "text", "score", "page")
+
+    def __init__(self, source: str, start: Optional[int], text: str, score: float, page: Optional[int] = None) -> None:
+        self.source = source
+        self.start = start
+        self.end = None if start is None else start + len(text)
+        self.text = text
+        self.score = score
+        self.page = page
+
+    def absorb(self, start: int, text: str, score: float) -> None:
+        """Append a chunk that starts inside or right after this passage."""
+        if start < self.end:
+            tail = text[self.end - start:]
+        else:
+            tail = "\n" + text
+        self.text += tail
+        self.end = max(self.end, start + len(text))
+        self.score = max(self.score, score)
+
+    def header(self) -> str:
+        return f"[Source: {self.source}" + (f", p. {self.page}" if self.page else "") + "]"
+
+
+def merge_adjacent(scored: Sequence[Tuple[Document, float]]) -> List[Passage]:
+    """Stitch overlapping/adjacent chunks of the same source (needs `start_index` metadata)."""
+    by_source: Dict[str, List[Tuple[int, str, float, Optional[int]]]] = defaultdict(list)
+    passages: List[Passage] = []
+    for doc, score in scored:
+        src = doc.metadata.get("source", "?")
+        start = doc.metadata.get("start_index")
+        if start is None:
+            passages.append(Passage(src, None, doc.page_content, score, doc.metadata.get("page")))
+        else:
+            by_source[src].append((int(start), doc.page_content, score, doc.metadata.get("page")))
+
+    for src, chunks in by_source.items():
+        chunks.sort(key=lambda c: c[0])
+        cur: Optional[Passage] = None
+        for start, text, score, page in chunks:
+            if cur is not None and start <= cur.end + MERGE_GAP:
+                cur.absorb(start, text, score)
+                continue
+            cur = Passage(src, start, text, score, page)
+            passages.append(cur)
+    passages.sort(key=lambda p: p.score, reverse=True)
+    return passages
+
+
+def _shingles(text: str) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) <= SHINGLE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+
+
+def drop_near_duplicates(passages: Sequence[Passage], threshold: float = DUPLICATE_CONTAINMENT) -> List[Passage]:
+    """Keep the higher-scored of any two passages whose shingles mostly overlap."""
+    kept: List[Tuple[Passage, set]] = []
+    for p in passages:
+        sh = _shingles(p.text)
+        if any(len(sh & other) / max(1, min(len(sh), len(other))) >= threshold for _, other in kept):
+            continue
+        kept.append((p, sh))
+    return [p for p, _ in kept]
+
+
+def pack_context(
+    scored: Sequence[Tuple[Document, float]],
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    model: Optional[str] = None,
+    relative_cutoff: float = RELATIVE_CUTOFF,
+) -> Tuple[str, List[Passage]]:
+    """
+    Turn (document, relevance) hits into a prompt context of at most
+    `token_budget` tokens: merge adjacent chunks, drop near-duplicates and
+    weak hits, then add passages best-first while they fit.
+    """
+    if not scored:
+        return "", []
+    passages = drop_near_duplicates(merge_adjacent(scored))
+    floor = passages[0].score * relative_cutoff if passages[0].score > 0 else float("-inf")
+
+    used: List[Passage] = []
+    blocks: List[str] = []
+    remaining = token_budget
+    for p in passages:
+        if p.score < floor:
+            break
+        block = f"{p.header()}\n{p.text}\n"
+        cost = count_tokens(block, model)
+        if cost > remaining:
+            if used:
+                continue  # a smaller, lower-ranked passage may still fit
+            # best passage alone is over budget: keep its head
+            block = truncate_to_tokens(block, remaining, model)
+            cost = remaining
+        used.append(p)
+        blocks.append(block)
+        remaining -= cost
+        if remaining <= 0:
+            break
+    return "\n\n".join(blocks), used
@@ -0,0 +1,228 @@
+from __future__ import annotations
+import codecs
+import io
+import os
+import re
+from bisect import bisect_right
+from typing import BinaryIO, Iterator, List, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+TEXT_BLOCK_BYTES = 256 * 1024   # txt/md are decoded in blocks of this size
+DOCX_PAGE_CHARS = 4000          # DOCX has no pages; group paragraphs into pseudo-pages
+WINDOW_CHUNKS = 8               # split this many chunks' worth of text at a time
+
+_MD_FENCE = re.compile(r"^\s*(```|~~~)")
+_MD_RULES = [
+    (re.compile(r"!\[([^\]]*)\]\([^)]*\)"), r"\1"),           # images -> alt text
+    (re.compile(r"\[([^\]]+)\]\([^)]*\)"), r"\1"),             # links -> label
+    (re.compile(r"^\s{0,3}#{1,6}\s*", re.M), ""),              # heading markers
+    (re.compile(r"^\s{0,3}>\s?", re.M), ""),                   # blockquotes
+    (re.compile(r"^\s*([-*+]|\d+\.)\s+", re.M), ""),           # list bullets
+    (re.compile(r"(\*\*|__)(.+?)\1"), r"\2"),                  # bold
+    (re.compile(r"(?<![\w*])([*_])(?!\s)(.+?)(?<!\s)\1(?![\w*])"), r"\2"),  # italics
+    (re.compile(r"`([^`]+)`"), r"\1"),                         # inline code
+    (re.compile(r"<[^>]+>"), ""),                              # inline HTML
+]
+
+
+class DocumentParseError(Exception):
+    """An uploaded file couldn't be read (corrupt/encrypted PDF, broken DOCX, ...)."""
+
+
+def looks_binary(sample: bytes) -> bool:
+    """NUL bytes or mostly non-text bytes: not worth embedding."""
+    if not sample:
+        return False
+    if b"\x00" in sample:
+        return True
+    text_bytes = bytes(range(32, 127)) + b"\n\r\t\f\b"
+    nontext = sum(1 for b in sample if b not in text_bytes and b < 128)
+    return nontext / len(sample) > 0.3
+
+
+def _iter_text_blocks(fileobj: BinaryIO) -> Iterator[str]:
+    """Decode UTF-8 incrementally, yielding blocks that end on a line boundary."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    while True:
+        raw = fileobj.read(TEXT_BLOCK_BYTES)
+        if not raw:
+            break
+        pending += decoder.decode(raw)
+        cut = pending.rfind("\n")
+        if cut >= 0:
+            yield pending[: cut + 1]
+            pending = pending[cut + 1:]
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def markdown_to_text(md: str) -> str:
+    """Drop Markdown syntax but keep fenced code blocks verbatim."""
+    out, prose, in_fence = [], [], False
+
+    def flush_prose():
+        text = "\n".join(prose)
+        for pattern, repl in _MD_RULES:
+            text = pattern.sub(repl, text)
+        out.append(text)
+        prose.clear()
+
+    for line in md.splitlines():
+        if _MD_FENCE.match(line):
+            if not in_fence:
+                flush_prose()
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            out.append(line)
+        else:
+            prose.append(line)
+    flush_prose()
+    return "\n".join(out)
+
+
+def _iter_pdf(fileobj: BinaryIO) -> Iterator[Tuple[int, str]]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(fileobj)
+    for i, page in enumerate(reader.pages, 1):
+        yield i, page.extract_text() or ""
+
+
+def _iter_docx(fileobj: BinaryIO) -> Iterator[Tuple[int, str]]:
+    import docx
+
+    d = docx.Document(fileobj)
+    page, buf, size = 1, [], 0
+
+    def blocks():
+        for p in d.paragraphs:
+            yield p.text
+        for table in d.tables:
+            for row in table.rows:
+                yield " | ".join(c.text.strip() for c in row.cells)
+
+    for text in blocks():
+        if not text.strip():
+            continue
+        buf.append(text)
+        size += len(text)
+        if size >= DOCX_PAGE_CHARS:
+            yield page, "\n\n".join(buf)
+            page, buf, size = page + 1, [], 0
+    if buf:
+        yield page, "\n\n".join(buf)
+
+
+def iter_pages(name: str, fileobj: BinaryIO) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) for an uploaded file without holding the whole
+    extracted text in memory. PDF pages are real pages; DOCX and text files
+    are yielded in fixed-size blocks. Binary files with a text extension
+    yield nothing. Reader failures are raised as DocumentParseError.
+    """
+    try:
+        yield from _iter_file_pages(name, fileobj)
+    except Exception as exc:
+        raise DocumentParseError(f"{name}: {type(exc).__name__}: {exc}") from exc
+
+
+def _iter_file_pages(name: str, fileobj: BinaryIO) -> Iterator[Tuple[int, str]]:
+    ext = os.path.splitext(name)[1].lower()
+    if ext == ".pdf":
+        yield from _iter_pdf(fileobj)
+        return
+    if ext == ".docx":
+        yield from _iter_docx(fileobj)
+        return
+
+    head = fileobj.read(8192)
+    if looks_binary(head):
+        return
+    stream = io.BufferedReader(_Prepend(head, fileobj)) if head else fileobj
+    for i, block in enumerate(_iter_text_blocks(stream), 1):
+        yield i, markdown_to_text(block) if ext in (".md", ".markdown") else block
+
+
+class _Prepend(io.RawIOBase):
+    """Re-attach the sniffed header to a non-seekable stream."""
+
+    def __init__(self, head: bytes, rest: BinaryIO) -> None:
+        self._head = head
+        self._rest = rest
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if self._head:
+            n = min(len(b), len(self._head))
+            b[:n] = self._head[:n]
+            self._head = self._head[n:]
+            return n
+        data = self._rest.read(len(b))
+        b[: len(data)] = data
+        return len(data)
+
+
+def iter_chunks(
+    source: str,
+    pages: Iterator[Tuple[int, str]],
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+) -> Iterator[Document]:
+    """
+    Lazily split streamed pages into chunk Documents with `source`, `page`
+    and `start_index` (character offset in the whole source) metadata.
+
+    Text is split a window at a time; the last chunk of each window is held
+    back and re-split with the next window, so chunks still cross page
+    boundaries naturally while memory stays bounded by the window size.
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True
+    )
+    window = WINDOW_CHUNKS * chunk_size
+    buf = ""
+    buf_offset = 0                     # offset of buf[0] in the whole source
+    page_starts: List[int] = []        # offsets (in source) where each buffered page starts
+    page_nums: List[int] = []
+
+    def emit(final: bool) -> Iterator[Document]:
+        nonlocal buf, buf_offset, page_starts, page_nums
+        docs = splitter.create_documents([buf])
+        if not docs:
+            buf, page_starts, page_nums = "", [], []
+            return
+        keep = docs if final else docs[:-1]
+        for d in keep:
+            start = buf_offset + d.metadata["start_index"]
+            page = page_nums[max(0, bisect_right(page_starts, start) - 1)] if page_nums else 1
+            yield Document(page_content=d.page_content, metadata={"source": source, "page": page, "start_index": start})
+        if final:
+            buf = ""
+            return
+        tail_start = docs[-1].metadata["start_index"]
+        buf = buf[tail_start:]
+        buf_offset += tail_start
+        # forget pages that end before the carried-over tail
+        i = max(0, bisect_right(page_starts, buf_offset) - 1)
+        page_starts, page_nums = page_starts[i:], page_nums[i:]
+
+    for num, text in pages:
+        text = text.strip()
+        if not text:
+            continue
+        if buf:
+            buf += "\n\n"
+        page_starts.append(buf_offset + len(buf))
+        page_nums.append(num)
+        buf += text
+        if len(buf) >= window:
+            yield from emit(final=False)
+    if buf.strip():
+        yield from emit(final=True)
@@ -0,0 +1,229 @@
+from __future__ import annotations
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:  # cross-process append lock (POSIX); on Windows only threads are serialized
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+EMBED_CACHE_DIR = os.getenv(
+    "RAG_EMBED_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "genai", "embeddings")
+)
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model_name}\x00{text}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed vector store on disk.
+
+    `vectors.bin` is an append-only array of fixed-size rows (float16 by
+    default) read through `np.memmap`, so a hit is a view into the page cache
+    rather than a copy. `index.sqlite3` maps sha256(model, text) -> row.
+    Rows are written before their index entry is committed, so readers in
+    other processes never see a half-written vector.
+    """
+
+    def __init__(self, path: str, dtype: str = "float16") -> None:
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._data_path = os.path.join(path, "vectors.bin")
+        self._lock_path = os.path.join(path, "append.lock")
+        self._lock = threading.Lock()
+        self._mm: Optional[np.memmap] = None
+        self._conn = sqlite3.connect(os.path.join(path, "index.sqlite3"), check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS rows (key BLOB PRIMARY KEY, row INTEGER NOT NULL)")
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self._load_meta()
+
+    def _load_meta(self) -> None:
+        """Adopt dim/dtype once some handle (maybe in another process) has stored a first vector."""
+        meta = dict(self._conn.execute("SELECT k, v FROM meta").fetchall())
+        if "dim" in meta:
+            self.dtype = np.dtype(meta["dtype"])
+            self.dim = int(meta["dim"])
+
+    @property
+    def _row_bytes(self) -> int:
+        return self.dim * self.dtype.itemsize
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    @contextmanager
+    def _append_lock(self):
+        with open(self._lock_path, "a") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _view(self, min_rows: int) -> np.memmap:
+        """Memory map covering at least `min_rows` rows (re-mapped when the file grows)."""
+        if self._mm is None or len(self._mm) < min_rows:
+            if self.dim is None:
+                self._load_meta()  # rows exist, so another handle has written meta
+            n = os.path.getsize(self._data_path) // self._row_bytes
+            self._mm = np.memmap(self._data_path, dtype=self.dtype, mode="r", shape=(n, self.dim))
+        return self._mm
+
+    def _lookup(self, keys: Sequence[bytes]) -> dict:
+        found = {}
+        for i in range(0, len(keys), 500):
+            batch = list(keys[i:i + 500])
+            q = f"SELECT key, row FROM rows WHERE key IN ({','.join('?' * len(batch))})"
+            found.update(self._conn.execute(q, batch).fetchall())
+        return found
+
+    def rows(self, keys: Sequence[bytes]) -> List[Optional[int]]:
+        with self._lock:
+            found = self._lookup(keys)
+        return [found.get(k) for k in keys]
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """Zero-copy read-only view of one cached vector, or None."""
+        row = self.rows([key])[0]
+        if row is None:
+            return None
+        with self._lock:
+            return self._view(row + 1)[row]
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        rows = self.rows(keys)
+        hits = [r for r in rows if r is not None]
+        if not hits:
+            return [None] * len(keys)
+        with self._lock:
+            mm = self._view(max(hits) + 1)
+        return [None if r is None else mm[r] for r in rows]
+
+    def put_many(self, keys: Sequence[bytes], vectors: np.ndarray) -> None:
+        if not len(keys):
+            return
+        with self._lock, self._append_lock():
+            if self.dim is None:
+                self._load_meta()
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO meta VALUES (?, ?)",
+                        [("dim", str(self.dim)), ("dtype", self.dtype.name)],
+                    )
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dim {vectors.shape[1]} != cache dim {self.dim}")
+            vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+
+            # another process may have stored some of these while we computed them
+            seen = set(self._lookup(keys))
+            todo = []
+            for i, k in enumerate(keys):
+                if k not in seen:
+                    seen.add(k)
+                    todo.append(i)
+            if not todo:
+                return
+
+            with open(self._data_path, "ab+") as fh:
+                # drop a torn trailing row left by a crashed writer
+                size = fh.seek(0, os.SEEK_END)
+                start = size // self._row_bytes
+                if size != start * self._row_bytes:
+                    fh.truncate(start * self._row_bytes)
+                fh.seek(start * self._row_bytes)
+                fh.write(vectors[todo].tobytes())
+                fh.flush()
+                os.fsync(fh.fileno())
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO rows VALUES (?, ?)",
+                    [(keys[i], start + j) for j, i in enumerate(todo)],
+                )
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings front-end that looks vectors up by hash(model, text) before
+    running the model. The model itself is only constructed on the first miss,
+    so re-ingesting known content never loads it.
+    """
+
+    def __init__(self, model_name: str, factory: Callable[[], "Embeddings"], cache: EmbeddingCache) -> None:
+        self.model_name = model_name
+        self._factory = factory
+        self._inner = None
+        self._inner_lock = threading.Lock()
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def inner(self):
+        with self._inner_lock:
+            if self._inner is None:
+                self._inner = self._factory()
+            return self._inner
+
+    @property
+    def dim(self) -> int:
+        return self.cache.dim or self.inner.dim
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """float32 matrix for `texts`; cached rows are read, misses are embedded and stored."""
+        keys = [cache_key(self.model_name, t) for t in texts]
+        cached = self.cache.get_many(keys)
+        miss = [i for i, v in enumerate(cached) if v is None]
+        self.hits += len(texts) - len(miss)
+        self.misses += len(miss)
+
+        computed = None
+        if miss:
+            computed = np.asarray(self.inner.encode([texts[i] for i in miss]), dtype=np.float32)
+            self.cache.put_many([keys[i] for i in miss], computed)
+
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, v in enumerate(cached):
+            if v is not None:
+                out[i] = v
+        if computed is not None:
+            out[miss] = computed
+        return out
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.encode(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        # queries are rarely repeated verbatim; skip the disk round-trip
+        return self.inner.embed_query(text)
+
+
+def _slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+
+
+def open_embedding_cache(model_name: str, root: str = EMBED_CACHE_DIR, dtype: str = "float16") -> EmbeddingCache:
+    """
+    One cache directory per model (rows in a file must share a dimension).
+    Pass "model:backend" when backends differ (int8/onnx vs torch vectors).
+    """
+    return EmbeddingCache(os.path.join(root, _slug(model_name)), dtype=dtype)
@@ -0,0 +1,376 @@
+from __future__ import annotations
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from components.doc_loaders import DocumentParseError, iter_chunks, iter_pages
+from components.embedding_cache import CachedEmbeddings
+from components.rag_utils import HnswVectorStore, NumpyVectorStore, _ingested_files, chunk_id, touch_index
+from components.vector_index import embed_texts
+
+PARSE_WORKERS = int(os.getenv("RAG_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+EMBED_BATCH = 256     # texts per model call
+QUEUE_DEPTH = 4       # batches buffered between stages before the producer blocks
+
+_DONE = object()
+
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def get_parse_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Process-wide parse pool per size, started on first use and reused by
+    every ingest. Workers are spawned, not forked: ingestion runs on a
+    thread of the multithreaded Streamlit server with torch loaded, and a
+    forked child of that state can deadlock on a lock held by another thread.
+    """
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pools[workers]
+
+
+def _drop_parse_pool(workers: int, pool: ProcessPoolExecutor) -> None:
+    """Forget a pool whose worker died so the next ingest starts a fresh one."""
+    with _pools_lock:
+        if _pools.get(workers) is pool:
+            del _pools[workers]
+    pool.shutdown(wait=False)
+
+
+def _spool(fh: BinaryIO, path: str) -> str:
+    """Copy an upload to `path` a block at a time; returns its sha256."""
+    h = hashlib.sha256()
+    if hasattr(fh, "seek"):
+        fh.seek(0)  # the same upload object comes back on every Streamlit rerun
+    with open(path, "wb") as out:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+            out.write(block)
+    return h.hexdigest()
+
+
+def _extract(name: str, src: str, dest: str) -> Tuple[str, bool]:
+    """
+    Process-pool worker: stream the pages of the file at `src` into `dest`
+    as JSON lines of [page, text]. False if the file can't be read.
+    """
+    try:
+        with open(src, "rb") as fh, open(dest, "w", encoding="utf-8") as out:
+            for num, text in iter_pages(name, fh):
+                if text.strip():
+                    out.write(json.dumps([num, text]) + "\n")
+        return name, True
+    except DocumentParseError:
+        return name, False
+
+
+def _read_pages(path: str) -> Iterator[Tuple[int, str]]:
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            num, text = json.loads(line)
+            yield num, text
+
+
+class StageStats:
+    """Items handled and time spent working (not waiting on queues) by one stage."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+
+    def record(self, items: int, started: float) -> None:
+        self.items += items
+        self.busy += time.perf_counter() - started
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "items": self.items,
+            "busy_s": round(self.busy, 3),
+            "per_s": round(self.items / self.busy, 1) if self.busy else 0.0,
+        }
+
+
+def _takes_vectors(vectordb) -> bool:
+    return isinstance(vectordb, (NumpyVectorStore, HnswVectorStore))
+
+
+def bulk_upsert(
+    vectordb, ids: Sequence[str], vectors: Optional[np.ndarray], texts: Sequence[str], metadatas: Sequence[dict]
+) -> None:
+    """Write one batch through the store's public API, reusing precomputed vectors where it accepts them."""
+    if _takes_vectors(vectordb):
+        vectordb.upsert_embeddings(ids, vectors, texts, metadatas)
+    else:
+        # Chroma embeds on write (an upsert by id); behind the embedding cache
+        # that is a lookup of the vectors the embed stage just stored
+        vectordb.add_texts(list(texts), metadatas=list(metadatas), ids=list(ids))
+
+
+class _Pipeline:
+    def __init__(
+        self, vectordb, chunk_size: int, chunk_overlap: int, embed_batch: int, workers: int, tmpdir: str
+    ) -> None:
+        self.vectordb = vectordb
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.embed_batch = embed_batch
+        self.workers = workers
+        self.tmpdir = tmpdir
+        # embed up front only where the vectors get used: stores that take them, or the shared cache
+        self.precompute = _takes_vectors(vectordb) or isinstance(vectordb.embeddings, CachedEmbeddings)
+        self.stop = threading.Event()
+        self.errors: List[BaseException] = []
+        self.stages = {n: StageStats(n) for n in ("parse", "chunk", "embed", "upsert")}
+        self.counts = {"files": 0, "skipped": 0, "chunks": 0, "added": 0, "removed": 0, "unchanged": 0}
+        self.known_files = _ingested_files(vectordb)
+        self.existing = set(vectordb.get(include=[])["ids"])
+        self.seen: set = set()
+
+    # ----- plumbing -----
+    def _put(self, q: queue.Queue, item: Any) -> None:
+        """Blocking put that gives up once another stage has failed."""
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q: queue.Queue) -> Any:
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _run(self, fn, *args) -> threading.Thread:
+        def target():
+            try:
+                fn(*args)
+            except BaseException as exc:  # surface in the caller, unblock the others
+                self.errors.append(exc)
+                self.stop.set()
+
+        t = threading.Thread(target=target, daemon=True)
+        t.start()
+        return t
+
+    # ----- stages -----
+    def parse(self, files: Iterable[Tuple[str, Any]], out: queue.Queue) -> None:
+        """
+        Spool and hash each upload, short-circuit known files, and extract the
+        rest in a process pool, a few in flight at a time. Workers stream pages
+        to a temp file, so neither side holds a whole document in memory.
+        """
+        def todo() -> Iterator[Tuple[str, str, str, str]]:
+            for i, (name, fh) in enumerate(files):
+                src = os.path.join(self.tmpdir, f"{i}.src")
+                digest = _spool(fh if hasattr(fh, "read") else io.BytesIO(bytes(fh)), src)
+                prev_key, known = self.known_files.get(name, (None, None))
+                if prev_key == (digest, self.chunk_size, self.chunk_overlap) and all(
+                    cid in self.existing or cid in self.seen for cid in known
+                ):
+                    os.remove(src)
+                    self._put(out, (name, digest, None, known))
+                    continue
+                yield name, digest, src, os.path.join(self.tmpdir, f"{i}.pages")
+
+        def done(name: str, digest: str, src: str, dest: str, ok: bool) -> None:
+            os.remove(src)
+            self._put(out, (name, digest, dest if ok else None, None))
+
+        if self.workers <= 1:
+            for name, digest, src, dest in todo():
+                t = time.perf_counter()
+                _, ok = _extract(name, src, dest)
+                self.stages["parse"].record(1, t)
+                done(name, digest, src, dest, ok)
+            self._put(out, _DONE)
+            return
+
+        pool = get_parse_pool(self.workers)
+        pending, it = set(), todo()
+        started = {}
+        try:
+            while not self.stop.is_set():
+                while len(pending) < 2 * self.workers:
+                    nxt = next(it, None)
+                    if nxt is None:
+                        break
+                    name, digest, src, dest = nxt
+                    fut = pool.submit(_extract, name, src, dest)
+                    started[fut] = (time.perf_counter(), nxt)
+                    pending.add(fut)
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    _, ok = fut.result()
+                    t, (name, digest, src, dest) = started.pop(fut)
+                    # wall time per file (workers run concurrently, so busy_s can exceed wall)
+                    self.stages["parse"].record(1, t)
+                    done(name, digest, src, dest, ok)
+        except BrokenProcessPool:
+            _drop_parse_pool(self.workers, pool)
+            raise
+        finally:
+            # the pool outlives this ingest: don't leave work writing into our temp dir
+            for fut in pending:
+                fut.cancel()
+            wait(pending)
+        self._put(out, _DONE)
+
+    def chunk(self, inp: queue.Queue, out: queue.Queue) -> None:
+        """Split parsed pages lazily, drop chunks already indexed, batch the rest for embedding."""
+        batch: List[Tuple[str, str, dict]] = []
+        while True:
+            item = self._get(inp)
+            if item is _DONE:
+                break
+            name, digest, pages_path, known = item
+            t = time.perf_counter()
+            if known is not None:
+                fresh = [cid for cid in dict.fromkeys(known) if cid not in self.seen]
+                self.seen.update(fresh)
+                self.counts["files"] += 1
+                self.counts["chunks"] += len(known)
+                self.counts["unchanged"] += len(fresh)
+                continue
+            if pages_path is None:
+                if name in self.known_files:
+                    # unreadable now: keep what was indexed from it before
+                    self.seen.update(cid for cid in self.known_files[name][1] if cid in self.existing)
+                self.counts["skipped"] += 1
+                continue
+            ids, n = [], 0
+            for doc in iter_chunks(name, _read_pages(pages_path), self.chunk_size, self.chunk_overlap):
+                cid = chunk_id(name, doc.page_content)
+                ids.append(cid)
+                n += 1
+                if cid in self.seen:
+                    continue
+                self.seen.add(cid)
+                if cid in self.existing:
+                    self.counts["unchanged"] += 1
+                    continue
+                doc.metadata["chunk_hash"] = cid
+                batch.append((cid, doc.page_content, doc.metadata))
+                if len(batch) >= self.embed_batch:
+                    self.stages["chunk"].record(n, t)
+                    self._put(out, batch)
+                    batch, n, t = [], 0, time.perf_counter()
+            self.stages["chunk"].record(n, t)
+            os.remove(pages_path)
+            if not ids:
+                self.counts["skipped"] += 1
+                continue
+            self.counts["files"] += 1
+            self.counts["chunks"] += len(ids)
+            self.known_files[name] = ((digest, self.chunk_size, self.chunk_overlap), ids)
+        if batch:
+            self._put(out, batch)
+        self._put(out, _DONE)
+
+    def embed(self, inp: queue.Queue, out: queue.Queue) -> None:
+        embedding = self.vectordb.embeddings
+        while True:
+            batch = self._get(inp)
+            if batch is _DONE:
+                break
+            t = time.perf_counter()
+            vectors = embed_texts(embedding, [text for _, text, _ in batch]) if self.precompute else None
+            self.stages["embed"].record(len(batch), t)
+            self._put(out, (batch, vectors))
+        self._put(out, _DONE)
+
+    def upsert(self, inp: queue.Queue) -> None:
+        while True:
+            item = self._get(inp)
+            if item is _DONE:
+                break
+            batch, vectors = item
+            t = time.perf_counter()
+            bulk_upsert(
+                self.vectordb,
+                [cid for cid, _, _ in batch],
+                vectors,
+                [text for _, text, _ in batch],
+                [meta for _, _, meta in batch],
+            )
+            self.stages["upsert"].record(len(batch), t)
+            self.counts["added"] += len(batch)
+
+
+def ingest_files_pipelined(
+    vectordb,
+    files: Iterable[Tuple[str, Any]],
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    embed_batch: int = EMBED_BATCH,
+    workers: int = PARSE_WORKERS,
+    queue_depth: int = QUEUE_DEPTH,
+) -> Dict[str, Any]:
+    """
+    Sync `vectordb` with (name, binary file) pairs, streaming:
+
+        parse (process pool) -> chunk (stream) -> embed (batched) -> upsert (bulk)
+
+    Only chunks the index doesn't hold yet are embedded; files whose bytes
+    were already ingested into this store by this process are not re-parsed.
+    Binary or unreadable files are skipped, and an unreadable file keeps the
+    chunks it had indexed before. Chunks no longer produced by any file are
+    deleted. Embedding and vector store errors propagate.
+
+    Stages are threads joined by bounded queues, so a slow stage applies
+    backpressure instead of letting parsed text or vectors pile up. Uploads
+    are spooled to a temp directory and pages streamed through it, so memory
+    stays flat regardless of file size. With Chroma and no embedding cache,
+    embedding happens on write (the embed stage passes batches through).
+    Returns counts of files, skipped, chunks, added, removed and unchanged,
+    plus per-stage throughput under "stages" and total "wall_s".
+    """
+    t0 = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="ingest_") as tmpdir:
+        p = _Pipeline(vectordb, chunk_size, chunk_overlap, embed_batch, workers, tmpdir)
+        parsed: queue.Queue = queue.Queue(maxsize=max(queue_depth, 2 * workers))
+        chunks: queue.Queue = queue.Queue(maxsize=queue_depth)
+        vectors: queue.Queue = queue.Queue(maxsize=queue_depth)
+        threads = [
+            p._run(p.parse, files, parsed),
+            p._run(p.chunk, parsed, chunks),
+            p._run(p.embed, chunks, vectors),
+            p._run(p.upsert, vectors),
+        ]
+        for t in threads:
+            t.join()
+    if p.errors:
+        raise p.errors[0]
+
+    stale = [cid for cid in p.existing if cid not in p.seen]
+    if stale:
+        vectordb.delete(ids=stale)
+    p.counts["removed"] = len(stale)
+    if p.counts["added"] or stale:
+        touch_index(vectordb)
+        if isinstance(vectordb, (NumpyVectorStore, HnswVectorStore)):
+            vectordb.persist()
+    return {
+        **p.counts,
+        "stages": {name: s.as_dict() for name, s in p.stages.items()},
+        "wall_s": round(time.perf_counter() - t0, 3),
+    }
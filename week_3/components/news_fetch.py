@@ -1,8 +1,4 @@
 import re
-import requests
-import trafilatura
-from bs4 import BeautifulSoup
-from readability import Document
 
 USER_AGENT = {
     "User-Agent": (
@@ -26,6 +22,12 @@ def fetch_article_text_debug(url: str):
     """
     Try multiple extraction strategies and return (text, debug_info).
     """
+    # the extraction stack is heavy; load it on the first fetch, not at app start
+    import requests
+    import trafilatura
+    from bs4 import BeautifulSoup
+    from readability import Document
+
     debug = {"url": url, "steps": []}
     text = ""
 
@@ -0,0 +1,176 @@
+from __future__ import annotations
+import itertools
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+_WS = re.compile(r"\s+")
+
+# Near-repeat questions score ~0.9+ cosine with MiniLM; unrelated ones rarely pass 0.8
+DEFAULT_ANSWER_THRESHOLD = 0.92
+
+
+def normalize_query(query: str) -> str:
+    return _WS.sub(" ", query).strip().lower()
+
+
+def index_version(vectordb) -> int:
+    """Write counter of the index (see rag_utils.touch_index for Chroma)."""
+    return getattr(vectordb, "version", 0)
+
+
+_tokens = itertools.count(1)
+
+
+def index_token(vectordb) -> int:
+    """
+    Process-unique id of a store object. Unlike id(), it is never handed to
+    another store after this one is closed (see rag_utils.open_index).
+    """
+    token = getattr(vectordb, "_rag_cache_token", None)
+    if token is None:
+        token = vectordb._rag_cache_token = next(_tokens)
+    return token
+
+
+class _LRU:
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.data: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        value = self.data.get(key)
+        if value is not None:
+            self.data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+
+class RAGCache:
+    """
+    Three layers in front of `answer_with_rag`:
+
+    - query embeddings, keyed by normalized query text (per embedding model);
+    - retrieval results, keyed by (index, index version, query, k), so any
+      write to the index invalidates them;
+    - answers: opt-in per call (or via `answer_threshold`), a new question
+      whose embedding is within the threshold cosine of an earlier one,
+      asked against the same index version and `scope` (everything else the
+      answer depends on: model, sampling, persona),
+      reuses the stored answer. Answers are only stored while reuse is on.
+
+    In-memory and thread-safe; one instance is shared per process.
+    """
+
+    def __init__(
+        self,
+        embedding_size: int = 2048,
+        retrieval_size: int = 512,
+        answer_size: int = 256,
+        answer_threshold: Optional[float] = None,
+    ) -> None:
+        self._lock = threading.Lock()
+        self._embeddings = _LRU(embedding_size)
+        self._retrievals = _LRU(retrieval_size)
+        self._answers = _LRU(answer_size)
+        self.answer_threshold = answer_threshold
+        self.stats = {k: 0 for k in ("embed_hits", "embed_misses", "retrieval_hits", "retrieval_misses", "answer_hits")}
+
+    @staticmethod
+    def _index_key(vectordb) -> Tuple[int, int]:
+        return index_token(vectordb), index_version(vectordb)
+
+    def query_vector(self, vectordb, query: str) -> np.ndarray:
+        """Unit-norm float32 query embedding, computed once per distinct question."""
+        embedding = vectordb.embeddings
+        key = (id(embedding), normalize_query(query))
+        with self._lock:
+            vec = self._embeddings.get(key)
+            if vec is not None:
+                self.stats["embed_hits"] += 1
+                return vec
+            self.stats["embed_misses"] += 1
+        vec = np.asarray(embedding.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        if norm:
+            vec = vec / norm
+        with self._lock:
+            self._embeddings.put(key, vec)
+        return vec
+
+    def retrieve(self, vectordb, query: str, k: int, search: Callable[[List[float]], Any]) -> Any:
+        """`search(query_vector)` result, memoized until the index changes."""
+        key = (self._index_key(vectordb), normalize_query(query), k)
+        with self._lock:
+            hit = self._retrievals.get(key)
+            if hit is not None:
+                self.stats["retrieval_hits"] += 1
+                return hit
+            self.stats["retrieval_misses"] += 1
+        result = search(self.query_vector(vectordb, query).tolist())
+        with self._lock:
+            self._retrievals.put(key, result)
+        return result
+
+    def lookup_answer(
+        self, vectordb, query: str, scope: str = "", threshold: Optional[float] = None
+    ) -> Optional[str]:
+        threshold = self.answer_threshold if threshold is None else threshold
+        if threshold is None:
+            return None
+        index_key = self._index_key(vectordb)
+        qvec = self.query_vector(vectordb, query)
+        with self._lock:
+            entries = [(vec, ans) for (ik, sc, _), (vec, ans) in self._answers.data.items() if ik == index_key and sc == scope]
+        if not entries:
+            return None
+        sims = np.stack([vec for vec, _ in entries]) @ qvec
+        best = int(np.argmax(sims))
+        if sims[best] < threshold:
+            return None
+        with self._lock:
+            self.stats["answer_hits"] += 1
+        return entries[best][1]
+
+    def store_answer(
+        self, vectordb, query: str, answer: str, scope: str = "", threshold: Optional[float] = None
+    ) -> None:
+        if (self.answer_threshold if threshold is None else threshold) is None:
+            return  # reuse is off: nothing will ever read it
+        qvec = self.query_vector(vectordb, query)
+        with self._lock:
+            self._answers.put((self._index_key(vectordb), scope, normalize_query(query)), (qvec, answer))
+
+    def forget(self, vectordb) -> None:
+        """Drop retrievals and answers of a store that is being closed."""
+        token = index_token(vectordb)
+        with self._lock:
+            for layer in (self._retrievals, self._answers):
+                for key in [key for key in layer.data if key[0][0] == token]:
+                    del layer.data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            for layer in (self._embeddings, self._retrievals, self._answers):
+                layer.data.clear()
+
+
+_cache: Optional[RAGCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_rag_cache() -> RAGCache:
+    """Process-wide cache instance (shared across Streamlit sessions)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RAGCache()
+        return _cache
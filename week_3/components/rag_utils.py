@@ -1,32 +1,410 @@
 from __future__ import annotations
-from typing import List
-from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from components.embedding_cache import CachedEmbeddings, open_embedding_cache
+from components.vector_index import NumpyVectorStore
+from components.ann_index import HnswVectorStore
+from components.rag_cache import RAGCache, get_rag_cache
+from components.context_packing import CONTEXT_TOKEN_BUDGET, FETCH_K, pack_context
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CHROMA_DIR = os.getenv("RAG_CHROMA_DIR", os.path.join(os.path.expanduser("~"), ".cache", "genai", "chroma"))
+NUMPY_INDEX_DIR = os.getenv("RAG_NUMPY_DIR", os.path.join(os.path.expanduser("~"), ".cache", "genai", "npindex"))
+HNSW_INDEX_DIR = os.getenv("RAG_HNSW_DIR", os.path.join(os.path.expanduser("~"), ".cache", "genai", "hnsw"))
+INDEX_STAMP_DIR = os.getenv("RAG_INDEX_STAMP_DIR", os.path.join(os.path.expanduser("~"), ".cache", "genai", "index_stamps"))
+ADD_BATCH = 1000  # stay well under Chroma's max batch size
+
+# Stores `open_index` keeps open in this process (least recently used are closed
+# first), and how long an on-disk collection may go unused before it is deleted.
+MAX_OPEN_INDEXES = int(os.getenv("RAG_MAX_OPEN_INDEXES", "16"))
+INDEX_IDLE_TTL_S = float(os.getenv("RAG_INDEX_TTL_HOURS", "72")) * 3600
+PURGE_INTERVAL_S = 3600  # at most one scan for idle collections per hour
+
+# "chroma" (default), "numpy" (in-process exact matrix, see vector_index)
+# or "hnsw" (approximate, for large corpora, see ann_index)
+VECTOR_BACKEND = os.getenv("RAG_VECTOR_BACKEND", "chroma")
+
+# Embedding inference knobs (CPU): "torch", "onnx", "onnx-int8" or "int8"
+EMBED_BACKEND = os.getenv("RAG_EMBED_BACKEND", "torch")
+EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "64"))
+ONNX_INT8_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+# Content-addressed on-disk vector cache in front of the model (see embedding_cache)
+EMBED_CACHE = os.getenv("RAG_EMBED_CACHE", "1") not in ("0", "false", "no")
+
+
+class EmbeddingService(Embeddings):
+    """
+    SentenceTransformer wrapper that encodes in tunable batches and can run
+    on an ONNX or int8-quantized CPU backend. Use `get_embeddings()` so the
+    model is loaded once per process rather than once per call.
+    """
+
+    def __init__(
+        self,
+        model_name: str = EMBED_MODEL,
+        backend: str = EMBED_BACKEND,
+        batch_size: int = EMBED_BATCH_SIZE,
+        device: str = "cpu",
+    ) -> None:
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        if backend == "onnx":
+            model = SentenceTransformer(model_name, device=device, backend="onnx")
+        elif backend == "onnx-int8":
+            model = SentenceTransformer(
+                model_name, device=device, backend="onnx", model_kwargs={"file_name": ONNX_INT8_FILE}
+            )
+        elif backend == "int8":
+            import torch
+
+            model = SentenceTransformer(model_name, device="cpu")
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif backend == "torch":
+            model = SentenceTransformer(model_name, device=device)
+        else:
+            raise ValueError(f"Unknown embedding backend: {backend}")
+        self.model = model
+        self.dim = model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str]):
+        """Normalized float32 matrix of shape (len(texts), dim)."""
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.encode(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+
+_embedders: Dict[Tuple[str, str, int, bool], Embeddings] = {}
+_embedders_lock = threading.Lock()
+
+
+def get_embeddings(
+    model_name: str = EMBED_MODEL,
+    backend: str = EMBED_BACKEND,
+    batch_size: int = EMBED_BATCH_SIZE,
+    cache: bool = EMBED_CACHE,
+) -> Embeddings:
+    """
+    Process-wide embedding model, loaded on first use and shared by all sessions.
+    With `cache`, vectors for already-seen (model, backend, text) come from disk and
+    the model is only loaded when something actually needs embedding.
+    """
+    key = (model_name, backend, batch_size, cache)
+    with _embedders_lock:
+        if key not in _embedders:
+            if cache:
+                # backends produce slightly different vectors: never serve one's as another's
+                cache_name = f"{model_name}:{backend}"
+                _embedders[key] = CachedEmbeddings(
+                    cache_name,
+                    lambda: EmbeddingService(model_name, backend, batch_size),
+                    open_embedding_cache(cache_name),
+                )
+            else:
+                _embedders[key] = EmbeddingService(model_name, backend, batch_size)
+        return _embedders[key]
 
 def chunk_docs(raw_texts: List[str], sources: List[str] | None = None, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Document]:
-    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
     docs = []
     sources = sources or [f"doc_{i}" for i in range(len(raw_texts))]
     for src, txt in zip(sources, raw_texts):
         if not txt:
             continue
-        for chunk in splitter.split_text(txt):
-            docs.append(Document(page_content=chunk, metadata={"source": src}))
+        # start_index lets context packing stitch overlapping neighbours back together
+        for chunk in splitter.create_documents([txt], metadatas=[{"source": src}]):
+            docs.append(chunk)
     return docs
 
 
-def build_chroma(docs: List[Document], collection_name: str = "voice_rag"):
-    embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL)
-    vectordb = Chroma.from_documents(docs, embedding=embeddings, collection_name=collection_name)
+def chunk_id(source: str, text: str) -> str:
+    """Content hash used as the vector id: same source + text => same id."""
+    return hashlib.sha256(f"{source}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def embedding_fingerprint(model_name: str = EMBED_MODEL, backend: str = EMBED_BACKEND, normalize: bool = True) -> str:
+    """
+    Short id of what produced an index's vectors. Persisted collections are
+    namespaced by it: ids are content hashes and existing ones are never
+    re-embedded, so switching model, backend or normalization must start a
+    fresh index rather than mix two vector spaces in one.
+    """
+    spec = f"{model_name}|{backend}|{'normalized' if normalize else 'raw'}"
+    return hashlib.sha256(spec.encode("utf-8")).hexdigest()[:8]
+
+
+def _namespaced(collection_name: str) -> str:
+    return f"{collection_name}_{embedding_fingerprint()}"
+
+
+def open_chroma(collection_name: str = "voice_rag", persist_directory: str = CHROMA_DIR):
+    """Open (or create) the on-disk collection without embedding anything."""
+    # langchain_community + chromadb take seconds to import; only pay for them when used
+    from langchain_community.vectorstores import Chroma
+
+    return Chroma(
+        collection_name=_namespaced(collection_name),
+        embedding_function=get_embeddings(),
+        persist_directory=persist_directory,
+    )
+
+
+def open_numpy_index(collection_name: str = "voice_rag", persist_directory: str = NUMPY_INDEX_DIR) -> NumpyVectorStore:
+    """Load (memory-mapped) or create the NumPy index for `collection_name`."""
+    return NumpyVectorStore(get_embeddings(), persist_directory=os.path.join(persist_directory, _namespaced(collection_name)))
+
+
+def open_hnsw_index(collection_name: str = "voice_rag", persist_directory: str = HNSW_INDEX_DIR) -> HnswVectorStore:
+    """Load or create the HNSW index for `collection_name` (needs `hnswlib`)."""
+    return HnswVectorStore(get_embeddings(), persist_directory=os.path.join(persist_directory, _namespaced(collection_name)))
+
+
+def session_collection(session_id: str, base: str = "voice_rag") -> str:
+    """
+    Collection private to one app session, so one user's upload never
+    replaces another's documents. The id comes from the URL, so it is hashed
+    into a safe collection/directory name.
+    """
+    return f"{base}_{hashlib.sha256(session_id.encode('utf-8')).hexdigest()[:16]}"
+
+
+_stores: "OrderedDict[Tuple[str, str], object]" = OrderedDict()
+_stores_lock = threading.Lock()
+_last_purge = 0.0
+
+
+def _open_store(backend: str, collection_name: str):
+    if backend == "chroma":
+        return open_chroma(collection_name)
+    if backend == "numpy":
+        return open_numpy_index(collection_name)
+    if backend == "hnsw":
+        return open_hnsw_index(collection_name)
+    raise ValueError(f"Unknown vector backend: {backend}")
+
+
+def _stamp_path(backend: str, collection_name: str) -> str:
+    return os.path.join(INDEX_STAMP_DIR, f"{backend}__{collection_name}")
+
+
+def _stamp(backend: str, collection_name: str) -> None:
+    """Record that the collection was just used (the stamp file's mtime)."""
+    path = _stamp_path(backend, collection_name)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        os.makedirs(INDEX_STAMP_DIR, exist_ok=True)
+        open(path, "a").close()
+
+
+def _delete_collection(backend: str, collection_name: str) -> None:
+    if backend == "chroma":
+        open_chroma(collection_name).delete_collection()
+    else:
+        root = NUMPY_INDEX_DIR if backend == "numpy" else HNSW_INDEX_DIR
+        shutil.rmtree(os.path.join(root, _namespaced(collection_name)), ignore_errors=True)
+
+
+def purge_idle_indexes(max_idle_s: float = INDEX_IDLE_TTL_S) -> int:
+    """
+    Drop and delete every collection opened through `open_index` (in any
+    process sharing the cache dir) that hasn't been used for `max_idle_s`.
+    Returns how many were deleted.
+    """
+    try:
+        names = os.listdir(INDEX_STAMP_DIR)
+    except FileNotFoundError:
+        return 0
+    cutoff = time.time() - max_idle_s
+    deleted = 0
+    for name in names:
+        path = os.path.join(INDEX_STAMP_DIR, name)
+        backend, _, collection_name = name.partition("__")
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue  # another process purged it
+        with _stores_lock:
+            store = _stores.pop((backend, collection_name), None)
+        if store is not None:
+            get_rag_cache().forget(store)
+        try:
+            _delete_collection(backend, collection_name)
+        except Exception:
+            continue  # keep the stamp and retry on the next scan
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        deleted += 1
+    return deleted
+
+
+def open_index(backend: str = VECTOR_BACKEND, collection_name: str = "voice_rag"):
+    """
+    Process-wide handle on the persistent index for `backend` ("chroma", "numpy"
+    or "hnsw"). At most MAX_OPEN_INDEXES stay open, and collections idle for
+    INDEX_IDLE_TTL_S are deleted from disk (checked at most hourly).
+    """
+    global _last_purge
+    key = (backend, collection_name)
+    now = time.time()
+    if now - _last_purge > PURGE_INTERVAL_S:
+        _last_purge = now
+        purge_idle_indexes()
+    evicted = []
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = _open_store(backend, collection_name)
+            while len(_stores) > MAX_OPEN_INDEXES:
+                evicted.append(_stores.popitem(last=False)[1])
+        else:
+            _stores.move_to_end(key)
+    _stamp(backend, collection_name)
+    for old in evicted:
+        get_rag_cache().forget(old)
+    return store
+
+
+def touch_index(vectordb) -> None:
+    """Bump the write counter caches key on; numpy/hnsw stores keep their own."""
+    if not isinstance(vectordb, (NumpyVectorStore, HnswVectorStore)):
+        vectordb.version = getattr(vectordb, "version", 0) + 1
+
+
+def sync_index(vectordb, docs: List[Document]) -> Dict[str, int]:
+    """
+    Make the collection hold exactly `docs`, keyed by content hash.
+    Only new/changed chunks are embedded; chunks that are no longer present
+    (changed text or removed sources) are deleted.
+    """
+    wanted: Dict[str, Document] = {}
+    for d in docs:
+        cid = chunk_id(d.metadata.get("source", ""), d.page_content)
+        d.metadata["chunk_hash"] = cid
+        wanted.setdefault(cid, d)
+
+    existing = set(vectordb.get(include=[])["ids"])
+    new_ids = [cid for cid in wanted if cid not in existing]
+    stale = [cid for cid in existing if cid not in wanted]
+
+    if stale:
+        vectordb.delete(ids=stale)
+    for i in range(0, len(new_ids), ADD_BATCH):
+        batch = new_ids[i:i + ADD_BATCH]
+        vectordb.add_documents([wanted[cid] for cid in batch], ids=batch)
+    if new_ids or stale:
+        touch_index(vectordb)
+        if isinstance(vectordb, (NumpyVectorStore, HnswVectorStore)):
+            vectordb.persist()
+    return {"added": len(new_ids), "removed": len(stale), "unchanged": len(wanted) - len(new_ids)}
+
+
+def _ingested_files(vectordb) -> Dict[str, Tuple[Tuple[str, int, int], List[str]]]:
+    """
+    name -> ((digest, chunk_size, chunk_overlap), chunk ids) of the files this
+    process last ingested into `vectordb` (see ingest_pipeline). Kept on the
+    store itself, so it holds one entry per file name in that index and goes
+    away with it.
+    """
+    files = getattr(vectordb, "_ingested_files", None)
+    if files is None:
+        files = vectordb._ingested_files = {}
+    return files
+
+
+def build_chroma(docs: List[Document], collection_name: str = "voice_rag", persist_directory: str = CHROMA_DIR):
+    vectordb = open_chroma(collection_name, persist_directory)
+    sync_index(vectordb, docs)
+    return vectordb
+
+
+def build_numpy_index(docs: List[Document], collection_name: str = "voice_rag", persist_directory: str = NUMPY_INDEX_DIR):
+    """Drop-in alternative to build_chroma backed by NumpyVectorStore."""
+    vectordb = open_numpy_index(collection_name, persist_directory)
+    sync_index(vectordb, docs)
     return vectordb
 
-def answer_with_rag(vectordb, llm_call, query: str, k: int = 4) -> str:
-    retrieved_docs = vectordb.similarity_search(query, k=k)
-    context = "\n\n".join([f"[Source: {d.metadata.get('source', '?')}]\n{d.page_content}\n" for d in retrieved_docs])
+
+def build_hnsw_index(docs: List[Document], collection_name: str = "voice_rag", persist_directory: str = HNSW_INDEX_DIR):
+    """Drop-in alternative to build_chroma backed by an approximate HNSW index."""
+    vectordb = open_hnsw_index(collection_name, persist_directory)
+    sync_index(vectordb, docs)
+    return vectordb
+
+def search_with_relevance(vectordb, embedding: List[float], k: int) -> List[Tuple[Document, float]]:
+    """Top-k by vector with scores normalized to [0, 1] relevance (higher is closer)."""
+    if isinstance(vectordb, (NumpyVectorStore, HnswVectorStore)):
+        hits = vectordb.similarity_search_by_vector_with_score(embedding, k=k)
+    else:  # Chroma returns distances here
+        hits = vectordb.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
+    relevance = vectordb._select_relevance_score_fn()
+    return [(doc, relevance(score)) for doc, score in hits]
+
+
+def answer_with_rag(
+    vectordb,
+    llm_call,
+    query: str,
+    k: int = 4,
+    cache: Optional[RAGCache] = None,
+    scope: str = "",
+    answer_threshold: Optional[float] = None,
+    token_budget: Optional[int] = CONTEXT_TOKEN_BUDGET,
+    fetch_k: int = FETCH_K,
+    model: Optional[str] = None,
+) -> str:
+    """
+    Retrieve chunks and answer from them.
+
+    With `token_budget`, `fetch_k` candidates are retrieved and packed into at
+    most that many context tokens (see context_packing); with None, the top
+    `k` chunks are pasted verbatim. With `cache`, the query embedding and
+    retrieval are memoized per index version; with `answer_threshold` as
+    well, a near-identical earlier question asked under the same `scope`
+    returns its stored answer without an LLM call.
+    """
+    if cache is not None:
+        cached = cache.lookup_answer(vectordb, query, scope, answer_threshold)
+        if cached is not None:
+            return cached
+
+    if token_budget is None:
+        if cache is None:
+            retrieved_docs = vectordb.similarity_search(query, k=k)
+        else:
+            retrieved_docs = cache.retrieve(vectordb, query, k, lambda vec: vectordb.similarity_search_by_vector(vec, k=k))
+        context = "\n\n".join([f"[Source: {d.metadata.get('source', '?')}]\n{d.page_content}\n" for d in retrieved_docs])
+    else:
+        if cache is None:
+            scored = search_with_relevance(vectordb, vectordb.embeddings.embed_query(query), fetch_k)
+        else:
+            scored = cache.retrieve(vectordb, query, fetch_k, lambda vec: search_with_relevance(vectordb, vec, fetch_k))
+        context, _ = pack_context(scored, token_budget, model)
     prompt = f"""
 You are a helpful assistant. Use ONLY the context to answer.
 If the answer isn't in the context, say you don't have enough information.
@@ -38,4 +416,7 @@ Context:\n{context}
 Question: {query}
 Answer concisely:
 """
-    return llm_call(prompt)
\ No newline at end of file
+    answer = llm_call(prompt)
+    if cache is not None:
+        cache.store_answer(vectordb, query, answer, scope, answer_threshold)
+    return answer
@@ -0,0 +1,132 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+def format_ts(seconds: float) -> str:
+    """123.4 -> '2:03', 3723 -> '1:02:03'."""
+    s = int(seconds)
+    h, rem = divmod(s, 3600)
+    m, sec = divmod(rem, 60)
+    return f"{h}:{m:02d}:{sec:02d}" if h else f"{m}:{sec:02d}"
+
+
+class Transcript:
+    """
+    Compact cue store: parallel arrays of start offsets, durations (seconds)
+    and cue text. Cues are kept sorted by start so time windows are a bisect.
+    """
+
+    __slots__ = ("starts", "durations", "texts")
+
+    def __init__(self) -> None:
+        self.starts = array("d")
+        self.durations = array("d")
+        self.texts: List[str] = []
+
+    @classmethod
+    def from_cues(cls, cues: Iterable[Tuple[float, float, str]]) -> "Transcript":
+        t = cls()
+        for start, duration, text in sorted(cues, key=lambda c: c[0]):
+            t.append(start, duration, text)
+        return t
+
+    @classmethod
+    def from_columns(cls, starts: List[float], durations: List[float], texts: List[str]) -> "Transcript":
+        """
+        Bulk-build from parallel lists of already-clean cues (non-empty text,
+        durations >= 0), as the caption parsers produce. Sorted by start only
+        if they arrive out of order.
+        """
+        if any(b < a for a, b in zip(starts, starts[1:])):
+            return cls.from_cues(zip(starts, durations, texts))
+        t = cls()
+        t.starts = array("d", starts)
+        t.durations = array("d", durations)
+        t.texts = texts
+        return t
+
+    def append(self, start: float, duration: float, text: str) -> None:
+        text = (text or "").strip()
+        if not text:
+            return
+        if self.starts and start < self.starts[-1]:
+            # out-of-order cue (rare); insert to keep starts sorted
+            i = bisect_left(self.starts, start)
+            self.starts.insert(i, start)
+            self.durations.insert(i, max(0.0, duration))
+            self.texts.insert(i, text)
+            return
+        self.starts.append(start)
+        self.durations.append(max(0.0, duration))
+        self.texts.append(text)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.texts)
+
+    @property
+    def duration(self) -> float:
+        if not self.texts:
+            return 0.0
+        return self.starts[-1] + self.durations[-1]
+
+    def window(self, start: float, end: float) -> "Transcript":
+        """Cues whose start offset falls in [start, end)."""
+        i = bisect_left(self.starts, start)
+        j = bisect_left(self.starts, end)
+        out = Transcript()
+        out.starts = self.starts[i:j]
+        out.durations = self.durations[i:j]
+        out.texts = self.texts[i:j]
+        return out
+
+    def windows(self, seconds: float) -> Iterator[Tuple[float, float, "Transcript"]]:
+        """Yield (start, end, slice) for consecutive non-empty windows of `seconds`."""
+        if not self.texts or seconds <= 0:
+            return
+        t = 0.0
+        end = self.duration
+        while t < end:
+            w = self.window(t, t + seconds)
+            if w:
+                yield t, min(t + seconds, end), w
+            t += seconds
+
+    def to_timestamped_text(self, every: float = 30.0) -> str:
+        """
+        One line per ~`every` seconds, prefixed with the real start time:
+        "[1:30] text ...". Grouping keeps the timestamp overhead small.
+        """
+        lines: List[str] = []
+        cur: List[str] = []
+        line_start = None
+        for start, text in zip(self.starts, self.texts):
+            if line_start is None:
+                line_start = start
+            elif start - line_start >= every:
+                lines.append(f"[{format_ts(line_start)}] {' '.join(cur)}")
+                cur, line_start = [], start
+            cur.append(text)
+        if cur:
+            lines.append(f"[{format_ts(line_start)}] {' '.join(cur)}")
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "starts": self.starts.tolist(),
+            "durations": self.durations.tolist(),
+            "texts": list(self.texts),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Transcript":
+        t = cls()
+        t.starts = array("d", data.get("starts", []))
+        t.durations = array("d", data.get("durations", []))
+        t.texts = list(data.get("texts", []))
+        return t
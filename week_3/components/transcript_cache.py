@@ -0,0 +1,173 @@
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Sequence, Tuple
+
+from components.transcript import Transcript
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "genai", "transcripts.sqlite3")
+CACHE_PATH = os.getenv("TRANSCRIPT_CACHE_PATH", DEFAULT_CACHE_PATH)
+
+TTL_SECONDS = 7 * 24 * 3600        # captions rarely change once published
+NEGATIVE_TTL_SECONDS = 6 * 3600    # re-check "no captions" videos a few times a day
+
+# Marker row for videos that have no usable captions
+NO_CAPTIONS = "none"
+
+
+class TranscriptCache:
+    """
+    Local persistent transcript store keyed by (video_id, lang, kind).
+
+    `kind` is "manual" or "auto" for real tracks and `NO_CAPTIONS` for a
+    negative entry. When a fetch for some languages had to fall back to a
+    track in another language, that choice is remembered per requested
+    language list, so the fallback is only reused for the same request.
+    One SQLite file is shared by every Streamlit session.
+    """
+
+    def __init__(
+        self,
+        path: str = CACHE_PATH,
+        ttl: int = TTL_SECONDS,
+        negative_ttl: int = NEGATIVE_TTL_SECONDS,
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS transcript_cues (
+                    video_id   TEXT NOT NULL,
+                    lang       TEXT NOT NULL,
+                    kind       TEXT NOT NULL,
+                    cues       TEXT NOT NULL,
+                    reason     TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (video_id, lang, kind)
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS transcript_fallbacks (
+                    video_id   TEXT NOT NULL,
+                    langs      TEXT NOT NULL,
+                    lang       TEXT NOT NULL,
+                    kind       TEXT NOT NULL,
+                    PRIMARY KEY (video_id, langs)
+                )
+                """
+            )
+
+    def get(self, video_id: str, langs: Sequence[str]) -> Optional[Tuple[Transcript, str]]:
+        """
+        Return (transcript, reason) for the best fresh entry, mirroring fetch order:
+        manual tracks in `langs` order, then auto tracks, then the track an
+        earlier fetch for these same `langs` fell back to. A fresh negative
+        entry returns an empty transcript. None means a cache miss.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT lang, kind, cues, reason, fetched_at FROM transcript_cues WHERE video_id = ?",
+                (video_id,),
+            ).fetchall()
+            fallback = self._conn.execute(
+                "SELECT lang, kind FROM transcript_fallbacks WHERE video_id = ? AND langs = ?",
+                (video_id, _langs_key(langs)),
+            ).fetchone()
+
+        fresh = {}
+        for lang, kind, cues, reason, fetched_at in rows:
+            ttl = self.negative_ttl if kind == NO_CAPTIONS else self.ttl
+            if now - fetched_at <= ttl:
+                fresh[(lang, kind)] = (cues, reason)
+        if not fresh:
+            return None
+
+        for kind in ("manual", "auto"):
+            for lang in langs:
+                if (lang, kind) in fresh:
+                    cues, reason = fresh[(lang, kind)]
+                    return Transcript.from_dict(json.loads(cues)), f"cache hit: {reason}"
+        # a previous fetch for exactly these langs fell back to another track
+        if fallback is not None and tuple(fallback) in fresh:
+            cues, reason = fresh[tuple(fallback)]
+            return Transcript.from_dict(json.loads(cues)), f"cache hit: {reason}"
+        if ("", NO_CAPTIONS) in fresh:
+            _, reason = fresh[("", NO_CAPTIONS)]
+            return Transcript(), f"cache hit (no captions): {reason}"
+        # only other-language tracks cached: the requested ones may exist upstream
+        return None
+
+    def put(
+        self,
+        video_id: str,
+        lang: str,
+        kind: str,
+        transcript: Transcript,
+        reason: str,
+        langs: Sequence[str] = (),
+    ) -> None:
+        """Store a track; `langs` is the request it answered, recorded as a fallback if `lang` isn't in it."""
+        cues = json.dumps(transcript.to_dict(), separators=(",", ":"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcript_cues VALUES (?, ?, ?, ?, ?, ?)",
+                (video_id, lang, kind, cues, reason, time.time()),
+            )
+            if langs and kind != NO_CAPTIONS and lang not in langs:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO transcript_fallbacks VALUES (?, ?, ?, ?)",
+                    (video_id, _langs_key(langs), lang, kind),
+                )
+            if kind != NO_CAPTIONS:
+                # captions appeared since we last looked
+                self._conn.execute(
+                    "DELETE FROM transcript_cues WHERE video_id = ? AND kind = ?",
+                    (video_id, NO_CAPTIONS),
+                )
+
+    def put_negative(self, video_id: str, reason: str) -> None:
+        self.put(video_id, "", NO_CAPTIONS, Transcript(), reason)
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "DELETE FROM transcript_cues WHERE (kind = ? AND fetched_at < ?) OR (kind != ? AND fetched_at < ?)",
+                (NO_CAPTIONS, now - self.negative_ttl, NO_CAPTIONS, now - self.ttl),
+            )
+            self._conn.execute(
+                "DELETE FROM transcript_fallbacks WHERE NOT EXISTS (SELECT 1 FROM transcript_cues c "
+                "WHERE c.video_id = transcript_fallbacks.video_id AND c.lang = transcript_fallbacks.lang "
+                "AND c.kind = transcript_fallbacks.kind)"
+            )
+            return cur.rowcount
+
+
+def _langs_key(langs: Sequence[str]) -> str:
+    return ",".join(langs)
+
+
+_cache: Optional[TranscriptCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_transcript_cache() -> TranscriptCache:
+    """Process-wide cache instance (shared across Streamlit sessions)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TranscriptCache()
+        return _cache
@@ -0,0 +1,279 @@
+from __future__ import annotations
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+
+def _normalize(mat: np.ndarray) -> np.ndarray:
+    mat = np.asarray(mat, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def embed_texts(embedding: Embeddings, texts: List[str]) -> np.ndarray:
+    """Batch-embed to a float32 matrix, skipping the list-of-lists detour when possible."""
+    if hasattr(embedding, "encode"):
+        return np.asarray(embedding.encode(texts), dtype=np.float32)
+    return np.asarray(embedding.embed_documents(texts), dtype=np.float32)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process vector index for small-to-medium corpora.
+
+    All vectors live L2-normalized in one contiguous float32 matrix (memory
+    mapped from `vectors.npy` when loaded from disk), so top-k is a single
+    matmul plus `argpartition`. Exposes the slice of Chroma's API that
+    rag_utils relies on (`get`, `delete`, `add_documents`, `similarity_search*`)
+    and filters on `source` with a boolean mask over integer source codes.
+    """
+
+    def __init__(self, embedding: Embeddings, persist_directory: Optional[str] = None, mmap: bool = True) -> None:
+        self._embedding = embedding
+        self.persist_directory = persist_directory
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._pos: Dict[str, int] = {}
+        self._source_codes: Dict[str, int] = {}
+        self._buf = np.zeros((0, 0), dtype=np.float32)
+        self._src = np.zeros(0, dtype=np.int32)
+        self._n = 0
+        self.version = 0
+        if persist_directory and os.path.exists(os.path.join(persist_directory, "vectors.npy")):
+            self._load(mmap)
+
+    # ----- storage -----
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._buf[: self._n]
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _source_code(self, source: str) -> int:
+        code = self._source_codes.get(source)
+        if code is None:
+            code = self._source_codes[source] = len(self._source_codes)
+        return code
+
+    def _reserve(self, extra: int, dim: int) -> None:
+        """Grow capacity geometrically so repeated small adds stay amortized O(1)."""
+        need = self._n + extra
+        if self._buf.shape[1] != dim and self._n == 0:
+            self._buf = np.zeros((0, dim), dtype=np.float32)
+        if need <= len(self._buf) and self._buf.flags.writeable:
+            return
+        cap = max(need, 2 * len(self._buf), 256)
+        buf = np.empty((cap, dim), dtype=np.float32)
+        buf[: self._n] = self._buf[: self._n]
+        src = np.empty(cap, dtype=np.int32)
+        src[: self._n] = self._src[: self._n]
+        self._buf, self._src = buf, src
+
+    def upsert_embeddings(
+        self,
+        ids: Sequence[str],
+        embeddings: np.ndarray,
+        texts: Sequence[str],
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+    ) -> List[str]:
+        """Insert precomputed vectors; existing ids are overwritten in place."""
+        vecs = _normalize(embeddings)
+        metadatas = metadatas or [{} for _ in texts]
+        with self._lock:
+            self._reserve(len(ids), vecs.shape[1])
+            for cid, vec, text, meta in zip(ids, vecs, texts, metadatas):
+                row = self._pos.get(cid)
+                if row is None:
+                    row = self._n
+                    self._n += 1
+                    self._pos[cid] = row
+                    self._ids.append(cid)
+                    self._texts.append(text)
+                    self._metadatas.append(dict(meta))
+                else:
+                    self._texts[row] = text
+                    self._metadatas[row] = dict(meta)
+                self._buf[row] = vec
+                self._src[row] = self._source_code(str(meta.get("source", "")))
+            self.version += 1
+        return list(ids)
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        if ids is None:
+            import uuid
+
+            ids = [uuid.uuid4().hex for _ in texts]
+        return self.upsert_embeddings(ids, embed_texts(self._embedding, texts), texts, metadatas)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._lock:
+            drop = {self._pos[i] for i in ids if i in self._pos}
+            if not drop:
+                return False
+            keep = np.ones(self._n, dtype=bool)
+            keep[list(drop)] = False
+            self._buf = np.ascontiguousarray(self.matrix[keep])
+            self._src = self._src[: self._n][keep].copy()
+            self._n = len(self._buf)
+            self._ids = [x for r, x in enumerate(self._ids) if keep[r]]
+            self._texts = [x for r, x in enumerate(self._texts) if keep[r]]
+            self._metadatas = [x for r, x in enumerate(self._metadatas) if keep[r]]
+            self._pos = {cid: r for r, cid in enumerate(self._ids)}
+            self.version += 1
+        return True
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None, **kwargs: Any) -> Dict[str, Any]:
+        """Chroma-style `get`: ids always, documents/metadatas when included."""
+        include = ["documents", "metadatas"] if include is None else include
+        with self._lock:
+            rows = range(self._n) if ids is None else [self._pos[i] for i in ids if i in self._pos]
+            out: Dict[str, Any] = {"ids": [self._ids[r] for r in rows]}
+            if "documents" in include:
+                out["documents"] = [self._texts[r] for r in rows]
+            if "metadatas" in include:
+                out["metadatas"] = [self._metadatas[r] for r in rows]
+        return out
+
+    # ----- persistence -----
+    def persist(self) -> None:
+        """Atomically write vectors.npy + meta.json to `persist_directory`."""
+        if not self.persist_directory:
+            return
+        os.makedirs(self.persist_directory, exist_ok=True)
+        with self._lock:
+            mat = self.matrix
+            meta = {"ids": self._ids, "texts": self._texts, "metadatas": self._metadatas}
+            vec_tmp = os.path.join(self.persist_directory, "vectors.tmp.npy")
+            meta_tmp = os.path.join(self.persist_directory, "meta.tmp.json")
+            np.save(vec_tmp, mat)
+            with open(meta_tmp, "w", encoding="utf-8") as fh:
+                json.dump(meta, fh)
+            os.replace(vec_tmp, os.path.join(self.persist_directory, "vectors.npy"))
+            os.replace(meta_tmp, os.path.join(self.persist_directory, "meta.json"))
+
+    def _load(self, mmap: bool) -> None:
+        d = self.persist_directory
+        with open(os.path.join(d, "meta.json"), encoding="utf-8") as fh:
+            meta = json.load(fh)
+        mat = np.load(os.path.join(d, "vectors.npy"), mmap_mode="r" if mmap else None)
+        self._ids = list(meta["ids"])
+        self._texts = list(meta["texts"])
+        self._metadatas = list(meta["metadatas"])
+        self._pos = {cid: r for r, cid in enumerate(self._ids)}
+        self._buf = mat  # read-only map until the first write triggers _reserve()
+        self._n = len(mat)
+        self._src = np.array(
+            [self._source_code(str(m.get("source", ""))) for m in self._metadatas], dtype=np.int32
+        )
+
+    # ----- search -----
+    def _mask(self, filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Supports {"source": "a.pdf"} and {"source": {"$in": [...]}}."""
+        if not filter:
+            return None
+        cond = filter.get("source")
+        if cond is None:
+            raise ValueError("NumpyVectorStore only filters on 'source'")
+        wanted = cond.get("$in", []) if isinstance(cond, dict) else [cond]
+        codes = [self._source_codes[s] for s in wanted if s in self._source_codes]
+        return np.isin(self._src[: self._n], codes)
+
+    def _topk(
+        self, queries: np.ndarray, k: int, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Tuple[int, float]]]:
+        with self._lock:
+            mat = self.matrix
+            if self._n == 0 or k <= 0:
+                return [[] for _ in range(len(queries))]
+            sims = _normalize(queries) @ mat.T  # (m, n)
+            mask = self._mask(filter)
+        if mask is not None:
+            sims[:, ~mask] = -np.inf
+            k = min(k, int(mask.sum()))
+            if k == 0:
+                return [[] for _ in range(len(queries))]
+        k = min(k, sims.shape[1])
+        part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(sims, part, axis=1)
+        order = np.argsort(-top, axis=1)
+        idx = np.take_along_axis(part, order, axis=1)
+        scores = np.take_along_axis(top, order, axis=1)
+        return [list(zip(i.tolist(), s.tolist())) for i, s in zip(idx, scores)]
+
+    def _doc(self, row: int) -> Document:
+        return Document(page_content=self._texts[row], metadata=dict(self._metadatas[row]))
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        hits = self._topk(np.asarray([embedding], dtype=np.float32), k, filter)[0]
+        return [(self._doc(r), s) for r, s in hits]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [d for d, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """Scores are cosine similarities (higher is closer)."""
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [d for d, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_batch(
+        self, queries: List[str], k: int = 4, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Document]]:
+        """Embed all queries in one batch and answer them with one matmul."""
+        if not queries:
+            return []
+        qmat = embed_texts(self._embedding, list(queries))
+        return [[self._doc(r) for r, _ in hits] for hits in self._topk(qmat, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # already cosine similarity; clamp into [0, 1]
+        return lambda score: max(0.0, min(1.0, score))
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        persist_directory: Optional[str] = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(embedding, persist_directory=persist_directory)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        store.persist()
+        return store
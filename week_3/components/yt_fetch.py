@@ -1,79 +1,110 @@
-from typing import Optional, Sequence, Tuple
-from youtube_transcript_api import (
-    YouTubeTranscriptApi,
-)
-from pytube import extract
-
-# yt-dlp fallback
-import re, requests, html
+from __future__ import annotations
+from typing import TYPE_CHECKING, Optional, Sequence, Tuple
+from components.captions import parse_captions, parse_srv3, parse_vtt
+from components.transcript import Transcript
+from components.transcript_cache import get_transcript_cache
+
+# youtube-transcript-api, pytube, yt-dlp and requests are imported where they
+# are used, so loading this module (e.g. at app start) stays cheap
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin
-from yt_dlp import YoutubeDL
-import xml.etree.ElementTree as ET
+
+if TYPE_CHECKING:
+    import requests
+
+NO_TRACKS_REASON = "yt-dlp found no usable tracks"
+
+# M3U8 caption segments: bounded parallelism over one pooled session
+MAX_SEGMENT_WORKERS = 8
+SEGMENT_RETRIES = 2
+SEGMENT_TIMEOUT = 20
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+def _http() -> requests.Session:
+    """Process-wide keep-alive session sized for concurrent segment downloads."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_SEGMENT_WORKERS)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+        return _session
+
+def _fetch_segment(seg_url: str) -> str:
+    """GET one caption segment, retrying transient failures with a short backoff."""
+    import requests
+
+    for attempt in range(SEGMENT_RETRIES + 1):
+        try:
+            seg = _http().get(seg_url, timeout=SEGMENT_TIMEOUT)
+            if seg.ok and seg.text:
+                return seg.text
+            if seg.status_code < 500 and seg.status_code != 429:
+                return ""  # permanent (4xx) or empty: don't retry
+        except requests.RequestException:
+            pass
+        if attempt < SEGMENT_RETRIES:
+            time.sleep(0.25 * (2 ** attempt))
+    return ""
 
 def extract_video_id(url: str) -> Optional[str]:
+    from pytube import extract
+
     try:
         return extract.video_id(url)
     except Exception:
         return None
 
-def _clean_vtt_to_text(vtt_text: str) -> str:
-    lines = []
-    for line in vtt_text.splitlines():
-        if not line.strip(): 
-            continue
-        if line.startswith("WEBVTT"):
-            continue
-        # strip timestamps and cue numbers
-        if re.search(r"\d{2}:\d{2}:\d{2}\.\d{3}\s-->\s\d{2}:\d{2}:\d{2}\.\d{3}", line):
-            continue
-        if re.match(r"^\d+$", line.strip()):
-            continue
-        lines.append(line.strip())
-    return " ".join(lines)
+def _yta_to_transcript(fetched) -> Transcript:
+    """youtube-transcript-api cues (dicts in 0.x, snippet objects in 1.x) -> Transcript"""
+    t = Transcript()
+    for c in fetched:
+        if isinstance(c, dict):
+            t.append(float(c.get("start", 0)), float(c.get("duration", 0)), c.get("text", ""))
+        else:
+            t.append(float(c.start), float(c.duration), c.text)
+    return t
 
-def _parse_srv3_xml(xml_text: str) -> str:
-    """YouTube SRV3 XML -> plain text"""
-    try:
-        root = ET.fromstring(xml_text)
-        texts = []
-        for t in root.iter():
-            if t.tag.lower().endswith('text') and (t.text or "").strip():
-                texts.append(html.unescape(t.text.strip()))
-        return " ".join(texts)
-    except Exception:
-        return ""
-
-def _fetch_vtt_or_playlist(url: str) -> str:
+def _fetch_vtt_or_playlist(url: str, dedupe: bool = False) -> Transcript:
     """
     Download a VTT file, or if it's an M3U8 playlist of VTT chunks,
-    follow segments and join.
+    follow segments and join. `dedupe` collapses rolling auto-captions.
     """
-    r = requests.get(url, timeout=20)
+    r = _http().get(url, timeout=20)
     if not r.ok or not r.text:
-        return ""
+        return Transcript()
     text = r.text
 
     # M3U8 playlist?
     if text.lstrip().startswith("#EXTM3U"):
-        # collect segment URLs and fetch them
-        vtt_all = []
-        for line in text.splitlines():
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            seg_url = urljoin(url, line)
-            try:
-                seg = requests.get(seg_url, timeout=20)
-                if seg.ok and seg.text:
-                    vtt_all.append(seg.text)
-            except Exception:
-                continue
-        return _clean_vtt_to_text("\n".join(vtt_all))
+        # collect segment URLs and fetch them concurrently; map() keeps playlist order
+        seg_urls = [
+            urljoin(url, line.strip())
+            for line in text.splitlines()
+            if line.strip() and not line.strip().startswith("#")
+        ]
+        if not seg_urls:
+            return Transcript()
+        workers = min(MAX_SEGMENT_WORKERS, len(seg_urls))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            vtt_all = [seg for seg in pool.map(_fetch_segment, seg_urls) if seg]
+        return parse_vtt("\n\n".join(vtt_all), dedupe)
     else:
         # assume it is VTT already
-        return _clean_vtt_to_text(text)
+        return parse_vtt(text, dedupe)
+
+def _try_ytdlp_captions(video_url: str, langs: Sequence[str]) -> Tuple[Transcript, str, str, str]:
+    """Returns (transcript, reason, lang, kind) where kind is "manual" or "auto"."""
+    from yt_dlp import YoutubeDL
 
-def _try_ytdlp_captions(video_url: str, langs: Sequence[str]) -> Tuple[str, str]:
     ydl_opts = {
         "quiet": True,
         "no_warnings": True,
@@ -85,12 +116,13 @@ def _try_ytdlp_captions(video_url: str, langs: Sequence[str]) -> Tuple[str, str]
         with YoutubeDL(ydl_opts) as ydl:
             info = ydl.extract_info(video_url, download=False)
     except Exception as e:
-        return "", f"yt-dlp extract_info failed: {e}"
+        return Transcript(), f"yt-dlp extract_info failed: {e}", "", ""
 
     # helper to try a list of tracks (yt-dlp format)
-    def try_tracks(tracks_dict, label: str) -> Tuple[str, str]:
+    # only auto captions roll (each cue repeats the previous line), so only they are deduped
+    def try_tracks(tracks_dict, label: str, dedupe: bool) -> Tuple[Transcript, str, str]:
         if not tracks_dict:
-            return "", ""
+            return Transcript(), "", ""
         # Prefer entries that look like VTT first; else SRV3; else anything
         entries = []
         for lang in langs:
@@ -112,97 +144,129 @@ def _try_ytdlp_captions(video_url: str, langs: Sequence[str]) -> Tuple[str, str]
             ext = (entry.get("ext") or "").lower()
             try:
                 if ext == "vtt":
-                    txt = _fetch_vtt_or_playlist(u)
-                    if txt: return txt, f"yt-dlp OK ({label}:{lang}:vtt)"
+                    txt = _fetch_vtt_or_playlist(u, dedupe)
+                    if txt: return txt, f"yt-dlp OK ({label}:{lang}:vtt)", lang
                 elif ext in ("m3u8", ""):
                     # sometimes ext is blank but URL yields m3u8 -> handle in _fetch_vtt_or_playlist
-                    txt = _fetch_vtt_or_playlist(u)
-                    if txt: return txt, f"yt-dlp OK ({label}:{lang}:m3u8)"
-                elif ext == "srv3":
-                    resp = requests.get(u, timeout=20)
+                    txt = _fetch_vtt_or_playlist(u, dedupe)
+                    if txt: return txt, f"yt-dlp OK ({label}:{lang}:m3u8)", lang
+                elif ext in ("srv3", "json3", "ttml"):
+                    resp = _http().get(u, timeout=20)
                     if resp.ok and resp.text:
-                        txt = _parse_srv3_xml(resp.text)
-                        if txt: return txt, f"yt-dlp OK ({label}:{lang}:srv3)"
+                        txt = parse_captions(resp.text, ext, dedupe)
+                        if txt: return txt, f"yt-dlp OK ({label}:{lang}:{ext})", lang
                 else:
                     # last resort: try fetch and hope it's readable VTT/XML
-                    resp = requests.get(u, timeout=20)
+                    resp = _http().get(u, timeout=20)
                     if resp.ok and resp.text:
                         # guess format
                         body = resp.text
                         if body.lstrip().startswith("#EXTM3U"):
-                            txt = _fetch_vtt_or_playlist(u)
+                            txt = _fetch_vtt_or_playlist(u, dedupe)
                         elif "<text" in body and "</text>" in body:
-                            txt = _parse_srv3_xml(body)
+                            txt = parse_srv3(body, dedupe)
                         else:
-                            txt = _clean_vtt_to_text(body)
-                        if txt: return txt, f"yt-dlp OK ({label}:{lang}:{ext or 'unknown'})"
+                            txt = parse_captions(body, ext, dedupe)
+                        if txt: return txt, f"yt-dlp OK ({label}:{lang}:{ext or 'unknown'})", lang
             except Exception:
                 continue
-        return "", ""
+        return Transcript(), "", ""
 
     # 1) human subtitles first
-    txt, reason = try_tracks(info.get("subtitles") or {}, "subtitles")
+    txt, reason, lang = try_tracks(info.get("subtitles") or {}, "subtitles", dedupe=False)
     if txt:
-        return txt, reason
+        return txt, reason, lang, "manual"
 
     # 2) auto captions
-    txt, reason = try_tracks(info.get("automatic_captions") or {}, "automatic_captions")
+    txt, reason, lang = try_tracks(info.get("automatic_captions") or {}, "automatic_captions", dedupe=True)
     if txt:
-        return txt, reason
+        return txt, reason, lang, "auto"
 
-    return "", "yt-dlp found no usable tracks"
+    return Transcript(), NO_TRACKS_REASON, "", ""
 
-def _get_transcript_via_yta(vid: str, langs: Sequence[str]) -> Tuple[str, str]:
+def _get_transcript_via_yta(vid: str, langs: Sequence[str]) -> Tuple[Transcript, str, str, str]:
     """
     Use ONLY list_transcripts()/fetch(), never get_transcript.
     Works across older versions too.
+    Returns (transcript, reason, lang, kind) where kind is "manual" or "auto".
     """
+    from youtube_transcript_api import YouTubeTranscriptApi
+
     try:
         tlist = YouTubeTranscriptApi.list_transcripts(vid)
     except Exception as e:
-        return "", f"yta list_transcripts failed: {e}"
+        return Transcript(), f"yta list_transcripts failed: {e}", "", ""
 
     # Prefer manually-created (exact langs in order)
     for lang in langs:
         try:
             t = tlist.find_manually_created_transcript([lang])
-            return " ".join(c["text"] for c in t.fetch()), f"yta manual OK ({lang})"
+            return _yta_to_transcript(t.fetch()), f"yta manual OK ({lang})", lang, "manual"
         except Exception:
             pass
 
     # Then auto-generated
     try:
         t = tlist.find_generated_transcript(list(langs))
-        return " ".join(c["text"] for c in t.fetch()), "yta auto OK"
+        return _yta_to_transcript(t.fetch()), "yta auto OK", t.language_code, "auto"
     except Exception:
         pass
 
     # Lastly, any available transcript
     for tr in tlist:
         try:
-            return " ".join(c["text"] for c in tr.fetch()), f"yta any OK ({tr.language_code})"
+            kind = "auto" if getattr(tr, "is_generated", False) else "manual"
+            return _yta_to_transcript(tr.fetch()), f"yta any OK ({tr.language_code})", tr.language_code, kind
         except Exception:
             continue
 
-    return "", "yta no usable tracks"
+    return Transcript(), "yta no usable tracks", "", ""
 
 def fetch_transcript(url: str, lang_priority: Sequence[str] = ("en", "en-US", "en-GB")) -> str:
     text, _ = fetch_transcript_debug(url, lang_priority)
     return text
 
-def fetch_transcript_debug(url: str, lang_priority: Sequence[str] = ("en", "en-US", "en-GB")) -> Tuple[str, str]:
+def fetch_transcript_debug(
+    url: str,
+    lang_priority: Sequence[str] = ("en", "en-US", "en-GB"),
+    use_cache: bool = True,
+) -> Tuple[str, str]:
+    transcript, reason = fetch_transcript_cues_debug(url, lang_priority, use_cache)
+    return transcript.text, reason
+
+def fetch_transcript_cues_debug(
+    url: str,
+    lang_priority: Sequence[str] = ("en", "en-US", "en-GB"),
+    use_cache: bool = True,
+) -> Tuple[Transcript, str]:
+    """Like fetch_transcript_debug, but keeps cue start times and durations."""
     vid = extract_video_id(url)
     if not vid:
-        return "", "couldn't parse video id"
+        return Transcript(), "couldn't parse video id"
+
+    # 0) local transcript store (includes negative entries for caption-less videos)
+    cache = get_transcript_cache() if use_cache else None
+    if cache is not None:
+        hit = cache.get(vid, lang_priority)
+        if hit is not None:
+            return hit
 
     # 1) youtube-transcript-api via list_transcripts
-    text, reason = _get_transcript_via_yta(vid, lang_priority)
-    if text:
-        return text, reason
+    transcript, reason, lang, kind = _get_transcript_via_yta(vid, lang_priority)
+    if transcript:
+        if cache is not None:
+            cache.put(vid, lang, kind, transcript, reason, lang_priority)
+        return transcript, reason
 
     # 2) yt-dlp fallback
-    text, reason2 = _try_ytdlp_captions(url, lang_priority)
-    if text:
-        return text, reason2
+    transcript, reason2, lang, kind = _try_ytdlp_captions(url, lang_priority)
+    if transcript:
+        if cache is not None:
+            cache.put(vid, lang, kind, transcript, reason2, lang_priority)
+        return transcript, reason2
 
-    return "", f"{reason}; {reason2}"
+    # Only remember "no captions" when yt-dlp saw the video and it really had none,
+    # not when a network call failed.
+    if cache is not None and reason2 == NO_TRACKS_REASON:
+        cache.put_negative(vid, f"{reason}; {reason2}")
+    return Transcript(), f"{reason}; {reason2}"
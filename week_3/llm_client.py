@@ -1,19 +1,125 @@
 from __future__ import annotations
-from typing import List, Dict, Optional
+import abc
+import asyncio
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 from dotenv import load_dotenv
 
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)  # genai_common/, shared with week_1
+
+from appconfig import env_config as env
+from genai_common.history import ConversationHistory, count_tokens
+from genai_common.llm_clients import get_sync_client, summarize_turns
+from genai_common.rate_limit import Reservation, get_limiter, usage_tokens
+from genai_common.telemetry import LLMCall, start_call
+
 # Load environment variables from .env file
 load_dotenv(override=True)
 
-class LLMClient:
+RATE_LIMIT_RETRIES = 3  # extra attempts after a provider 429
+
+
+def infer_provider(model: str) -> str:
+    return "openai" if model.startswith("gpt-") else "groq"
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """Seconds to back off if `exc` is a provider 429, else None."""
+    if getattr(exc, "status_code", None) != 429:
+        return None
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return 5.0
+
+
+class FailoverPolicy:
+    """
+    Ordered (provider, model) targets for LLMClient.
+
+    The first target is tried first. If it hasn't streamed a first token
+    within `first_token_deadline` seconds, the next target is started in
+    parallel (a hedge) and whichever produces a token first wins; the other
+    stream is closed. Errors before the first token fall through to the next
+    target immediately. `api_keys` maps provider -> key (defaults to .env).
+    """
+
+    def __init__(
+        self,
+        targets: Sequence[Tuple[str, str]],
+        first_token_deadline: float = 4.0,
+        api_keys: Optional[Dict[str, str]] = None,
+    ) -> None:
+        if not targets:
+            raise ValueError("FailoverPolicy needs at least one (provider, model) target.")
+        self.targets = list(targets)
+        self.first_token_deadline = first_token_deadline
+        self.api_keys = dict(api_keys or {})
+
+    def api_key(self, provider: str) -> Optional[str]:
+        key = self.api_keys.get(provider)
+        if key:
+            return key
+        return env.openai_api_key if provider == "openai" else env.groq_api_key
+
+
+def _close(stream: Any) -> None:
+    close = getattr(stream, "close", None)
+    if close:
+        close()
+
+
+class _Attempt:
+    """
+    One target's stream in a failover race. The coordinator cancels losers
+    from its own thread: that closes the HTTP stream if one is open (which
+    unblocks a worker still waiting for its first chunk), and a worker whose
+    create() returns after the cancel closes the stream itself.
+    """
+
+    def __init__(self) -> None:
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._stream: Any = None
+
+    def attach(self, stream: Any) -> bool:
+        """Register the open stream; False (and the stream closed) if already cancelled."""
+        with self._lock:
+            if not self.cancelled.is_set():
+                self._stream = stream
+                return True
+        _close(stream)
+        return False
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled.set()
+            stream, self._stream = self._stream, None
+        if stream is not None:
+            _close(stream)
+
+
+class _BaseLLMClient(abc.ABC):
+    """Persona, history, meta answers and request building shared by the sync and async clients."""
+
     def __init__(
         self,
         model: str = "llama-3.3-70b-versatile",
         api_key: Optional[str] = None,
         chatbot_name: str = "Atlas",
         default_system_prompt: Optional[str] = None,
+        rate_limit: bool = True,
+        history: Optional[ConversationHistory] = None,
         ) -> None:
         self.model = model
+        self.rate_limit = rate_limit
         self.provider = self._infer_provider(model)
         self.chatbot_name = chatbot_name.strip() or "Atlas"
         self.default_system_prompt = (
@@ -24,29 +130,43 @@ class LLMClient:
                 "Prefer step-by-step clarity. Avoid unrelated topics."
             )
         )
-        # Late import to avoid hard dependency if keys absent
         if self.provider == "openai":
-            from openai import OpenAI
             self.api_key = api_key or env.openai_api_key
             if not self.api_key:
                 raise ValueError("OPENAI_API_KEY is required for gpt-* models.")
-            self.client = OpenAI(api_key=self.api_key)
         else:
-            from groq import Groq
             self.api_key = api_key or env.groq_api_key
             if not self.api_key:
                 raise ValueError("GROQ_API_KEY is required for llama-* models.")
-            self.client = Groq(api_key=self.api_key)
+        self.client = self._make_client()
+
+        # recent turns verbatim within a token budget, older ones folded into a rolling summary;
+        # pass `history` to keep a conversation alive across clients (e.g. Streamlit reruns)
+        self.history = history if history is not None else ConversationHistory()
+        self.history.summarize = self._summarize_turns
 
+    @abc.abstractmethod
+    def _make_client(self) -> Any:
+        """The SDK client `self.client` is set to (None if the subclass creates clients lazily)."""
 
-        self.history: List[Dict[str, str]] = []
+    def _make_sync_client(self) -> Any:
+        return get_sync_client(self.provider, self.api_key)
+
+    def _summarize_turns(self, previous: str, turns: List[Dict[str, str]]) -> str:
+        return summarize_turns(self._complete_summary, previous, turns)
+
+    def _complete_summary(self, msgs: List[Dict[str, str]], temperature: float, max_tokens: int) -> Any:
+        """Runs on the history's background thread, so it always uses a blocking client."""
+        resp, reservation, _ = self._create(self._make_sync_client(), msgs, temperature, max_tokens, kind="summary")
+        reservation.settle(usage_tokens(resp))
+        return resp
 
     def _infer_provider(self, model: str) -> str:
-        return "openai" if model.startswith("gpt-") else "groq"
+        return infer_provider(model)
 
 
     def clear(self) -> None:
-        self.history = []
+        self.history.clear()
 
 
     def meta_answer(self, prompt: str) -> Optional[str]:
@@ -58,54 +178,403 @@ class LLMClient:
             return f"I'm {self.chatbot_name}, running on {prov} model `{self.model}`."
         return None
 
+    def _messages(self, user_message: str, system_prompt: Optional[str], use_history: bool) -> List[Dict[str, str]]:
+        sys_msg = system_prompt if system_prompt else self.default_system_prompt
+        history = self.history.for_prompt() if use_history else []
+        return [{"role": "system", "content": sys_msg}] + history + [
+            {"role": "user", "content": user_message},
+        ]
+
+    def _params(
+        self,
+        msgs: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> Dict:
+        provider = provider or self.provider
+        model = model or self.model
+        params = {
+            "model": model,
+            "messages": msgs,
+        }
+        # GPT-5 note: some variants expect max_completion_tokens and only the default temperature
+        if provider == "openai" and model.startswith("gpt-5"):
+            params["max_completion_tokens"] = max_tokens
+        else:
+            params["temperature"] = temperature
+            params["max_tokens"] = max_tokens
+        return params
+
+    def _record(self, user_message: str, text: str) -> None:
+        self.history.append(user_message, text)
+
+    def _reserve(self, msgs: List[Dict[str, str]], max_tokens: int, provider: str, model: str) -> Reservation:
+        """Block until the shared provider/model budget has room for prompt + max_tokens."""
+        limiter = get_limiter(provider, model)
+        estimate = sum(count_tokens(m["content"]) + 4 for m in msgs) + max_tokens
+        if not self.rate_limit:
+            return Reservation(limiter, 0, settled=True)
+        return limiter.acquire(estimate)
+
+    def _create(
+        self,
+        client: Any,
+        msgs: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        stream: bool = False,
+        kind: Optional[str] = None,
+    ) -> Tuple[Any, Reservation, LLMCall]:
+        """
+        Rate-limited, timed chat.completions.create. Returns the response (or
+        stream), its reservation and its telemetry call; callers settle the
+        reservation with the reported usage. A plain response's call is
+        already finished; a stream's is finished by the code consuming it.
+        A 429 pauses everyone on that model and is retried a few times.
+        """
+        provider = provider or self.provider
+        model = model or self.model
+        params = self._params(msgs, temperature, max_tokens, provider, model)
+        if stream:
+            params["stream"] = True
+            if provider == "openai":
+                params["stream_options"] = {"include_usage": True}
+        attempt = 0
+        while True:
+            reservation = self._reserve(msgs, max_tokens, provider, model)
+            call = start_call(provider, model, kind or ("stream" if stream else "chat"), app="week_3")
+            try:
+                resp = client.chat.completions.create(**params)
+            except Exception as exc:
+                call.finish(error=exc)
+                reservation.settle(0)
+                wait = _retry_after(exc)
+                if wait is None or attempt == RATE_LIMIT_RETRIES:
+                    raise
+                reservation.limiter.backoff(wait)
+                attempt += 1
+                continue
+            if not stream:
+                call.finish(resp)
+            return resp, reservation, call
+
+
+class LLMClient(_BaseLLMClient):
+    def __init__(self, *args: Any, failover: Optional[FailoverPolicy] = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.failover = failover
+
+    def _make_client(self) -> Any:
+        return self._make_sync_client()
+
+    def _client_for(self, provider: str) -> Any:
+        if provider == self.provider:
+            return self.client
+        key = self.failover.api_key(provider) if self.failover else None
+        if not key:
+            raise ValueError(f"No API key configured for {provider}.")
+        return get_sync_client(provider, key)
+
+    def _stream_attempt(
+        self,
+        idx: int,
+        target: Tuple[str, str],
+        msgs: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        events: "queue.Queue",
+        attempt: _Attempt,
+    ) -> None:
+        """Worker thread: push (idx, kind, payload) events for one target's stream."""
+        provider, model = target
+        stream = reservation = call = used = None
+        try:
+            if attempt.cancelled.is_set():
+                return  # another target won before this one started
+            client = self._client_for(provider)
+            stream, reservation, call = self._create(
+                client, msgs, temperature, max_tokens, provider, model, stream=True, kind="failover"
+            )
+            if not attempt.attach(stream):
+                return
+            for chunk in stream:
+                if attempt.cancelled.is_set():
+                    return
+                call.observe(chunk)
+                used = usage_tokens(chunk) or used
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    events.put((idx, "delta", delta))
+            call.finish()
+            events.put((idx, "done", None))
+        except Exception as exc:
+            if attempt.cancelled.is_set():
+                return  # the coordinator closed the stream under us
+            if call is not None:
+                call.finish(error=exc)
+            events.put((idx, "error", exc))
+        finally:
+            if reservation is not None:
+                reservation.settle(used)
+                call.finish(cancelled=True)  # lost the race; no-op if already finished
+            _close(stream)
+
+    def _failover_stream(self, msgs: List[Dict[str, str]], temperature: float, max_tokens: int) -> Iterator[str]:
+        """Yield deltas from the first target to produce one, hedging/falling through per the policy."""
+        policy = self.failover
+        events: "queue.Queue" = queue.Queue()
+        attempts: List[_Attempt] = []
+        active: set = set()
+        errors: List[Exception] = []
+        winner: Optional[int] = None
+
+        def launch() -> None:
+            idx = len(attempts)
+            attempts.append(_Attempt())
+            active.add(idx)
+            threading.Thread(
+                target=self._stream_attempt,
+                args=(idx, policy.targets[idx], msgs, temperature, max_tokens, events, attempts[idx]),
+                daemon=True,
+            ).start()
+
+        launch()
+        hedge_at = time.monotonic() + policy.first_token_deadline
+        try:
+            while True:
+                can_hedge = winner is None and len(attempts) < len(policy.targets)
+                timeout = max(0.0, hedge_at - time.monotonic()) if can_hedge else None
+                try:
+                    idx, kind, payload = events.get(timeout=timeout)
+                except queue.Empty:
+                    # primary too slow to first token: race the next target
+                    launch()
+                    hedge_at = time.monotonic() + policy.first_token_deadline
+                    continue
+
+                if winner is None and kind in ("delta", "done"):
+                    winner = idx
+                    for other in active - {idx}:
+                        attempts[other].cancel()  # closes its request now, freeing the connection
+                if winner is not None and idx != winner:
+                    continue
+
+                if kind == "delta":
+                    yield payload
+                elif kind == "done":
+                    return
+                else:  # error
+                    active.discard(idx)
+                    if winner is not None:
+                        raise payload  # failed mid-answer; can't splice another model in
+                    errors.append(payload)
+                    if not active:
+                        if len(attempts) == len(policy.targets):
+                            raise errors[-1]
+                        launch()
+                        hedge_at = time.monotonic() + policy.first_token_deadline
+        finally:
+            for a in attempts:
+                a.cancel()
+
     def chat(
         self,
         user_message: str,
         temperature: float = 0.5,
         max_tokens: int = 1024,
         system_prompt: Optional[str] = None,
+        use_history: bool = True,
     ) -> str:
+        """
+        Send one message. With use_history=False the call neither sees nor
+        records the conversation, so independent calls (e.g. per-window
+        summaries) can safely run in parallel threads.
+        """
     # Short-circuit meta
         meta = self.meta_answer(user_message)
         if meta:
-            self.history.extend([
-                {"role": "user", "content": user_message},
-                {"role": "assistant", "content": meta},
-            ])
+            if use_history:
+                self._record(user_message, meta)
             return meta
 
-        sys_msg = system_prompt if system_prompt else self.default_system_prompt
-        msgs: List[Dict[str, str]] = [{"role": "system", "content": sys_msg}] + self.history + [
-            {"role": "user", "content": user_message},
-        ]
+        msgs = self._messages(user_message, system_prompt, use_history)
+        if self.failover:
+            text = "".join(self._failover_stream(msgs, temperature, max_tokens))
+        else:
+            resp, reservation, _ = self._create(self.client, msgs, temperature, max_tokens)
+            reservation.settle(usage_tokens(resp))
+            text = resp.choices[0].message.content
+
+        if use_history:
+            self._record(user_message, text)
+        return text
 
+    def chat_stream(
+        self,
+        user_message: str,
+        temperature: float = 0.5,
+        max_tokens: int = 1024,
+        system_prompt: Optional[str] = None,
+        use_history: bool = True,
+    ) -> Iterator[str]:
+        """
+        Like `chat`, but yields text deltas as the provider streams them
+        (works with `st.write_stream`). The full reply is added to history
+        once the stream completes.
+        """
+        meta = self.meta_answer(user_message)
+        if meta:
+            if use_history:
+                self._record(user_message, meta)
+            yield meta
+            return
 
+        msgs = self._messages(user_message, system_prompt, use_history)
+        if self.failover:
+            parts = []
+            for delta in self._failover_stream(msgs, temperature, max_tokens):
+                parts.append(delta)
+                yield delta
+            if use_history:
+                self._record(user_message, "".join(parts))
+            return
+
+        stream, reservation, call = self._create(self.client, msgs, temperature, max_tokens, stream=True)
+        parts: List[str] = []
+        used = None
+        try:
+            for chunk in stream:
+                call.observe(chunk)
+                used = usage_tokens(chunk) or used
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+            call.finish()
+        except Exception as exc:
+            call.finish(error=exc)
+            raise
+        finally:
+            reservation.settle(used)
+            call.finish(cancelled=True)  # consumer stopped early; no-op if already finished
+            _close(stream)  # stop generation server-side if the consumer bails out early
+
+        if use_history:
+            self._record(user_message, "".join(parts))
+
+
+class AsyncLLMClient(_BaseLLMClient):
+    """
+    Same persona/meta behaviour as LLMClient on the providers' async SDKs.
+    `achat` is awaited inside your own event loop; `chat_many` runs a batch
+    of independent prompts concurrently from synchronous code (e.g. Streamlit).
+    """
+
+    def _make_client(self) -> Any:
+        # an async HTTP pool belongs to one event loop: `achat` creates its
+        # client on first use, `chat_many` a short-lived one per batch
+        return None
+
+    def _new_client(self) -> Any:
         if self.provider == "openai":
-            # GPT-5 note: some variants expect max_completion_tokens
-            is_gpt5 = self.model.startswith("gpt-5")
-            params = {
-                "model": self.model,
-                "messages": msgs,
-            }
-            if not is_gpt5:
-                params["temperature"] = temperature
-                params["max_tokens"] = max_tokens
-            else:
-                params["max_completion_tokens"] = max_tokens
-            resp = self.client.chat.completions.create(**params)
-            text = resp.choices[0].message.content
-        else:
-            resp = self.client.chat.completions.create(
-                model=self.model,
-                messages=msgs,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-            text = resp.choices[0].message.content
+            from openai import AsyncOpenAI
+            return AsyncOpenAI(api_key=self.api_key)
+        from groq import AsyncGroq
+        return AsyncGroq(api_key=self.api_key)
 
+    async def _acreate(self, client: Any, msgs: List[Dict[str, str]], temperature: float, max_tokens: int) -> Any:
+        """Async twin of `_create`; waits for the limiter off the event loop and settles usage itself."""
+        params = self._params(msgs, temperature, max_tokens)
+        attempt = 0
+        while True:
+            reservation = await asyncio.to_thread(self._reserve, msgs, max_tokens, self.provider, self.model)
+            call = start_call(self.provider, self.model, "async", app="week_3")
+            try:
+                resp = await client.chat.completions.create(**params)
+            except Exception as exc:
+                call.finish(error=exc)
+                reservation.settle(0)
+                wait = _retry_after(exc)
+                if wait is None or attempt == RATE_LIMIT_RETRIES:
+                    raise
+                reservation.limiter.backoff(wait)
+                attempt += 1
+                continue
+            call.finish(resp)
+            reservation.settle(usage_tokens(resp))
+            return resp
 
-        self.history.extend([
-            {"role": "user", "content": user_message},
-            {"role": "assistant", "content": text},
-        ])
-        return text
\ No newline at end of file
+    async def achat(
+        self,
+        user_message: str,
+        temperature: float = 0.5,
+        max_tokens: int = 1024,
+        system_prompt: Optional[str] = None,
+        use_history: bool = True,
+        client: Any = None,
+    ) -> str:
+        meta = self.meta_answer(user_message)
+        if meta:
+            if use_history:
+                self._record(user_message, meta)
+            return meta
+
+        msgs = self._messages(user_message, system_prompt, use_history)
+        if client is None:
+            if self.client is None:
+                self.client = self._new_client()
+            client = self.client
+        resp = await self._acreate(client, msgs, temperature, max_tokens)
+        text = resp.choices[0].message.content
+
+        if use_history:
+            self._record(user_message, text)
+        return text
+
+    async def achat_many(
+        self,
+        prompts: Sequence[str],
+        concurrency: int = 4,
+        temperature: float = 0.5,
+        max_tokens: int = 1024,
+        system_prompt: Optional[str] = None,
+        client: Any = None,
+    ) -> List[str]:
+        """Answer independent prompts (no shared history), at most `concurrency` in flight; results keep input order."""
+        sem = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(prompt: str) -> str:
+            async with sem:
+                return await self.achat(prompt, temperature, max_tokens, system_prompt, use_history=False, client=client)
+
+        return list(await asyncio.gather(*(one(p) for p in prompts)))
+
+    def chat_many(
+        self,
+        prompts: Sequence[str],
+        concurrency: int = 4,
+        temperature: float = 0.5,
+        max_tokens: int = 1024,
+        system_prompt: Optional[str] = None,
+    ) -> List[str]:
+        """
+        Blocking wrapper around `achat_many` for code without an event loop.
+        Uses a short-lived SDK client, since async HTTP pools can't be shared
+        across the event loops that successive calls create.
+        """
+        async def run() -> List[str]:
+            client = self._new_client()
+            try:
+                return await self.achat_many(prompts, concurrency, temperature, max_tokens, system_prompt, client=client)
+            finally:
+                await client.close()
+
+        return asyncio.run(run())
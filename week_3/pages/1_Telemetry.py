@@ -0,0 +1,66 @@
+"""
+LLM call telemetry: latency, time-to-first-token, tokens and spend per model.
+Reads the SQLite file written by genai_common.telemetry.TelemetrySink (week_1 and week_3).
+"""
+import os
+import sys
+import time
+
+import streamlit as st
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from genai_common.telemetry import TELEMETRY_PATH, get_telemetry
+
+st.set_page_config(page_title="Week 3 – LLM Telemetry", page_icon="📊", layout="wide")
+st.title("📊 LLM Telemetry")
+
+sink = get_telemetry()
+if sink is None:
+    st.info("Telemetry is disabled (LLM_TELEMETRY=0).")
+    st.stop()
+
+WINDOWS = {"Last hour": 3600, "Last 24 hours": 86400, "Last 7 days": 7 * 86400, "All time": None}
+c1, c2, c3 = st.columns([1, 1, 2])
+window = c1.selectbox("Window", list(WINDOWS), index=1)
+app = c2.selectbox("App", ["all", "week_3", "week_1"])
+c3.caption(f"Source: `{TELEMETRY_PATH}`" + (f" • {sink.dropped} rows dropped" if sink.dropped else ""))
+
+since = time.time() - WINDOWS[window] if WINDOWS[window] else None
+summary = sink.summary(since, None if app == "all" else app)
+if not summary:
+    st.info("No LLM calls recorded in this window yet.")
+    st.stop()
+
+calls = sum(s["calls"] for s in summary)
+errors = sum(s["errors"] for s in summary)
+m1, m2, m3, m4 = st.columns(4)
+m1.metric("Calls", f"{calls:,}")
+m2.metric("Error rate", f"{errors / max(1, calls):.1%}")
+m3.metric("Tokens", f"{sum(s['prompt_tokens'] + s['completion_tokens'] for s in summary):,}")
+m4.metric("Spend", f"${sum(s['cost_usd'] for s in summary):.4f}")
+
+st.subheader("Per model")
+st.dataframe(summary, use_container_width=True, hide_index=True)
+
+models = [f"{s['provider']}:{s['model']}" for s in summary]
+left, right = st.columns(2)
+with left:
+    st.markdown("**Latency (ms)**")
+    st.bar_chart(
+        {"model": models, "p50": [s["p50_latency_ms"] or 0 for s in summary], "p95": [s["p95_latency_ms"] or 0 for s in summary]},
+        x="model",
+        stack=False,
+    )
+with right:
+    st.markdown("**Spend (USD)**")
+    st.bar_chart({"model": models, "cost_usd": [s["cost_usd"] for s in summary]}, x="model")
+
+with st.expander("Recent errors"):
+    failed = [r for r in sink.rows(since, None if app == "all" else app) if r["error"]][-50:]
+    if failed:
+        st.dataframe(failed[::-1], use_container_width=True, hide_index=True)
+    else:
+        st.write("None.")
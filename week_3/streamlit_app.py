@@ -1,10 +1,19 @@
 import io
 import os
+import time
+import uuid
 import streamlit as st
-from llm_client import LLMClient
+from llm_client import AsyncLLMClient, FailoverPolicy, LLMClient, infer_provider  # also puts genai_common/ on sys.path
+from genai_common.history import ConversationHistory
+from genai_common.conversation_store import get_conversation_store
+from genai_common.telemetry import get_telemetry
+# Cheap at import: news_fetch/yt_fetch load trafilatura, bs4, yt-dlp etc. on first use.
+# The RAG stack (LangChain, Chroma, sentence-transformers) is imported inside its tool below.
+# Check with: python benchmarks/import_budget.py
 from components.news_fetch import fetch_article_text_debug, clean_summary_text
-from components.yt_fetch import fetch_transcript, fetch_transcript_debug, extract_video_id
-from components.rag_utils import chunk_docs, build_chroma, answer_with_rag
+from components.yt_fetch import fetch_transcript_cues_debug, extract_video_id
+from components.transcript import Transcript, format_ts
+from components.chunking import chunk_by_tokens, count_tokens, preflight_estimate, truncate_to_tokens
 
 from appconfig import env_config as env  # optional, kept for parity
 from dotenv import load_dotenv
@@ -23,23 +32,40 @@ st.sidebar.header("Global Configuration")
 _groq = st.sidebar.text_input("Groq API Key", type="password", value=default_groq)
 _openai = st.sidebar.text_input("OpenAI API Key", type="password", value=default_openai)
 
-model = st.sidebar.selectbox(
-    "Model",
-    [
-        "llama-3.1-8b-instant",
-        "llama-3.3-70b-versatile",
-        "gpt-5",
-        "gpt-5-mini",
-        "gpt-5-nano",
-    ],
-)
+MODELS = [
+    "llama-3.1-8b-instant",
+    "llama-3.3-70b-versatile",
+    "gpt-5",
+    "gpt-5-mini",
+    "gpt-5-nano",
+]
+model = st.sidebar.selectbox("Model", MODELS)
 
 chatbot_name = st.sidebar.text_input("Chatbot Name", value="Atlas")
 system_prompt = st.sidebar.text_area("System Prompt (optional)")
 temperature = st.sidebar.slider("Temperature", 0.0, 2.0, 0.5, 0.1)
 max_tokens = st.sidebar.slider("Max Tokens", 256, 4096, 1024, 256)
 
-# Create LLM client (auto-switch)
+with st.sidebar.expander("Failover (optional)"):
+    backup_model = st.selectbox("Backup model", ["(none)"] + [m for m in MODELS if m != model])
+    hedge_after = st.slider("Hedge after (s without a first token)", 0.5, 10.0, 3.0, 0.5)
+failover = None
+if backup_model != "(none)":
+    failover = FailoverPolicy(
+        [(infer_provider(model), model), (infer_provider(backup_model), backup_model)],
+        first_token_deadline=hedge_after,
+        api_keys={"groq": _groq, "openai": _openai},
+    )
+
+# Conversation outlives reruns and restarts: it is keyed by ?sid= in the URL and saved to SQLite
+session_id = st.query_params.get("sid")
+if not session_id:
+    session_id = st.query_params["sid"] = uuid.uuid4().hex
+if st.session_state.get("session_id") != session_id:
+    st.session_state.session_id = session_id
+    st.session_state.history = get_conversation_store().bind(session_id, ConversationHistory())
+
+# Create LLM client (auto-switch); the SDK client underneath is pooled per process
 key = _openai if model.startswith("gpt-") else _groq
 try:
     llm = LLMClient(
@@ -47,6 +73,15 @@ try:
         api_key=key,
         chatbot_name=chatbot_name,
         default_system_prompt=(system_prompt or None),
+        failover=failover,
+        history=st.session_state.history,
+    )
+    # same persona/model on the async SDK, for fanning out independent calls
+    allm = AsyncLLMClient(
+        model=model,
+        api_key=key,
+        chatbot_name=chatbot_name,
+        default_system_prompt=(system_prompt or None),
     )
 except Exception as e:
     st.sidebar.error(str(e))
@@ -60,30 +95,15 @@ st.title("Week 3 Projects – News / YouTube / Voice Assistant RAG")
 st.write("Three tools below reusing my Week 1 controls (keys, model, persona, temp, tokens).")
 
 # --- Long-article safety helpers ---
-def approx_tokens(s: str) -> int:
-    # crude 1 token ≈ 4 chars heuristic
-    return max(1, len(s) // 4)
-
-def chunk_text(s: str, max_chars: int = 10000, overlap: int = 800) -> list[str]:
-    """Split long text into overlapping chunks to stay under provider limits."""
-    if len(s) <= max_chars:
-        return [s]
-    chunks: list[str] = []
-    i = 0
-    n = len(s)
-    while i < n:
-        end = min(i + max_chars, n)
-        chunk = s[i:end]
-        chunks.append(chunk)
-        if end == n:
-            break
-        i = end - overlap  # step with overlap
-        if i < 0:
-            i = 0
-    return chunks
-
-def summarize_chunk(text: str, style: str) -> str:
-    prompt = f"""Summarize the following article chunk in the style: {style}.
+# Token caps tuned for Groq on-demand limits; adjust if needed
+MAX_TOKENS_SINGLE = 3000     # summarize in one call below this
+MAX_TOKENS_CHUNK = 2200      # per-chunk budget for map/reduce summaries
+OVERLAP_TOKENS = 40          # ~one trailing sentence of shared context
+MAX_TOKENS_TRUNC = 2000      # last-resort truncation
+MAX_PARALLEL_CALLS = 4       # concurrent chunk/window summaries
+
+def chunk_prompt(text: str, style: str) -> str:
+    return f"""Summarize the following article chunk in the style: {style}.
 - Be concise and factual.
 - 5–8 bullets if applicable.
 - Do NOT reference “this chunk”; write a standalone summary.
@@ -91,9 +111,8 @@ def summarize_chunk(text: str, style: str) -> str:
 Chunk:
 {text}
 """
-    return call_llm(prompt)
 
-def synthesize_summaries(part_summaries: list[str], style: str) -> str:
+def synthesize_summaries(part_summaries: list[str], style: str, llm_call=None) -> str:
     joined = "\n\n".join(f"- {s}" for s in part_summaries)
     prompt = f"""You are combining multiple partial summaries of one article into a single {style} for an end user.
 
@@ -106,12 +125,83 @@ Partial summaries:
 {joined}
 
 Now produce the final {style}:"""
-    return call_llm(prompt)
+    return (llm_call or call_llm)(prompt)
+
+def window_seconds(transcript: Transcript, total_tokens: int) -> float:
+    """Pick a whole-minute window length so each window fits MAX_TOKENS_CHUNK."""
+    per_token = transcript.duration / max(1, total_tokens)
+    return max(60.0, (MAX_TOKENS_CHUNK * per_token) // 60 * 60)
+
+def window_prompt(start: float, end: float, part: Transcript, style: str) -> str:
+    return f"""Summarize this part of a YouTube video ({format_ts(start)}–{format_ts(end)}) in style = {style}.
+- Lines start with their real [m:ss] timestamps; keep the ones you cite exactly.
+- Be concise and factual; 3–6 bullets.
+- Do NOT reference "this part"; write a standalone summary.
+
+Transcript:
+{part.to_timestamped_text()}
+"""
+
+def synthesize_video(part_summaries: list[str], style: str, llm_call=None) -> str:
+    joined = "\n\n".join(part_summaries)
+    prompt = f"""You are combining time-ordered partial summaries of one YouTube video into a single summary in style = {style}.
+- Keep the [m:ss] timestamps exactly as given; do not invent new ones.
+- If 'Timestamps', list key moments in time order every 1–3 minutes.
+- If 'Bullet Points', return 7–10 bullets.
+- If 'One-paragraph Recap', return 5–7 sentences.
+
+Partial summaries:
+{joined}
+"""
+    return (llm_call or call_llm)(prompt)
 
 # --- Utility wrappers ---
 def call_llm(prompt: str) -> str:
     return llm.chat(prompt, temperature=temperature, max_tokens=max_tokens)
 
+def call_llm_many(prompts: list[str]) -> list[str]:
+    # independent prompts (no shared history), answered concurrently, in order
+    return allm.chat_many(prompts, concurrency=MAX_PARALLEL_CALLS, temperature=temperature, max_tokens=max_tokens)
+
+def stream_llm(prompt: str, box=None, use_history: bool = True) -> str:
+    """Render the reply token by token (into `box` if given) and return the full text."""
+    box = box if box is not None else st.empty()
+    with box.container():
+        return st.write_stream(
+            llm.chat_stream(prompt, temperature=temperature, max_tokens=max_tokens, use_history=use_history)
+        )
+
+def rag_answer(vectordb, question: str, cache, scope: str, threshold) -> None:
+    """Stream a grounded answer, or show a reused one (logged to telemetry as a cache hit)."""
+    from components.rag_utils import answer_with_rag
+
+    streamed = []
+
+    def stream_and_record(prompt: str) -> str:
+        # grounded answers depend only on the context and question, not the chat so far,
+        # so an identical question later in the session can reuse them
+        text = stream_llm(prompt, use_history=False)
+        streamed.append(text)
+        return text
+
+    t0 = time.perf_counter()
+    ans = answer_with_rag(
+        vectordb,
+        stream_and_record,
+        question,
+        cache=cache,
+        scope=scope,
+        answer_threshold=threshold,
+        model=model,
+    )
+    if not streamed:  # reused answer, no LLM call; a streamed one was recorded by chat_stream
+        st.write(ans)
+        sink = get_telemetry()
+        if sink is not None:
+            sink.record(
+                infer_provider(model), model, (time.perf_counter() - t0) * 1000, "rag", app="week_3", cache="hit"
+            )
+
 # -----------------
 # 1) News Summarizer
 # -----------------
@@ -136,13 +226,21 @@ with col1:
                     st.code(text[:1200] + ("..." if len(text) > 1200 else ""), language="markdown")
 
                 # --- token-safe path ---
+                est = preflight_estimate(
+                    text,
+                    model=model,
+                    single_call_tokens=MAX_TOKENS_SINGLE,
+                    chunk_tokens=MAX_TOKENS_CHUNK,
+                    overlap_tokens=OVERLAP_TOKENS,
+                    max_output_tokens=max_tokens,
+                )
+                st.caption(
+                    f"Preflight: ~{est['input_tokens']:,} article tokens • {est['calls']} call(s) • "
+                    f"≤{est['prompt_tokens']:,} prompt tokens"
+                )
+                summary_box = None
                 try:
-                    # Heuristic caps tuned for Groq on-demand limits; adjust if needed
-                    MAX_CHARS_SINGLE = 12000     # ~3k tokens input
-                    MAX_CHARS_CHUNK  = 9000      # ~2.2k tokens per chunk
-                    OVERLAP_CHARS    = 600
-
-                    if len(text) <= MAX_CHARS_SINGLE:
+                    if count_tokens(text, model) <= MAX_TOKENS_SINGLE:
                         prompt = f"""Summarize the article below in the style: {mode}.
 - Keep it factual and concise.
 - Include 5–8 bullets when applicable.
@@ -150,23 +248,22 @@ with col1:
 Article:
 {text}
 """
-                        summary = call_llm(prompt)
+                        st.subheader("Summary")
+                        summary_box = st.empty()
+                        summary = stream_llm(prompt, summary_box)
                     else:
-                        chunks = chunk_text(text, max_chars=MAX_CHARS_CHUNK, overlap=OVERLAP_CHARS)
+                        chunks = chunk_by_tokens(text, model=model, max_tokens=MAX_TOKENS_CHUNK, overlap_tokens=OVERLAP_TOKENS)
                         st.caption(f"Long article detected. Using chunked summarization ({len(chunks)} chunks).")
-                        part_summaries: list[str] = []
-                        for idx, ch in enumerate(chunks, 1):
-                            # Use spinner/status to show progress per chunk
-                            with st.status(f"Summarizing chunk {idx}/{len(chunks)}...", expanded=False):
-                                part = summarize_chunk(ch, mode)
-                                part_summaries.append(part)
-                        summary = synthesize_summaries(part_summaries, mode)
+                        with st.spinner(f"Summarizing {len(chunks)} chunks..."):
+                            part_summaries = call_llm_many([chunk_prompt(ch, mode) for ch in chunks])
+                        st.subheader("Summary")
+                        summary_box = st.empty()
+                        summary = synthesize_summaries(part_summaries, mode, lambda p: stream_llm(p, summary_box))
 
                 except Exception as e:
                     # Last-resort truncation if provider still complains (TPM/length)
-                    ST_TRUNC = 8000
                     st.warning(f"Fell back to truncated summarization due to provider limits: {e}")
-                    short = text[:ST_TRUNC]
+                    short = truncate_to_tokens(text, MAX_TOKENS_TRUNC, model=model)
                     prompt = f"""Summarize the article below in the style: {mode}.
 - Keep it factual and concise.
 - Include 5–8 bullets when applicable.
@@ -174,10 +271,13 @@ Article:
 Article (truncated):
 {short}
 """
-                    summary = call_llm(prompt)
+                    if summary_box is None:
+                        st.subheader("Summary")
+                        summary_box = st.empty()
+                    summary = stream_llm(prompt, summary_box)
 
-                st.subheader("Summary")
-                st.write(clean_summary_text(summary))
+                # swap the raw stream for the cleaned-up text
+                summary_box.write(clean_summary_text(summary))
 
 with col2:
     st.markdown("**Tips**")
@@ -197,23 +297,39 @@ with col1:
         if not yt:
             st.warning("Please paste a YouTube URL.")
         else:
-            # use debug helper
-            transcript, dbg = fetch_transcript_debug(yt)
+            # use debug helper (keeps cue timestamps)
+            transcript, dbg = fetch_transcript_cues_debug(yt)
             if not transcript:
                 st.error(f"No transcript found or subtitles disabled. (videoId: {extract_video_id(yt) or 'n/a'})")
                 st.info(f"Debug: {dbg}")
             else:
-                prompt = f"""Summarize this YouTube transcript in style = {style}.
-- If 'Timestamps', group key moments with approximate timestamps every 1–3 minutes.
+                body = transcript.to_timestamped_text()
+                total = count_tokens(body, model)
+                if total <= MAX_TOKENS_SINGLE:
+                    prompt = f"""Summarize this YouTube transcript in style = {style}.
+- Lines start with their real [m:ss] timestamps.
+- If 'Timestamps', group key moments every 1–3 minutes using those timestamps.
 - If 'Bullet Points', return 7–10 bullets.
 - If 'One-paragraph Recap', return 5–7 sentences.
 
 Transcript:
-{transcript}
+{body}
 """
-                out = call_llm(prompt)
-                st.subheader("Summary")
-                st.write(clean_summary_text(out))
+                    st.subheader("Summary")
+                    out_box = st.empty()
+                    out = stream_llm(prompt, out_box)
+                else:
+                    windows = list(transcript.windows(window_seconds(transcript, total)))
+                    st.caption(
+                        f"Long video ({format_ts(transcript.duration)}, ~{total:,} tokens). "
+                        f"Summarizing {len(windows)} time windows in parallel."
+                    )
+                    with st.spinner(f"Summarizing {len(windows)} windows..."):
+                        parts = call_llm_many([window_prompt(s, e, part, style) for s, e, part in windows])
+                    st.subheader("Summary")
+                    out_box = st.empty()
+                    out = synthesize_video(parts, style, lambda p: stream_llm(p, out_box))
+                out_box.write(clean_summary_text(out))
 with col2:
     st.markdown("**Notes**")
     st.markdown("- Requires public transcript.\n- Auto-captions often available in English.")
@@ -228,35 +344,56 @@ st.markdown("Upload a few docs, ask by **voice or text**, and get answers ground
 
 rag_col1, rag_col2 = st.columns([2, 1])
 with rag_col1:
+    backends = ["chroma", "numpy", "hnsw"]
+    default_backend = os.getenv("RAG_VECTOR_BACKEND", "chroma")  # rag_utils.VECTOR_BACKEND, without importing it
+    index_backend = st.selectbox(
+        "Vector index",
+        backends,
+        index=backends.index(default_backend) if default_backend in backends else 0,
+        help="numpy: exact, in-process matrix for small/medium corpora. hnsw: approximate, for large corpora.",
+    )
+    reuse_answers = st.checkbox(
+        "Reuse answers for near-identical questions",
+        value=False,
+        help="Skips the LLM when a question matches an earlier one against the same documents.",
+    )
+    answer_threshold = None
+    if reuse_answers:
+        from components.rag_cache import DEFAULT_ANSWER_THRESHOLD
+
+        answer_threshold = st.slider("Similarity threshold", 0.80, 0.99, DEFAULT_ANSWER_THRESHOLD, 0.01)
+    rag_scope = f"{model}|{temperature}|{max_tokens}|{chatbot_name}|{system_prompt}"
     up = st.file_uploader(
-        "Upload knowledge files (txt/pdf/docx supported as text)",
+        "Upload knowledge files (txt/md/pdf/docx)",
         type=["txt", "md", "pdf", "docx"],
         accept_multiple_files=True,
     )
     if up:
-        raw_texts = []
-        sources = []
-        for f in up:
-            try:
-                # Best-effort text read; keep simple for now
-                data = f.read()
-                try:
-                    text = data.decode("utf-8", errors="ignore")
-                except Exception:
-                    text = data.decode("latin-1", errors="ignore")
-                raw_texts.append(text)
-                sources.append(f.name)
-            except Exception:
-                pass
-        docs = chunk_docs(raw_texts, sources=sources)
-        vectordb = build_chroma(docs, collection_name="voice_rag")
-        st.success(f"Loaded {len(docs)} chunks from {len(up)} files.")
+        from components.rag_utils import open_index, session_collection
+        from components.rag_cache import get_rag_cache
+        from components.ingest_pipeline import ingest_files_pipelined
+
+        rag_cache = get_rag_cache()
+        # persistent per-session collection: parse/chunk/embed/upsert run as
+        # overlapping stages and only new/changed chunks are embedded
+        vectordb = open_index(index_backend, collection_name=session_collection(session_id))
+        stats = ingest_files_pipelined(vectordb, [(f.name, f) for f in up])
+        st.success(
+            f"Loaded {stats['chunks']} chunks from {stats['files']} files "
+            f"(embedded {stats['added']}, removed {stats['removed']}, reused {stats['unchanged']})."
+        )
+        if stats["skipped"]:
+            st.warning(f"Skipped {stats['skipped']} file(s) with no extractable text.")
+        if stats["added"]:
+            st.caption(
+                f"Ingested in {stats['wall_s']}s — "
+                + ", ".join(f"{n}: {s['per_s']}/s" for n, s in stats["stages"].items())
+            )
 
         q = st.text_input("Ask a question (or use voice input below)")
         if st.button("Ask RAG") and q:
-            ans = answer_with_rag(vectordb, call_llm, q)
             st.subheader("Answer")
-            st.write(ans)
+            rag_answer(vectordb, q, rag_cache, rag_scope, answer_threshold)
 
 with rag_col2:
     st.markdown("**Voice (optional)**")
@@ -276,9 +413,8 @@ with rag_col2:
             query = transcript.text
             st.write(f"**You said:** {query}")
             if 'vectordb' in locals():
-                ans = answer_with_rag(vectordb, call_llm, query)
                 st.subheader("Answer")
-                st.write(ans)
+                rag_answer(vectordb, query, rag_cache, rag_scope, answer_threshold)
             else:
                 st.warning("Please upload knowledge files first, then ask.")
         except Exception as e:
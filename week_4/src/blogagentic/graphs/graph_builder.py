@@ -18,11 +18,14 @@ class GraphBuilder:
         # Nodes
         graph.add_node("title_creation", blog_node_obj.title_creation)
         graph.add_node("content_generation", blog_node_obj.content_generation)
+        graph.add_node("join", blog_node_obj.join)
 
-        # Edges
+        # Edges: title and content are independent, so both start at once;
+        # join waits for both branches
         graph.add_edge(START, "title_creation")
-        graph.add_edge("title_creation", "content_generation")
-        graph.add_edge("content_generation", END)
+        graph.add_edge(START, "content_generation")
+        graph.add_edge(["title_creation", "content_generation"], "join")
+        graph.add_edge("join", END)
 
         return graph
 
@@ -36,6 +39,7 @@ class GraphBuilder:
         # Nodes
         graph.add_node("title_creation", blog_node_obj.title_creation)
         graph.add_node("content_generation", blog_node_obj.content_generation)
+        graph.add_node("join", blog_node_obj.join)
         graph.add_node(
             "swahili_translation",
             lambda state: blog_node_obj.translation(
@@ -50,10 +54,11 @@ class GraphBuilder:
         )
         graph.add_node("route", blog_node_obj.route)
 
-        # Edges
+        # Edges: title and content in parallel, translate once both are done
         graph.add_edge(START, "title_creation")
-        graph.add_edge("title_creation", "content_generation")
-        graph.add_edge("content_generation", "route")
+        graph.add_edge(START, "content_generation")
+        graph.add_edge(["title_creation", "content_generation"], "join")
+        graph.add_edge("join", "route")
 
         # Conditional edges from router
         graph.add_conditional_edges(
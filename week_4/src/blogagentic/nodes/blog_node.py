@@ -34,7 +34,7 @@ class BlogNode:
         """
         topic = state.get("topic")
         if not topic:
-            return state
+            return {}
 
         prompt = """
 You are an expert blog content writer. Use Markdown formatting.
@@ -45,22 +45,18 @@ Topic: {topic}
         system_message = prompt.format(topic=topic)
         response = self.llm.invoke(system_message)
 
-        return {
-            "blog": {
-                "title": response.content,
-                # content will be filled in by the next node
-            }
-        }
+        # merged into `blog` by the state reducer; content comes from the parallel branch
+        return {"blog": {"title": response.content}}
 
     def content_generation(self, state: BlogState) -> BlogState:
         """
-        Generate full blog content for the given topic and title.
+        Generate full blog content for the given topic.
+        Runs in parallel with title_creation, so it must not depend on the title.
         """
         topic = state.get("topic")
-        blog = state.get("blog", {})
         research = state.get("research", "")
         if not topic:
-            return state
+            return {}
 
         system_prompt = """
 You are an expert blog writer. Use Markdown formatting.
@@ -86,12 +82,14 @@ Write a detailed blog article:
         )
         response = self.llm.invoke(system_message)
 
-        return {
-            "blog": {
-                "title": blog.get("title", ""),
-                "content": response.content,
-            }
-        }
+        return {"blog": {"content": response.content}}
+
+    def join(self, state: BlogState) -> BlogState:
+        """
+        Barrier after the parallel title/content branches. Their `blog`
+        updates are already merged by the state reducer; nothing to add.
+        """
+        return {}
 
     def translation(self, state: BlogState) -> BlogState:
         """
@@ -102,7 +100,7 @@ Write a detailed blog article:
         content = blog.get("content", "")
 
         if not current_language or not content:
-            return state
+            return {}
 
         translation_prompt = """
 Translate the following blog content into {current_language}.
@@ -120,10 +118,7 @@ CONTENT:
         response = self.llm.invoke([message])
 
         return {
-            "blog": {
-                "title": blog.get("title", ""),
-                "content": response.content,
-            },
+            "blog": {"content": response.content},
             "current_language": current_language,
         }
 
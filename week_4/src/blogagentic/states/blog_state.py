@@ -1,4 +1,13 @@
-from typing import TypedDict, NotRequired, Dict
+from typing import Annotated, TypedDict, NotRequired, Dict, Optional
+
+
+def merge_blog(left: Optional[Dict[str, str]], right: Optional[Dict[str, str]]) -> Dict[str, str]:
+    """
+    Reducer for `blog`: nodes return only the fields they produce
+    (e.g. {"title": ...} or {"content": ...}) and updates are merged,
+    so parallel branches can write to `blog` in the same step.
+    """
+    return {**(left or {}), **(right or {})}
 
 
 class BlogState(TypedDict, total=False):
@@ -6,6 +15,6 @@ class BlogState(TypedDict, total=False):
     State passed between LangGraph nodes.
     """
     topic: str
-    blog: Dict[str, str]        
+    blog: Annotated[Dict[str, str], merge_blog]
     current_language: NotRequired[str]
     research: NotRequired[str]